@@ -1,11 +1,17 @@
 import requests
-import pandas as pd
 import time
 import datetime
 import numpy as np
 import logging
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from retry import retry
+from alert_dispatcher import AlertDispatcher, post_dingtalk
+from data_processor import IncrementalRSI
+from kline_buffer import KlineBuffer
+from kline_store import KlineStore
+from market_bus import PREMIUM_TOPIC, MarketBusClient, kline_topic, price_topic
+from rate_limiter import RateLimitedError, estimate_weight, get_governor
 
 # 配置日志
 logging.basicConfig(
@@ -21,16 +27,22 @@ logger = logging.getLogger("PerpetualRSIMonitor")
 
 # 配置参数 - 永续合约版本
 class Config:
-    SYMBOL = ["ACHUSDT"]  # 交易对（永续合约）
+    SYMBOL = ["ACHUSDT"]  # 交易对（永续合约），为空列表时监控全部USDT永续合约
     INTERVAL = "15m"  # K线周期
     RSI_PERIOD = 6  # RSI计算周期
     OVERBOUGHT = 95  # 超买阈值
     OVERSOLD = 60  # 超卖阈值
     CHECK_INTERVAL = 5  # 检查间隔(秒)
+    MAX_WORKERS = 8  # 并发获取K线的线程数
     DINGDING_WEBHOOK = "https://oapi.dingtalk.com/robot/send?access_token=b8547d280dbe99c9845b95f726e2c3c82e1b9749540e5cb1b91ae5e9884ffa70"
     API_RETRY_TIMES = 3  # API请求重试次数
     API_RETRY_DELAY = 5  # API请求重试延迟(秒)
     ALERT_COOLDOWN = 5  # 警报冷却时间(秒)
+    ALERT_DIGEST_INTERVAL = 10  # 警报合并发送间隔(秒)
+    DINGDING_RATE_LIMIT = 20  # 钉钉机器人每分钟最多发送的消息数
+    WEIGHT_LIMIT = 2400  # 合约每分钟请求权重上限
+    KLINE_CACHE_DIR = "kline_cache"  # 本地K线缓存目录
+    MARKET_BUS = ""  # 行情总线Unix socket路径(market_bus.py)，为空则直接请求交易所
     # 永续合约API端点
     FUTURES_BASE_URL = "https://fapi.binance.com"
     KLINE_URL = "/fapi/v1/klines"
@@ -47,138 +59,149 @@ class MonitorState:
         self.last_oversold_alert = 0
         self.last_enter_overbought = 0
         self.last_enter_oversold = 0
+        # 增量RSI状态，避免每次检查重算整段K线
+        self.rsi = IncrementalRSI(Config.RSI_PERIOD, loss_floor=None)
+        self.klines = KlineBuffer(Config.RSI_PERIOD + 100)
+
+
+kline_store = KlineStore(Config.KLINE_CACHE_DIR)
+governor = get_governor('futures', Config.WEIGHT_LIMIT)
+
+
+def governed_get(url, params=None):
+    """经过权重令牌桶的GET请求，429/418时按Retry-After暂停后续请求并抛出RateLimitedError"""
+    path = url[len(Config.FUTURES_BASE_URL):]
+    governor.acquire(estimate_weight(path, params))
+    response = requests.get(url, params=params)
+    governor.update_from_headers(response.headers)
+    if response.status_code in (429, 418):
+        seconds = governor.on_rate_limited(response.status_code, response.headers.get('Retry-After'))
+        raise RateLimitedError(response.status_code, seconds)
+    response.raise_for_status()
+    return response
 
 
 state = MonitorState()
 
 
-@retry(tries=Config.API_RETRY_TIMES, delay=Config.API_RETRY_DELAY)
-def get_binance_futures_klines(symbol, interval, limit=300):
-    """获取永续合约K线数据，带重试机制"""
+@retry(exceptions=requests.exceptions.RequestException, tries=Config.API_RETRY_TIMES, delay=Config.API_RETRY_DELAY)
+def get_binance_futures_kline_rows(symbol, interval, limit=300, start_time=None):
+    """获取永续合约原始K线数组，start_time指定时只返回该时间之后的K线"""
     url = f"{Config.FUTURES_BASE_URL}{Config.KLINE_URL}"
     params = {"symbol": symbol, "interval": interval, "limit": limit}
+    if start_time is not None:
+        params["startTime"] = start_time
 
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()  # 检查请求是否成功
+        response = governed_get(url, params=params)
     except requests.exceptions.RequestException as e:
         logger.error(f"API请求异常: {e}")
         raise
 
-    data = response.json()
-    df = pd.DataFrame(data, columns=[
-        'open_time', 'open', 'high', 'low', 'close', 'volume',
-        'close_time', 'quote_asset_volume', 'trades',
-        'taker_buy_base', 'taker_buy_quote', 'ignore'
-    ])
+    return response.json()
 
-    # 时间转换
-    df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
-    df['close_time'] = pd.to_datetime(df['close_time'], unit='ms')
 
-    # 数据类型转换
-    numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-    df[numeric_cols] = df[numeric_cols].astype(float)
-
-    return df
-
-
-@retry(tries=Config.API_RETRY_TIMES, delay=Config.API_RETRY_DELAY)
-def get_binance_futures_current_price(symbol):
-    """获取永续合约当前最新价格"""
+@retry(exceptions=requests.exceptions.RequestException, tries=Config.API_RETRY_TIMES, delay=Config.API_RETRY_DELAY)
+def get_all_futures_prices():
+    """一次请求获取全部永续合约的最新价格，返回{symbol: price}"""
     url = f"{Config.FUTURES_BASE_URL}{Config.CURRENT_PRICE_URL}"
-    params = {"symbol": symbol}
-    response = requests.get(url, params=params)
-    data = response.json()
-    return float(data['price'])
+    response = governed_get(url)
+    return {item['symbol']: float(item['price']) for item in response.json()}
 
 
-@retry(tries=Config.API_RETRY_TIMES, delay=Config.API_RETRY_DELAY)
-def get_binance_futures_mark_price(symbol):
-    """获取永续合约标记价格（用于合约交易和计算资金费率）"""
+@retry(exceptions=requests.exceptions.RequestException, tries=Config.API_RETRY_TIMES, delay=Config.API_RETRY_DELAY)
+def get_all_futures_premium_index():
+    """一次请求获取全部永续合约的标记价格和资金费率，返回{symbol: premiumIndex}"""
     url = f"{Config.FUTURES_BASE_URL}{Config.MARK_PRICE_URL}"
-    params = {"symbol": symbol}
-    response = requests.get(url, params=params)
-    data = response.json()
-    return float(data['markPrice'])
+    response = governed_get(url)
+    return {item['symbol']: item for item in response.json()}
 
 
-@retry(tries=Config.API_RETRY_TIMES, delay=Config.API_RETRY_DELAY)
-def get_binance_funding_rate(symbol):
-    """获取永续合约资金费率"""
-    url = f"{Config.FUTURES_BASE_URL}/fapi/v1/fundingRate"
-    params = {"symbol": symbol, "limit": 1}
-    response = requests.get(url, params=params)
-    data = response.json()
-    return {
-        'fundingRate': float(data[0]['fundingRate']),
-        'fundingTime': pd.to_datetime(int(data[0]['fundingTime']), unit='ms')
-    }
-
+class FuturesMarketFetcher:
+    """每个检查周期统一获取一次全部交易对的最新价、标记价和资金费率，再分发给各交易对"""
 
-def calculate_rsi(data, period=14):
-    """使用Wilder's Smoothing方法计算RSI，返回包含RSI列的DataFrame"""
-    close_prices = data['close']
-    deltas = close_prices.diff()
+    def __init__(self):
+        self.prices = {}
+        self.premium_index = {}
+
+    def refresh(self):
+        self.prices = get_all_futures_prices()
+        self.premium_index = get_all_futures_premium_index()
+
+    def symbols(self):
+        """全部USDT永续合约交易对"""
+        return sorted(s for s in self.premium_index if s.endswith('USDT'))
+
+    def get(self, symbol):
+        """返回交易对的(最新价, 标记价, 资金费率, 下次资金费时间)，数据缺失时返回None"""
+        premium = self.premium_index.get(symbol)
+        if symbol not in self.prices or premium is None:
+            return None
+        return (
+            self.prices[symbol],
+            float(premium['markPrice']),
+            float(premium['lastFundingRate']),
+            datetime.datetime.fromtimestamp(int(premium['nextFundingTime']) / 1000, datetime.timezone.utc)
+        )
 
-    # 分离涨跌幅
-    gains = deltas.where(deltas > 0, 0)
-    losses = -deltas.where(deltas < 0, 0)
 
-    # 计算平均收益和损失
-    avg_gain = gains.rolling(window=period, min_periods=period).mean()
-    avg_loss = losses.rolling(window=period, min_periods=period).mean()
+class BusMarketFetcher(FuturesMarketFetcher):
+    """从行情总线读取批量行情和K线，与main.py共用同一份交易所数据"""
 
-    # 处理前n个数据点后的平均收益和损失
-    for i in range(period, len(avg_gain)):
-        avg_gain.iloc[i] = (avg_gain.iloc[i - 1] * (period - 1) + gains.iloc[i]) / period
-        avg_loss.iloc[i] = (avg_loss.iloc[i - 1] * (period - 1) + losses.iloc[i]) / period
+    def __init__(self, bus):
+        super().__init__()
+        self.bus = bus
 
-    # 计算RSI
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
+    def refresh(self):
+        self.prices = self.bus.data(price_topic('futures'))
+        self.premium_index = self.bus.data(PREMIUM_TOPIC)
 
-    # 添加RSI列到原始DataFrame
-    data['rsi'] = rsi
-    return data
+    def klines(self, symbol, start_time):
+        return self.bus.klines('futures', symbol, Config.INTERVAL, start_time)
 
 
 def send_dingding_alert(message):
-    """发送钉钉警报"""
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "msgtype": "text",
-        "text": {
-            "content": f"币安永续合约15m监控警报\n{message}"
-        }
-    }
+    """发送钉钉警报（由后台警报线程调用），失败时抛出异常"""
+    post_dingtalk(Config.DINGDING_WEBHOOK, f"币安永续合约15m监控警报\n{message}")
+    logger.info(f"钉钉通知发送成功")
 
-    try:
-        response = requests.post(Config.DINGDING_WEBHOOK, json=payload, headers=headers)
-        response.raise_for_status()
-        logger.info(f"钉钉通知发送成功")
-    except Exception as e:
-        logger.error(f"发送钉钉通知失败: {e}")
+
+# 警报在后台线程合并后按限频发送，check_rsi只负责提交
+alerts = AlertDispatcher(send_dingding_alert, Config.DINGDING_RATE_LIMIT, Config.ALERT_DIGEST_INTERVAL)
 
 
-def check_rsi(symbol, state):
+def check_rsi(symbol, state, market):
     try:
-        # 获取K线数据
-        klines = get_binance_futures_klines(symbol, Config.INTERVAL, Config.RSI_PERIOD + 100)
-
-        # 获取当前价格和标记价格
-        current_price = get_binance_futures_current_price(symbol)
-        mark_price = get_binance_futures_mark_price(symbol=symbol)
-
-        # 获取资金费率信息
-        funding_rate_info = get_binance_funding_rate(symbol)
-        next_funding_time = funding_rate_info['fundingTime']
-        funding_rate = funding_rate_info['fundingRate'] * 100  # 转换为百分比
-
-        # 计算RSI
-        klines_with_rsi = calculate_rsi(klines, Config.RSI_PERIOD)
-        current_rsi = klines_with_rsi['rsi'].iloc[-1]
-        latest_price = klines_with_rsi['close'].iloc[-1]
+        market_data = market.get(symbol)
+        if market_data is None:
+            logger.warning(f"{symbol} 本周期缺少价格或资金费率数据")
+            return
+
+        if isinstance(market, BusMarketFetcher):
+            # 行情总线推送的K线窗口，不再请求交易所
+            klines = market.klines(symbol, state.klines.last_open_time)
+        else:
+            # 获取K线数据：首次从本地缓存预热，之后只请求最后一根K线之后的数据
+            if not len(state.klines):
+                kline_store.warm_buffer('futures', symbol, Config.INTERVAL, state.klines)
+            klines = kline_store.fetch_incremental(
+                'futures', symbol, Config.INTERVAL,
+                lambda start_time, limit: get_binance_futures_kline_rows(symbol, Config.INTERVAL, limit, start_time),
+                start_time=state.klines.last_open_time,
+                warmup_limit=Config.RSI_PERIOD + 100
+            )
+        state.klines.update_from_rest(klines)
+
+        # 当前价格、标记价格和资金费率来自本周期的批量数据
+        current_price, mark_price, funding_rate, next_funding_time = market_data
+        funding_rate = funding_rate * 100  # 转换为百分比
+
+        # 增量计算RSI
+        current_rsi = state.rsi.sync(state.klines.open_times, state.klines.closes)
+        if current_rsi is None:
+            logger.warning(f"{symbol} K线数量不足，无法计算RSI")
+            return
+        latest_price = state.klines.last_close
         current_time = time.time()
 
         # 价格差异分析
@@ -200,7 +223,7 @@ def check_rsi(symbol, state):
                 state.last_enter_overbought = current_time
                 message = f"[WARNING] 进入超买区域! {symbol} RSI = {current_rsi:.2f} (>={Config.OVERBOUGHT})\n当前最新价: {current_price:.8f}\n标记价: {mark_price:.8f}\n资金费率: {funding_rate:.4f}%\n下次更新: {next_funding_time}"
                 logger.warning(message)
-                send_dingding_alert(message)
+                alerts.notify(message)
             else:
                 # 检查是否超过冷却时间
                 if current_time - state.last_overbought_alert > Config.ALERT_COOLDOWN:
@@ -208,15 +231,16 @@ def check_rsi(symbol, state):
                     duration = int(current_time - state.last_enter_overbought)
                     message = f"[WARNING] 持续超买! {symbol} RSI = {current_rsi:.2f} (>{Config.OVERBOUGHT})\n当前最新价: {current_price:.8f}\n标记价: {mark_price:.8f}\n资金费率: {funding_rate:.4f}%\n下次更新: {next_funding_time}\n已持续: {duration}秒"
                     logger.warning(message)
-                    send_dingding_alert(message)
+                    alerts.update((symbol, 'overbought'), message)
         else:
             if state.in_overbought:
                 # 刚离开超买区域
                 duration = int(current_time - state.last_enter_overbought)
                 state.in_overbought = False
+                alerts.clear((symbol, 'overbought'))  # 已退出，不再发送尚未发出的持续提醒
                 message = f"[INFO] 退出超买区域! {symbol} RSI = {current_rsi:.2f} (<={Config.OVERBOUGHT})\n当前最新价: {current_price:.8f}\n标记价: {mark_price:.8f}\n资金费率: {funding_rate:.4f}%\n下次更新: {next_funding_time}\n持续时间: {duration}秒"
                 logger.info(message)
-                send_dingding_alert(message)
+                alerts.notify(message)
 
         # 检查超卖情况
         if current_rsi < Config.OVERSOLD:
@@ -226,7 +250,7 @@ def check_rsi(symbol, state):
                 state.last_enter_oversold = current_time
                 message = f"[WARNING] 进入超卖区域! {symbol} RSI = {current_rsi:.2f} (<{Config.OVERSOLD})\n当前最新价: {current_price:.8f}\n标记价: {mark_price:.8f}\n资金费率: {funding_rate:.4f}%\n下次更新: {next_funding_time}"
                 logger.warning(message)
-                send_dingding_alert(message)
+                alerts.notify(message)
             else:
                 # 检查是否超过冷却时间
                 if current_time - state.last_oversold_alert > Config.ALERT_COOLDOWN:
@@ -234,49 +258,64 @@ def check_rsi(symbol, state):
                     duration = int(current_time - state.last_enter_oversold)
                     message = f"[WARNING] 持续超卖! {symbol} RSI = {current_rsi:.2f} (<{Config.OVERSOLD})\n当前最新价: {current_price:.8f}\n标记价: {mark_price:.8f}\n资金费率: {funding_rate:.4f}%\n下次更新: {next_funding_time}\n已持续: {duration}秒"
                     logger.warning(message)
-                    send_dingding_alert(message)
+                    alerts.update((symbol, 'oversold'), message)
         else:
             if state.in_oversold:
                 # 刚离开超卖区域
                 duration = int(current_time - state.last_enter_oversold)
                 state.in_oversold = False
+                alerts.clear((symbol, 'oversold'))
                 message = f"[INFO] 退出超卖区域! {symbol} RSI = {current_rsi:.2f} (>={Config.OVERSOLD})\n当前最新价: {current_price:.8f}\n标记价: {mark_price:.8f}\n资金费率: {funding_rate:.4f}%\n下次更新: {next_funding_time}\n持续时间: {duration}秒"
                 logger.info(message)
-                send_dingding_alert(message)
+                alerts.notify(message)
 
     except Exception as e:
         logger.error(f"监控出错: {e}")
-        send_dingding_alert(f"监控脚本异常: {str(e)}")
+        # 同类异常在一个合并周期内只发送一次并附带次数
+        alerts.error(type(e).__name__, f"监控脚本异常: {symbol} {e}")
 
 
-def monitor_symbol(symbol):
-    state = MonitorState()
-    logger.info(f"开始监控 {symbol} 永续合约 RSI 指标...")
-    while True:
-        try:
-            check_rsi(symbol, state)
-        except Exception as e:
-            logger.error(f"{symbol} 监控循环错误: {e}")
-        time.sleep(Config.CHECK_INTERVAL)
+def monitor_symbols(symbols, market):
+    """单进程监控所有交易对：每个周期批量获取一次行情，K线由线程池并发增量获取"""
+    states = {symbol: MonitorState() for symbol in symbols}
+    with ThreadPoolExecutor(max_workers=Config.MAX_WORKERS) as executor:
+        while True:
+            started = time.monotonic()
+            try:
+                market.refresh()
+                list(executor.map(lambda symbol: check_rsi(symbol, states[symbol], market), symbols))
+            except Exception as e:
+                logger.error(f"监控循环错误: {e}")
+            time.sleep(max(0.0, Config.CHECK_INTERVAL - (time.monotonic() - started)))
 
 
 if __name__ == "__main__":
     # 去重交易对列表
-    unique_symbols = list(set(Config.SYMBOL))
+    unique_symbols = sorted(set(Config.SYMBOL))
+    if Config.MARKET_BUS:
+        # 订阅行情总线，与main.py等其他订阅者共用同一份交易所数据
+        bus = MarketBusClient(Config.MARKET_BUS, limit=Config.RSI_PERIOD + 100).start()
+        bulk_topics = [price_topic('futures'), PREMIUM_TOPIC]
+        bus.subscribe(bulk_topics)
+        bus.wait_ready(bulk_topics)
+        market = BusMarketFetcher(bus)
+        if not unique_symbols:
+            market.refresh()
+            unique_symbols = market.symbols()
+        kline_topics = [kline_topic('futures', symbol, Config.INTERVAL) for symbol in unique_symbols]
+        bus.subscribe(kline_topics)
+        bus.wait_ready(kline_topics, timeout=60)
+        logger.info(f"使用行情总线: {Config.MARKET_BUS}")
+    else:
+        market = FuturesMarketFetcher()
+        if not unique_symbols:
+            market.refresh()
+            unique_symbols = market.symbols()
     logger.info(f"开始监控多个交易对: {unique_symbols} 永续合约 RSI 指标...")
     logger.info(
         f"配置参数: 周期={Config.RSI_PERIOD}, 超买={Config.OVERBOUGHT}, 超卖={Config.OVERSOLD}, 检查间隔={Config.CHECK_INTERVAL}秒"
     )
-    logger.info(f"警报模式: 超买/超卖区域状态变化提醒及持续状态提醒")
-
-    # 创建并启动线程
-    threads = []
-    for symbol in unique_symbols:
-        thread = threading.Thread(target=monitor_symbol, args=(symbol,))
-        threads.append(thread)
-        thread.start()
-        logger.info(f"已启动 {symbol} 的监控线程")
-
-    # 等待所有线程完成
-    for thread in threads:
-        thread.join()
\ No newline at end of file
+    logger.info(f"警报模式: 超买/超卖区域状态变化提醒及持续状态提醒，每{Config.ALERT_DIGEST_INTERVAL}秒合并发送")
+    alerts.start()
+
+    monitor_symbols(unique_symbols, market)
\ No newline at end of file
@@ -0,0 +1,151 @@
+import logging
+import threading
+
+import requests
+
+from rate_limiter import get_governor
+
+logger = logging.getLogger('PerpetualRSIMonitor')
+
+DINGTALK_RATE_LIMITED = 130101  # 钉钉机器人发送过快的错误码
+DINGTALK_MAX_LENGTH = 18000  # 单条文本消息长度上限(字符)，留出标题余量
+
+
+class DingTalkError(Exception):
+    def __init__(self, errcode, errmsg):
+        super().__init__(f"钉钉返回错误: {errcode} {errmsg}")
+        self.errcode = errcode
+
+
+def post_dingtalk(webhook, content, timeout=5):
+    """发送一条钉钉文本消息，HTTP错误或errcode非0时抛出异常"""
+    payload = {"msgtype": "text", "text": {"content": content}}
+    response = requests.post(webhook, json=payload, headers={"Content-Type": "application/json"}, timeout=timeout)
+    response.raise_for_status()
+    result = response.json()
+    if result.get('errcode', 0) != 0:
+        raise DingTalkError(result.get('errcode'), result.get('errmsg'))
+    return result
+
+
+class AlertDispatcher:
+    """后台合并发送警报，监控线程提交警报时只做一次加锁的内存操作
+
+    每batch_interval秒把期间的警报合并为一条摘要：
+    - notify: 状态变化（进入/退出超买超卖），按提交顺序全部保留
+    - update: 持续状态，同一key在一个周期内只保留最新一条，摘要中每个key一行；clear丢弃未发送的
+    - error: 异常，同一key只计数并保留最近一条
+    发送前从令牌桶(每分钟rate_limit条)取令牌，超出时在后台线程等待，不影响监控线程。
+    """
+
+    def __init__(self, send, rate_limit=20, batch_interval=10.0, max_length=DINGTALK_MAX_LENGTH):
+        self.send = send
+        self.batch_interval = batch_interval
+        self.max_length = max_length
+        self.governor = get_governor('dingtalk', rate_limit, safety=1.0, order_reserve=0.0)
+        self._events = []
+        self._sustained = {}  # key -> 最新消息
+        self._errors = {}  # key -> [次数, 最近一条消息]
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+        # 统计
+        self.submitted = 0
+        self.coalesced = 0
+        self.posts = 0
+        self.failed = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='alert-dispatcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def notify(self, message):
+        with self._cond:
+            self._events.append(message)
+            self.submitted += 1
+
+    def update(self, key, message):
+        with self._cond:
+            if key in self._sustained:
+                self.coalesced += 1
+            self._sustained[key] = message
+            self.submitted += 1
+
+    def clear(self, key):
+        """丢弃key尚未发送的持续状态（例如已退出超买区域）"""
+        with self._cond:
+            self._sustained.pop(key, None)
+
+    def error(self, key, message):
+        with self._cond:
+            entry = self._errors.get(key)
+            if entry is None:
+                self._errors[key] = [1, message]
+            else:
+                entry[0] += 1
+                entry[1] = message
+                self.coalesced += 1
+            self.submitted += 1
+
+    def stop(self, timeout=10.0):
+        """停止后台线程，发送剩余警报"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _take(self):
+        with self._cond:
+            events, sustained, errors = self._events, self._sustained, self._errors
+            self._events, self._sustained, self._errors = [], {}, {}
+        return events, sustained, errors
+
+    def _digest(self, events, sustained, errors):
+        """合并为若干条不超过max_length的消息"""
+        sections = list(events)
+        if sustained:
+            # 持续状态每个key一行：首行(交易对与RSI)加末行(已持续时间)
+            lines = [message.split('\n') for message in sustained.values()]
+            sections.append('\n'.join(f"{m[0]} {m[-1]}" if len(m) > 1 else m[0] for m in lines))
+        for count, message in errors.values():
+            sections.append(f"{message} (本周期共{count}次)" if count > 1 else message)
+
+        chunks, current = [], ''
+        for section in sections:
+            section = section[:self.max_length]
+            if current and len(current) + len(section) + 2 > self.max_length:
+                chunks.append(current)
+                current = ''
+            current = f"{current}\n\n{section}" if current else section
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _post(self, text):
+        self.governor.acquire(1)
+        try:
+            self.send(text)
+            self.posts += 1
+        except DingTalkError as e:
+            self.failed += 1
+            if e.errcode == DINGTALK_RATE_LIMITED:
+                # 被限频时暂停一分钟，期间的警报继续合并
+                self.governor.on_rate_limited(429, 60)
+            logger.error(f"发送钉钉通知失败: {e}")
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"发送钉钉通知失败: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopped:
+                    self._cond.wait(self.batch_interval)
+                stopped = self._stopped
+            for text in self._digest(*self._take()):
+                self._post(text)
+            if stopped:
+                return
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import signal
+import time
+
+import aiohttp
+from rate_limiter import AsyncGovernedClient, governors_for_config
+from latency import recorder
+from state_store import StateStore, restore_states
+from trade_journal import TradeJournal
+from trading_executor import AsyncTradingExecutor
+
+logger = logging.getLogger('trading_system')
+
+
+class AsyncEngine:
+    """asyncio运行时：所有交易对在同一个事件循环上复用一个长连接池
+
+    与线程池运行时一样每个交易对同时最多一个评估任务，上一轮未完成的交易对本轮跳过并计数。
+    """
+
+    def __init__(self, config, state_map):
+        self.config = config
+        self.state_map = state_map
+        self.client = None
+        self.executor = None
+        self._tasks = {}  # symbol -> 正在执行的评估任务
+        self._stop = asyncio.Event()
+        self.rounds = 0
+        self.skipped = 0
+        self.missed_rounds = 0
+        self.max_round_lag = 0.0
+
+    async def start(self):
+        """创建共享连接池和AsyncClient"""
+        connector = aiohttp.TCPConnector(
+            limit=self.config.ASYNC_MAX_CONNECTIONS,
+            keepalive_timeout=60,
+            ttl_dns_cache=300
+        )
+        requests_params = {}
+        proxy = (self.config.PROXIES or {}).get('https')
+        if proxy:
+            requests_params['proxy'] = proxy
+        self.client = await AsyncGovernedClient.create(
+            self.config.active_api_key,
+            self.config.active_api_secret,
+            requests_params=requests_params,
+            testnet=self.config.TESTNET,
+            session_params={'connector': connector},
+            governors=governors_for_config(self.config),
+            base_url=self.config.REST_BASE_URL
+        )
+        journal = None
+        if self.config.JOURNAL_DIR:
+            journal = TradeJournal(self.config.JOURNAL_DIR, self.config.JOURNAL_FLUSH_INTERVAL)
+        self.executor = AsyncTradingExecutor(self.client, self.config, journal=journal)
+        if self.config.STATE_DIR:
+            await self.restore_states()
+
+    async def restore_states(self):
+        """从本地记录恢复持仓状态，真实交易时用一次批量持仓查询核对"""
+        store = StateStore(self.config.STATE_DIR, self.config.STATE_CHECKPOINT_EVERY)
+        positions = None
+        if not self.config.SIMULATION_MODE:
+            try:
+                positions = await self.client.futures_position_information()
+            except Exception as e:
+                logger.error(f"获取合约持仓失败，仅使用本地状态: {e}")
+        restore_states(store, self.state_map, self.config, positions=positions)
+        self.executor.state_store = store
+
+    async def close(self):
+        if self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        if self.executor is not None and self.executor.state_store is not None:
+            self.executor.state_store.close()
+        if self.client is not None:
+            await self.client.close_connection()
+
+    def stop(self):
+        self._stop.set()
+
+    async def _fetch_base(self, symbol, start_time):
+        params = {'startTime': start_time} if start_time is not None else {}
+        return await self.client.get_klines(symbol=symbol, interval=self.config.BASE_INTERVAL, limit=1000, **params)
+
+    async def load_base_klines(self, symbol, state):
+        """本地聚合模式：只请求基础周期K线，聚合到主周期和确认周期，返回主周期RSI"""
+        timeframes = state.timeframes
+        start_time = timeframes.base_time
+        if start_time is None:
+            # 启动时每个聚合周期用REST初始化一次
+            for interval, frame in timeframes.frames.items():
+                if not len(frame.klines):
+                    klines = await self.client.get_klines(symbol=symbol, interval=interval,
+                                                          limit=self.config.RSI_PERIOD + 100)
+                    with state.lock:
+                        timeframes.seed(interval, klines)
+            start_time = timeframes.resume_time()
+        klines = page = await self._fetch_base(symbol, start_time)
+        # 补齐较长周期时可能超过一页（startTime包含本身，相邻两页重叠一根）
+        while len(page) >= 1000:
+            page = await self._fetch_base(symbol, int(page[-1][0]))
+            klines = klines[:-1] + page
+        with state.lock:
+            for k in klines:
+                timeframes.update(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+            return state.rsi.value
+
+    async def load_klines(self, symbol, state):
+        """已有K线时只请求最后一根K线之后的数据，返回当前RSI"""
+        start_time = state.klines.last_open_time
+        if start_time is None:
+            klines = await self.client.get_klines(
+                symbol=symbol,
+                interval=self.config.INTERVAL,
+                limit=self.config.RSI_PERIOD + 100
+            )
+        else:
+            klines = await self.client.get_klines(
+                symbol=symbol,
+                interval=self.config.INTERVAL,
+                startTime=start_time,
+                limit=1000
+            )
+        with state.lock:
+            state.klines.update_from_rest(klines)
+            return state.rsi.sync(state.klines.open_times, state.klines.closes)
+
+    async def process_symbol(self, symbol):
+        state = self.state_map[symbol]
+        try:
+            start = recorder.now()
+            if state.timeframes is not None:
+                rsi_value = await self.load_base_klines(symbol, state)
+            else:
+                rsi_value = await self.load_klines(symbol, state)
+            start = recorder.record('fetch_klines', start)
+            if len(state.klines):
+                self.executor.snapshot.update_price(symbol, state.klines.last_close)
+            if rsi_value is not None:
+                await self.executor.check_trading_conditions(symbol, rsi_value, state)
+                recorder.record('check_trading_conditions', start)
+                logger.info(f"{symbol}当前RSI: {rsi_value:.2f}")
+        except Exception as e:
+            logger.error(f"处理{symbol}时发生错误: {e}", exc_info=True)
+
+    def _submit(self, symbol):
+        task = self._tasks.get(symbol)
+        if task is not None and not task.done():
+            self.skipped += 1
+            return
+        self._tasks[symbol] = asyncio.create_task(self.process_symbol(symbol))
+
+    async def run(self, symbols):
+        """按单调时钟对齐的轮次评估所有交易对，直到stop()被调用"""
+        interval = self.config.REFRESH_INTERVAL
+        start = time.monotonic()
+        last_stats = start
+        round_index = 0
+        while not self._stop.is_set():
+            lag = time.monotonic() - (start + round_index * interval)
+            self.max_round_lag = max(self.max_round_lag, lag)
+            for symbol in symbols:
+                self._submit(symbol)
+            self.rounds += 1
+            round_index += 1
+
+            now = time.monotonic()
+            next_round = start + round_index * interval
+            if now >= next_round:
+                missed = int((now - next_round) // interval) + 1
+                self.missed_rounds += missed
+                round_index += missed
+                next_round = start + round_index * interval
+
+            if self.config.STATS_LOG_INTERVAL and now - last_stats >= self.config.STATS_LOG_INTERVAL:
+                last_stats = now
+                running = sum(1 for task in self._tasks.values() if not task.done())
+                logger.info(f"异步调度统计: 轮次={self.rounds}, 执行中={running}, 跳过tick={self.skipped}, "
+                            f"跳过轮次={self.missed_rounds}, 最大轮次延迟={self.max_round_lag * 1000:.1f}ms")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=max(0.0, next_round - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_async(config, state_map):
+    """asyncio运行时入口"""
+    engine = AsyncEngine(config, state_map)
+    await engine.start()
+    loop = asyncio.get_running_loop()
+    try:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, engine.stop)
+    except (NotImplementedError, RuntimeError):
+        pass
+    logger.info(f'使用asyncio运行时，共{len(config.SYMBOLS)}个交易对，最大连接数{config.ASYNC_MAX_CONNECTIONS}')
+    try:
+        await engine.run(config.SYMBOLS)
+    finally:
+        logger.info('程序正在退出...')
+        await engine.close()
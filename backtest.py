@@ -0,0 +1,256 @@
+import argparse
+import dataclasses
+import logging
+import time
+
+import numpy as np
+
+from candle_aggregator import INTERVAL_MS
+from config import TradingConfig
+from kline_store import KlineStore
+from latency import recorder
+from trading_executor import TradingExecutor
+from trading_state import TradingState
+
+logger = logging.getLogger('backtest')
+
+class HistoricalPriceSource:
+    """回测用的价格/余额源，替代TradingExecutor中的MarketSnapshot，不访问交易所"""
+
+    def __init__(self, config):
+        self.config = config
+        self.prices = {}
+
+    def update_price(self, symbol, price, timestamp=None):
+        self.prices[symbol] = price
+
+    def cached_price(self, symbol):
+        return self.prices.get(symbol)
+
+    def get_price(self, symbol):
+        return self.prices.get(symbol)
+
+    def get_balance(self, asset):
+        return self.config.SIMULATED_BALANCE
+
+    def cached_balance(self, asset):
+        return self.config.SIMULATED_BALANCE
+
+    def invalidate_balance(self):
+        pass
+
+
+class FillModel:
+    """模拟成交：市价单按滑点成交并按名义价值收取手续费"""
+
+    def __init__(self, fee_rate=0.0004, slippage=0.0):
+        self.fee_rate = fee_rate  # 单边手续费率
+        self.slippage = slippage  # 单边滑点比例
+
+    def fill_price(self, side, price):
+        return price * (1 - self.slippage) if side == 'SELL' else price * (1 + self.slippage)
+
+    def fee(self, price, quantity):
+        return price * quantity * self.fee_rate
+
+
+class BacktestExecutor(TradingExecutor):
+    """复用TradingExecutor的信号与持仓逻辑，记录模拟成交"""
+
+    def __init__(self, config, fill_model, price_source):
+        super().__init__(None, config, snapshot=price_source)
+        self.fill_model = fill_model
+        self.trades = []
+        self.open_trade = None
+        self.bar_time = None
+
+    def place_short_order(self, symbol, quantity, state):
+        order = super().place_short_order(symbol, quantity, state)
+        if order is not None:
+            price = self.fill_model.fill_price('SELL', order['fills'][0]['price'])
+            self.open_trade = {
+                'symbol': symbol,
+                'entry_time': self.bar_time,
+                'entry_price': price,
+                'quantity': quantity,
+                'entry_fee': self.fill_model.fee(price, quantity),
+            }
+        return order
+
+    def close_short_order(self, symbol, quantity, state, price=None):
+        order = super().close_short_order(symbol, quantity, state, price)
+        if order is not None and self.open_trade is not None:
+            trade = self.open_trade
+            price = self.fill_model.fill_price('BUY', order['fills'][0]['price'])
+            fees = trade['entry_fee'] + self.fill_model.fee(price, quantity)
+            trade.update({
+                'exit_time': self.bar_time,
+                'exit_price': price,
+                'fees': fees,
+                'pnl': (trade['entry_price'] - price) * quantity - fees,
+            })
+            del trade['entry_fee']
+            self.trades.append(trade)
+            self.open_trade = None
+            # 平仓后的权益作为下一笔的仓位基数
+            self.config.SIMULATED_BALANCE += trade['pnl']
+        return order
+
+
+@dataclasses.dataclass
+class BacktestResult:
+    symbol: str
+    bars: int
+    trades: list
+    initial_balance: float
+    final_balance: float
+    max_drawdown: float  # 最大回撤(USDT)
+    max_drawdown_percent: float
+    elapsed: float  # 回测耗时(秒)
+
+    @property
+    def pnl(self):
+        return self.final_balance - self.initial_balance
+
+    @property
+    def win_rate(self):
+        if not self.trades:
+            return 0.0
+        return sum(1 for t in self.trades if t['pnl'] > 0) / len(self.trades) * 100
+
+    def summary(self):
+        return (f"[{self.symbol}] K线={self.bars}, 交易次数={len(self.trades)}, 胜率={self.win_rate:.1f}%, "
+                f"盈亏={self.pnl:.2f} USDT ({self.pnl / self.initial_balance * 100:.2f}%), "
+                f"最大回撤={self.max_drawdown:.2f} USDT ({self.max_drawdown_percent:.2f}%), 耗时={self.elapsed:.2f}秒")
+
+
+class Backtester:
+    """把历史K线逐根回放给TradingExecutor.check_trading_conditions
+
+    K线周期可以比策略周期(config.INTERVAL)更细：例如用1m K线回放15m策略时，
+    每根1m收盘价都作为当前15m K线的最新价格更新增量RSI，等价于盘中逐tick评估。
+    """
+
+    def __init__(self, config=None, fill_model=None):
+        self.config = config or TradingConfig()
+        self.fill_model = fill_model or FillModel()
+
+    def run(self, symbol, open_times, closes, bar_interval=None):
+        """回放一个交易对的K线（开盘时间ms与收盘价，按时间升序），返回BacktestResult"""
+        config = dataclasses.replace(self.config, SIMULATION_MODE=True)
+        if config.CONFIRM_INTERVALS:
+            # 多周期确认时以回放的K线为基础周期，在本地聚合各周期
+            config = dataclasses.replace(config, BASE_INTERVAL=bar_interval or config.INTERVAL)
+        initial_balance = config.SIMULATED_BALANCE
+        price_source = HistoricalPriceSource(config)
+        executor = BacktestExecutor(config, self.fill_model, price_source)
+        state = TradingState(config)
+        strategy_ms = INTERVAL_MS[config.INTERVAL]
+        bar_ms = INTERVAL_MS[bar_interval] if bar_interval else strategy_ms
+        if strategy_ms % bar_ms:
+            raise ValueError(f"K线周期{bar_interval}无法整除策略周期{config.INTERVAL}")
+
+        open_times = np.asarray(open_times, dtype=np.int64)
+        # 每根K线所属的策略周期K线开盘时间
+        buckets = (open_times - open_times % strategy_ms).tolist()
+        closes = np.asarray(closes, dtype=np.float64).tolist()
+        times = open_times.tolist()
+
+        trading_logger = logging.getLogger('trading_system')
+        disabled = trading_logger.disabled
+        trading_logger.disabled = True  # 回放时关闭逐tick日志和延迟统计
+        latency_enabled = recorder.enabled
+        recorder.enabled = False
+        started = time.perf_counter()
+        peak = equity = initial_balance
+        max_drawdown = max_drawdown_percent = 0.0
+        rsi = state.rsi
+        timeframes = state.timeframes
+        try:
+            for bar_time, bucket, close in zip(times, buckets, closes):
+                price_source.prices[symbol] = close
+                executor.bar_time = bar_time
+                if timeframes is None:
+                    rsi_value = rsi.update(bucket, close)
+                else:
+                    timeframes.update(bar_time, close, close, close, close)
+                    rsi_value = rsi.value
+                if rsi_value is not None:
+                    executor.check_trading_conditions(symbol, rsi_value, state)
+
+                # 按收盘价计算含浮动盈亏的权益
+                equity = config.SIMULATED_BALANCE
+                trade = executor.open_trade
+                if trade is not None:
+                    equity += (trade['entry_price'] - close) * trade['quantity'] - trade['entry_fee']
+                if equity > peak:
+                    peak = equity
+                elif peak - equity > max_drawdown:
+                    max_drawdown = peak - equity
+                    max_drawdown_percent = max_drawdown / peak * 100
+        finally:
+            trading_logger.disabled = disabled
+            recorder.enabled = latency_enabled
+
+        return BacktestResult(
+            symbol=symbol,
+            bars=len(times),
+            trades=executor.trades,
+            initial_balance=initial_balance,
+            final_balance=equity,
+            max_drawdown=max_drawdown,
+            max_drawdown_percent=max_drawdown_percent,
+            elapsed=time.perf_counter() - started,
+        )
+
+    def run_from_store(self, store, market, symbol, bar_interval=None):
+        """从本地K线缓存(KlineStore)读取历史数据回测"""
+        bar_interval = bar_interval or self.config.INTERVAL
+        records = store.load(market, symbol, bar_interval)
+        if not len(records):
+            raise ValueError(f"本地缓存中没有{symbol} {bar_interval}的K线数据")
+        return self.run(symbol, records['open_time'], records['close'], bar_interval)
+
+
+def download_history(client, store, market, symbol, interval, start_time):
+    """从start_time(ms)开始分页下载历史K线到本地缓存，返回缓存中的K线数量"""
+    def fetch(start, limit):
+        if market == 'futures':
+            return client.futures_klines(symbol=symbol, interval=interval, startTime=start, limit=limit)
+        return client.get_klines(symbol=symbol, interval=interval, startTime=start, limit=limit)
+
+    last_time = store.last_open_time(market, symbol, interval)
+    store.fetch_incremental(market, symbol, interval, fetch, start_time=last_time or start_time)
+    return len(store.load(market, symbol, interval))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RSI做空策略回测')
+    parser.add_argument('symbols', nargs='+', help='交易对，如ACHUSDT')
+    parser.add_argument('--market', default='spot', choices=['spot', 'futures'])
+    parser.add_argument('--bar-interval', default=None, help='回放K线周期，默认与策略周期相同')
+    parser.add_argument('--fee', type=float, default=0.0004, help='单边手续费率')
+    parser.add_argument('--slippage', type=float, default=0.0, help='单边滑点比例')
+    parser.add_argument('--download-since', default=None, help='先下载该日期(YYYY-MM-DD)以来的K线')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = TradingConfig()
+    store = KlineStore(config.KLINE_CACHE_DIR)
+    backtester = Backtester(config, FillModel(args.fee, args.slippage))
+    bar_interval = args.bar_interval or config.INTERVAL
+
+    if args.download_since:
+        from binance.client import Client
+        client = Client(requests_params={'proxies': config.PROXIES})
+        since = int(time.mktime(time.strptime(args.download_since, '%Y-%m-%d')) * 1000)
+        for symbol in args.symbols:
+            count = download_history(client, store, args.market, symbol, bar_interval, since)
+            logger.info(f"{symbol} {bar_interval} 本地共{count}条K线")
+
+    for symbol in args.symbols:
+        result = backtester.run_from_store(store, args.market, symbol, bar_interval)
+        logger.info(result.summary())
+        for trade in result.trades:
+            logger.info(f"  开仓{trade['entry_time']} @ {trade['entry_price']:.8f} -> "
+                        f"平仓{trade['exit_time']} @ {trade['exit_price']:.8f}, 盈亏={trade['pnl']:.2f}")
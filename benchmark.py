@@ -0,0 +1,401 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from fake_exchange import FakeExchange, expand_fixture, load_fixture, synthetic_fixture
+from latency import Histogram
+
+logger = logging.getLogger('benchmark')
+
+SCENARIOS = ('rsi', 'rest', 'stream')
+START_BARS = 200  # 回放起点，之前的K线作为预热历史
+
+
+def _rss_bytes():
+    """当前进程常驻内存(字节)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def bench_rsi(fixture, count, period, repeat=3):
+    """RSI吞吐：增量RSI逐根更新、批量RSI矩阵计算与原pandas实现的对比"""
+    import pandas as pd
+    from data_processor import DataProcessor, IncrementalRSI
+
+    klines = expand_fixture(fixture, count)['klines']
+    closes = np.array([[float(k[4]) for k in rows] for rows in klines.values()])
+    open_times = np.array([[int(k[0]) for k in rows] for rows in klines.values()], dtype=np.int64)
+    n_symbols, n_bars = closes.shape
+    result = {'symbols': n_symbols, 'bars': n_bars}
+
+    best = float('inf')
+    for _ in range(repeat):
+        rsis = [IncrementalRSI(period) for _ in range(n_symbols)]
+        times = open_times.tolist()
+        values = closes.tolist()
+        started = time.perf_counter()
+        for i in range(n_bars):
+            for s in range(n_symbols):
+                rsis[s].update(times[s][i], values[s][i])
+        best = min(best, time.perf_counter() - started)
+    result['incremental_updates_per_sec'] = n_symbols * n_bars / best
+
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        DataProcessor.calculate_rsi_batch(closes, period)
+        best = min(best, time.perf_counter() - started)
+    result['batch_bars_per_sec'] = n_symbols * n_bars / best
+
+    # 原实现每次为一个交易对构建DataFrame，只取最近RSI_PERIOD+100根
+    window = min(n_bars, period + 100)
+    frames = [pd.DataFrame({'close': row[-window:]}) for row in closes]
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for frame in frames:
+            DataProcessor.calculate_rsi(frame, period)
+        best = min(best, time.perf_counter() - started)
+    result['pandas_windows_per_sec'] = n_symbols / best
+    return result
+
+
+class _ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def _setup_pipeline(spec):
+    """在子进程中导入main并把客户端、交易对和状态替换为基准测试用的配置"""
+    import main
+    from kline_store import KlineStore
+    from log_pipeline import setup_logging
+    from rate_limiter import GovernedClient, WeightGovernor
+    from trading_executor import TradingExecutor
+    from trading_state import TradingState
+
+    setup_logging(main.config)  # 与main()一致使用队列日志管道
+    trading_logger = logging.getLogger('trading_system')
+    trading_logger.setLevel(spec['log_level'])
+    errors = _ErrorCounter()
+    trading_logger.addHandler(errors)
+
+    # 模拟交易所不限频，但请求仍经过governor以计入其开销
+    governors = {'spot': WeightGovernor('spot', 10 ** 9), 'futures': WeightGovernor('futures', 10 ** 9)}
+    client = GovernedClient(main.config.active_api_key, main.config.active_api_secret,
+                            governors=governors, base_url=spec['rest_url'])
+    main.client = client
+    main.trading_executor = TradingExecutor(client, main.config, journal=main.journal)
+    main.kline_store = KlineStore(main.config.KLINE_CACHE_DIR) if main.config.KLINE_CACHE_DIR else None
+    main.config.SYMBOLS = list(spec['symbols'])
+
+    rss_before = _rss_bytes()
+    tracemalloc.start()
+    main.state_map.clear()
+    for symbol in spec['symbols']:
+        main.state_map[symbol] = TradingState(main.config)
+    state_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return main, errors, rss_before, state_bytes
+
+
+def _run_rounds(main, symbols, rounds, workers):
+    """不等待刷新间隔，连续执行rounds轮process_symbol，返回(每tick耗时直方图, 总耗时)"""
+    histogram = Histogram()
+    lock = threading.Lock()
+
+    def tick(symbol):
+        start = time.perf_counter_ns()
+        main.process_symbol(symbol)
+        elapsed = time.perf_counter_ns() - start
+        with lock:
+            histogram.record(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(rounds):
+            list(executor.map(tick, symbols))
+    return histogram, time.perf_counter() - started
+
+
+def worker_rest(spec):
+    """REST轮询：预热一轮后连续执行rounds轮，统计tick吞吐与单tick延迟分位数"""
+    from latency import recorder
+
+    main, errors, rss_before, state_bytes = _setup_pipeline(spec)
+    symbols = spec['symbols']
+    workers = min(len(symbols), 10)  # 与main.py的线程池大小一致
+
+    warmup, warmup_elapsed = _run_rounds(main, symbols, 1, workers)
+    rss_after = _rss_bytes()
+    recorder.reset()
+    histogram, elapsed = _run_rounds(main, symbols, spec['rounds'], workers)
+    ticks = len(symbols) * spec['rounds']
+    return {
+        'symbols': len(symbols),
+        'rounds': spec['rounds'],
+        'ticks': ticks,
+        'ticks_per_sec': ticks / elapsed,
+        'elapsed_sec': elapsed,
+        'tick_latency': histogram.summary(),
+        'warmup_sec': warmup_elapsed,
+        'warmup_latency': warmup.summary(),
+        'state_bytes_per_symbol': state_bytes / len(symbols),
+        'rss_bytes_per_symbol': max(0, rss_after - rss_before) / len(symbols),
+        'stages': recorder.snapshot(),
+        'errors': errors.count,
+    }
+
+
+def worker_stream(spec):
+    """websocket推送：REST初始化后接收rounds轮推送，统计事件吞吐与推送处理延迟"""
+    from kline_stream import KlineStream
+    from latency import recorder
+    from scheduler import TickScheduler
+
+    main, errors, rss_before, state_bytes = _setup_pipeline(spec)
+    symbols = spec['symbols']
+    workers = min(len(symbols), 10)
+    _run_rounds(main, symbols, 1, workers)
+    recorder.reset()
+
+    target = len(symbols) * spec['rounds']
+    histogram = Histogram()
+    done = threading.Event()
+    received = [0]
+    first = [None]
+
+    def on_kline(kline_data, live):
+        start = time.perf_counter_ns()
+        if first[0] is None:
+            first[0] = time.perf_counter()
+        main.handle_stream_kline(kline_data, live)
+        histogram.record(time.perf_counter_ns() - start)
+        received[0] += 1
+        if received[0] >= target:
+            done.set()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        main.scheduler = TickScheduler(executor, main.config.REFRESH_INTERVAL, 0)
+        stream = KlineStream(main.client, main.config, symbols, on_kline=on_kline, base_url=spec['ws_url'])
+        for symbol in symbols:
+            stream.last_open_time[symbol] = main.state_map[symbol].klines.last_open_time
+        stream.start()
+        completed = done.wait(spec['timeout'])
+        elapsed = time.perf_counter() - (first[0] or time.perf_counter())
+        error_count = errors.count  # 不计入关闭连接时的错误
+        stream.stop()
+    rss_after = _rss_bytes()
+    return {
+        'symbols': len(symbols),
+        'rounds': spec['rounds'],
+        'events': received[0],
+        'completed': completed,
+        'events_per_sec': received[0] / elapsed if elapsed > 0 else 0.0,
+        'elapsed_sec': elapsed,
+        'event_latency': histogram.summary(),
+        'scheduler': main.scheduler.stats(),
+        'state_bytes_per_symbol': state_bytes / len(symbols),
+        'rss_bytes_per_symbol': max(0, rss_after - rss_before) / len(symbols),
+        'stages': recorder.snapshot(),
+        'errors': error_count,
+    }
+
+
+WORKERS = {'rest': worker_rest, 'stream': worker_stream}
+
+
+def run_worker(scenario, exchange, symbols, args):
+    """在独立子进程中运行一个场景（干净的模块状态和内存基线），返回其JSON结果"""
+    with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+        spec = {
+            'scenario': scenario,
+            'symbols': symbols,
+            'rounds': args.rounds,
+            'rest_url': exchange.rest_url,
+            'ws_url': exchange.ws_url,
+            'log_level': args.log_level,
+            'timeout': args.timeout,
+        }
+        spec_path = os.path.join(workdir, 'spec.json')
+        result_path = os.path.join(workdir, 'result.json')
+        with open(spec_path, 'w', encoding='utf-8') as f:
+            json.dump(spec, f)
+        env = dict(os.environ)
+        env.update({
+            'BINANCE_REST_BASE_URL': exchange.rest_url,
+            'BINANCE_WS_BASE_URL': exchange.ws_url,
+            'NO_PROXY': '127.0.0.1,localhost',
+            'no_proxy': '127.0.0.1,localhost',
+        })
+        # 子进程在临时目录中运行，日志和K线缓存不会写入工作区
+        subprocess.run([sys.executable, os.path.abspath(__file__), 'worker', spec_path, result_path],
+                       cwd=workdir, env=env, check=True, timeout=args.timeout * 2 + 120)
+        with open(result_path, encoding='utf-8') as f:
+            return json.load(f)
+
+
+def run(args):
+    fixture = load_fixture(args.fixture) if args.fixture else synthetic_fixture(
+        ['ACHUSDT'], bars=START_BARS + args.rounds * 2 + 100, seed=args.seed)
+    counts = [int(c) for c in args.symbols.split(',')]
+    scenarios = args.scenarios.split(',')
+    from config import TradingConfig
+    period = TradingConfig().RSI_PERIOD
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'fixture': args.fixture or f"synthetic(seed={args.seed})",
+            'params': {'symbols': counts, 'rounds': args.rounds, 'latency_ms': args.latency_ms,
+                       'jitter_ms': args.jitter_ms, 'rsi_period': period},
+        },
+    }
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            raise ValueError(f"未知场景: {scenario}")
+        report[scenario] = {}
+        for count in counts:
+            if scenario == 'rsi':
+                result = bench_rsi(fixture, count, period)
+            else:
+                expanded = expand_fixture(fixture, count)
+                exchange = FakeExchange(expanded, args.latency_ms / 1000, args.jitter_ms / 1000, START_BARS)
+                exchange.start()
+                try:
+                    result = run_worker(scenario, exchange, list(expanded['klines']), args)
+                    result['exchange_requests'] = exchange.requests
+                finally:
+                    exchange.stop()
+            report[scenario][str(count)] = result
+            logger.info(f"[{scenario}] {count}个交易对: {_headline(scenario, result)}")
+    return report
+
+
+def _headline(scenario, result):
+    if scenario == 'rsi':
+        return (f"增量{result['incremental_updates_per_sec']:.0f}次/秒, 批量{result['batch_bars_per_sec']:.0f}根/秒, "
+                f"pandas {result['pandas_windows_per_sec']:.0f}窗口/秒")
+    latency = result['tick_latency'] if scenario == 'rest' else result['event_latency']
+    rate = result['ticks_per_sec'] if scenario == 'rest' else result['events_per_sec']
+    return (f"{rate:.0f}次/秒, p50={latency['p50_us']:.0f}us, p99={latency['p99_us']:.0f}us, "
+            f"内存{result['rss_bytes_per_symbol'] / 1024:.1f}KB/交易对, 错误{result['errors']}")
+
+
+def _flatten(data, prefix=''):
+    for key, value in data.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+def _higher_is_better(name):
+    return name.endswith('_per_sec')
+
+
+def _lower_is_better(name):
+    leaf = name.rsplit('.', 1)[-1]
+    return (leaf.endswith('_us') or leaf.endswith('_per_symbol')) and '.stages.' not in name
+
+
+def compare(old, new, threshold):
+    """对比两次基准结果的吞吐/延迟/内存指标，返回退化超过threshold的指标列表"""
+    old_metrics = dict(_flatten({k: v for k, v in old.items() if k != 'meta'}))
+    regressions = []
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    for name, value in _flatten({k: v for k, v in new.items() if k != 'meta'}):
+        if name not in old_metrics or not (_higher_is_better(name) or _lower_is_better(name)):
+            continue
+        before = old_metrics[name]
+        if not before:
+            continue
+        change = (value - before) / before
+        worse = -change if _higher_is_better(name) else change
+        flag = '  <-- 退化' if worse > threshold else ''
+        print(f"{name:60s} {before:14.2f} -> {value:14.2f} ({change * 100:+.1f}%){flag}")
+        if worse > threshold:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 4 and sys.argv[1] == 'worker':
+        with open(sys.argv[2], encoding='utf-8') as f:
+            worker_spec = json.load(f)
+        worker_result = WORKERS[worker_spec['scenario']](worker_spec)
+        with open(sys.argv[3], 'w', encoding='utf-8') as f:
+            json.dump(worker_result, f)
+        os._exit(0)  # 不等待websocket等后台线程
+
+    parser = argparse.ArgumentParser(description='信号处理链路离线基准测试（本地模拟交易所）')
+    sub = parser.add_subparsers(dest='command')
+    bench = sub.add_parser('run', help='运行基准测试并输出JSON结果')
+    bench.add_argument('--symbols', default='1,50,500', help='交易对数量，逗号分隔')
+    bench.add_argument('--scenarios', default=','.join(SCENARIOS), help='rsi/rest/stream，逗号分隔')
+    bench.add_argument('--rounds', type=int, default=20, help='每个场景的轮次(每个交易对的tick数)')
+    bench.add_argument('--latency-ms', type=float, default=0.0, help='模拟交易所每个请求的延迟(毫秒)')
+    bench.add_argument('--jitter-ms', type=float, default=0.0, help='延迟的随机抖动上限(毫秒)')
+    bench.add_argument('--fixture', default=None, help='录制的夹具文件，为空则使用固定种子的随机游走K线')
+    bench.add_argument('--seed', type=int, default=0)
+    bench.add_argument('--timeout', type=float, default=300.0, help='单个场景超时(秒)')
+    bench.add_argument('--log-level', default='WARNING', help='交易日志级别，默认只保留警告和错误')
+    bench.add_argument('--output', default=None, help='结果JSON文件，默认benchmark_results/<commit>.json')
+    cmp = sub.add_parser('compare', help='对比两次结果')
+    cmp.add_argument('old')
+    cmp.add_argument('new')
+    cmp.add_argument('--threshold', type=float, default=0.1, help='超过该比例视为退化')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == 'compare':
+        with open(args.old, encoding='utf-8') as f:
+            old_report = json.load(f)
+        with open(args.new, encoding='utf-8') as f:
+            new_report = json.load(f)
+        sys.exit(1 if compare(old_report, new_report, args.threshold) else 0)
+
+    if args.command is None:
+        args = parser.parse_args(['run'])
+    report = run(args)
+    output = args.output or os.path.join('benchmark_results', f"{report['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    logger.info(f"基准结果已写入{output}")
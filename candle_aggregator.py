@@ -0,0 +1,150 @@
+from data_processor import IncrementalRSI
+from kline_buffer import KlineBuffer
+
+# Binance支持的K线周期(毫秒)，均按UTC零点对齐，开盘时间整除周期长度
+INTERVAL_MS = {
+    '1m': 60_000, '3m': 180_000, '5m': 300_000, '15m': 900_000, '30m': 1_800_000,
+    '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '6h': 21_600_000,
+    '8h': 28_800_000, '12h': 43_200_000, '1d': 86_400_000,
+}
+
+
+def interval_ms(interval):
+    try:
+        return INTERVAL_MS[interval]
+    except KeyError:
+        raise ValueError(f"不支持的K线周期: {interval}") from None
+
+
+class Timeframe:
+    """一个聚合周期的K线窗口、增量RSI，以及当前周期内已收盘基础K线的合计"""
+
+    __slots__ = ('interval', 'ms', 'klines', 'rsi', 'bucket', 'open', 'high', 'low', 'volume')
+
+    def __init__(self, interval, klines, rsi):
+        self.interval = interval
+        self.ms = interval_ms(interval)
+        self.klines = klines
+        self.rsi = rsi
+        self.bucket = None  # 当前周期K线的开盘时间
+        self.open = None  # 为None表示当前周期还没有已收盘的基础K线
+        self.high = self.low = self.volume = 0.0
+
+
+class CandleAggregator:
+    """把单个交易对的基础周期K线（或逐笔成交）在内存中聚合为多个更长周期的K线
+
+    每个周期只保存当前周期内已收盘基础K线的开高低量，正在形成的基础K线每次更新时
+    与之合并后原地写入该周期的KlineBuffer并更新增量RSI，每次更新为O(周期数)。
+    周期K线的开盘时间为基础K线开盘时间向下取整到周期长度，与交易所的对齐方式一致。
+    """
+
+    def __init__(self, base_interval, capacity=200, rsi_period=6):
+        self.base_interval = base_interval
+        self.base_ms = interval_ms(base_interval)
+        self.capacity = capacity
+        self.rsi_period = rsi_period
+        self.frames = {}
+        self._frames = ()
+        # 正在形成的基础K线
+        self.base_time = None
+        self._bar = None
+
+    def add(self, interval, klines=None, rsi=None):
+        """增加一个聚合周期，可传入已有的K线缓冲区和RSI状态（例如TradingState的主周期）"""
+        ms = interval_ms(interval)
+        if ms % self.base_ms:
+            raise ValueError(f"基础周期{self.base_interval}无法整除{interval}")
+        frame = Timeframe(interval, klines if klines is not None else KlineBuffer(self.capacity),
+                          rsi if rsi is not None else IncrementalRSI(self.rsi_period))
+        self.frames[interval] = frame
+        self._frames = tuple(self.frames.values())
+        return frame
+
+    def seed(self, interval, klines):
+        """用交易所的该周期REST K线初始化窗口和RSI（启动时每个周期一次）"""
+        frame = self.frames[interval]
+        frame.klines.update_from_rest(klines)
+        frame.rsi.sync(frame.klines.open_times, frame.klines.closes)
+
+    def resume_time(self):
+        """基础K线应从哪个时间开始补齐：各周期最后一根（正在形成的）K线中最早的开盘时间
+
+        从这里开始回放基础K线，所有周期正在形成的K线都由完整的基础K线重新聚合。
+        """
+        times = [frame.klines.last_open_time for frame in self._frames if len(frame.klines)]
+        return min(times) if times else None
+
+    def rsi(self, interval):
+        return self.frames[interval].rsi.value
+
+    def klines(self, interval):
+        return self.frames[interval].klines
+
+    def update(self, open_time, open_, high, low, close, volume=0.0):
+        """用一根基础K线更新所有周期，返回本次更新中收盘的周期列表
+
+        开盘时间与正在形成的基础K线相同则原地更新，更大则上一根视为已收盘，更早的被忽略。
+        """
+        if self.base_time is not None:
+            if open_time < self.base_time:
+                return []
+            if open_time > self.base_time:
+                self._commit()
+        self.base_time = open_time
+        self._bar = (open_, high, low, close, volume)
+        closed = []
+        for frame in self._frames:
+            if self._write(frame):
+                closed.append(frame.interval)
+        return closed
+
+    def add_trade(self, timestamp, price, quantity):
+        """用一笔成交（aggTrade）更新正在形成的基础K线"""
+        open_time = timestamp - timestamp % self.base_ms
+        if open_time == self.base_time:
+            open_, high, low, _, volume = self._bar
+            return self.update(open_time, open_, max(high, price), min(low, price), price, volume + quantity)
+        return self.update(open_time, price, price, price, price, quantity)
+
+    def _commit(self):
+        """把正在形成的基础K线并入各周期的已收盘合计"""
+        open_, high, low, _, volume = self._bar
+        for frame in self._frames:
+            if frame.open is None:
+                frame.open, frame.high, frame.low, frame.volume = open_, high, low, volume
+            else:
+                if high > frame.high:
+                    frame.high = high
+                if low < frame.low:
+                    frame.low = low
+                frame.volume += volume
+
+    def _write(self, frame):
+        """把已收盘合计与正在形成的基础K线合并写入该周期，返回上一根周期K线是否刚收盘"""
+        open_time = self.base_time
+        bucket = open_time - open_time % frame.ms
+        closed = False
+        if bucket != frame.bucket:
+            closed = frame.bucket is not None
+            frame.bucket = bucket
+            frame.open = None
+            klines = frame.klines
+            if open_time != bucket and klines.last_open_time == bucket:
+                # 从周期中途接入：以REST初始化的该周期K线作为之前部分的合计
+                # （其中包含接入时正在形成的基础K线，成交量可能少量重复，不影响收盘价和RSI）
+                frame.open = float(klines.opens[-1])
+                frame.high = float(klines.highs[-1])
+                frame.low = float(klines.lows[-1])
+                frame.volume = float(klines.volumes[-1])
+        open_, high, low, close, volume = self._bar
+        if frame.open is not None:
+            open_ = frame.open
+            if frame.high > high:
+                high = frame.high
+            if frame.low < low:
+                low = frame.low
+            volume += frame.volume
+        frame.klines.update(bucket, open_, high, low, close, volume)
+        frame.rsi.update(bucket, close)
+        return closed
@@ -10,6 +10,21 @@ class TradingConfig:
     """交易系统配置参数"""
     # 基础配置
     REFRESH_INTERVAL: int = 2  # REST API刷新间隔(秒)
+    DATA_SOURCE: str = 'rest'  # 数据源: 'rest'轮询、'websocket'推送 或 'bus'本地行情总线(market_bus.py)
+    RUNTIME: str = 'thread'  # 运行时: 'thread'线程池 或 'asyncio'事件循环
+    ASYNC_MAX_CONNECTIONS: int = 100  # asyncio运行时共享连接池大小
+    STATS_LOG_INTERVAL: int = 60  # 调度统计日志输出间隔(秒)，0为关闭
+    BOOTSTRAP_WORKERS: int = 32  # 启动阶段并行请求数（交易规则、杠杆、预热K线），请求仍受限频器约束
+    REST_BASE_URL: str = os.getenv('BINANCE_REST_BASE_URL', '')  # 可指向本地模拟交易所，为空则使用Binance官方地址
+    MARKET_BUS: str = os.getenv('MARKET_BUS', 'market_bus.sock')  # 行情总线Unix socket路径，DATA_SOURCE为'bus'时使用
+
+    # WebSocket配置
+    WS_BASE_URL: str = os.getenv('BINANCE_WS_BASE_URL', 'wss://stream.binance.com:9443')  # 可指向本地模拟服务器
+    WS_RECONNECT_DELAY: float = 1.0  # 首次重连等待(秒)，之后指数退避
+    WS_MAX_RECONNECT_DELAY: float = 60.0  # 最大重连等待(秒)
+    WS_PING_INTERVAL: int = 20  # 心跳间隔(秒)
+    FUTURES_WS_BASE_URL: str = os.getenv('BINANCE_FUTURES_WS_BASE_URL', 'wss://fstream.binance.com')  # 合约推送地址
+    TAKE_PROFIT_STREAM: str = ''  # 止盈触发推送: 'markPrice'(!markPrice@arr@1s) 或 'bookTicker'，为空则只在轮询时判断止盈
 
     # 交易对配置
     SYMBOLS: list[str] = field(default_factory=lambda: ['ACHUSDT'])
@@ -17,12 +32,46 @@ class TradingConfig:
     SIMULATED_BALANCE: float = field(default_factory=lambda: 10000.0)  # 模拟USDT余额
     TAKE_PROFIT_PERCENT: float = field(default_factory=lambda: 2.0)  # 止盈百分比(%)
     INTERVAL: str = '15m'  # K线周期
+    KLINE_CAPACITY: int = 200  # 每个交易对K线缓冲区容量
+    BASE_INTERVAL: str = ''  # 基础K线周期(如'1m')，设置后只获取/订阅该周期，INTERVAL和CONFIRM_INTERVALS在本地聚合
+    CONFIRM_INTERVALS: list[str] = field(default_factory=list)  # 多周期确认：开空时这些周期的RSI也须达到超买阈值(需设置BASE_INTERVAL)
+    KLINE_CACHE_DIR: str = 'kline_cache'  # 本地K线缓存目录，为空则不使用缓存
 
     # RSI指标配置
     RSI_PERIOD: int = 6
     OVERBOUGHT: int = 95 # 超买
     OVERSOLD: int = 60 # 超卖
 
+    # 价格/余额快照配置
+    PRICE_TTL: float = 2.0  # 价格快照有效期(秒)
+    BALANCE_TTL: float = 30.0  # 账户余额快照有效期(秒)，成交后立即失效
+
+    # 限频配置（现货和合约的IP权重分别计算）
+    SPOT_WEIGHT_LIMIT: int = 6000  # 现货每分钟请求权重上限
+    FUTURES_WEIGHT_LIMIT: int = 2400  # 合约每分钟请求权重上限
+    FUTURES_ORDER_LIMIT_10S: int = 300  # 合约每10秒下单数上限
+    RATE_LIMIT_SAFETY: float = 0.8  # 只使用上限的这一比例
+    ORDER_WEIGHT_RESERVE: float = 0.1  # 为下单保留的权重比例，行情请求不可占用
+
+    # 延迟统计配置
+    LATENCY_ENABLED: bool = True  # 是否记录各阶段耗时
+    LATENCY_REPORT_INTERVAL: int = 60  # 分位数日志输出间隔(秒)，0为关闭
+    LATENCY_DUMP_FILE: str = 'latency.json'  # 分位数定期写入的文件，为空则不写
+    LATENCY_HTTP_PORT: int = 0  # 本地指标接口端口(GET /metrics)，0为关闭
+
+    # 持仓状态持久化配置
+    STATE_DIR: str = 'state'  # 预写日志和检查点目录，为空则不保存（重启后持仓状态丢失）
+    STATE_CHECKPOINT_EVERY: int = 256  # 预写日志累计多少条后写一次检查点
+
+    # 多进程分片配置
+    SHARD_WORKERS: int = 0  # 分片进程数，0为单进程运行
+    SHARD_COORDINATOR: str = '127.0.0.1:7850'  # 协调器地址，多主机运行时各分片连接到这里
+    SHARD_MAX_EXPOSURE: float = 1.0  # 所有分片持仓名义金额合计占余额的上限
+
+    # 交易/tick二进制日志配置
+    JOURNAL_DIR: str = 'journal'  # 按日期分文件的定长记录，为空则不记录
+    JOURNAL_FLUSH_INTERVAL: float = 1.0  # tick记录批量写盘间隔(秒)，成交记录立即写盘
+
     # 交易配置
     TESTNET: bool = False
     LEVERAGE: int = 10
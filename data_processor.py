@@ -1,10 +1,155 @@
-import pandas as pd
 import numpy as np
 from config import TradingConfig
 import logging
 
 logger = logging.getLogger('data_processor')
 
+
+class IncrementalRSI:
+    """按K线增量维护Wilder RSI，每次更新为O(1)
+
+    只保存最后一根已收盘K线的avg_gain/avg_loss和收盘价，正在形成的K线变化时
+    只重算最后一步，新K线开盘时再把上一根K线滚动进平滑状态。
+    数值与DataProcessor.calculate_rsi在同一窗口上的结果一致。
+    """
+
+    def __init__(self, period=14, loss_floor=0.0001):
+        self.period = period
+        # avg_loss为0时的替代值（与calculate_rsi一致）；为None时不做替换
+        self.loss_floor = loss_floor
+        self.reset()
+
+    def reset(self):
+        self.closed_count = 0  # 已收盘K线数量
+        self.last_closed_close = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.forming_time = None  # 正在形成的K线开盘时间
+        self.forming_close = None
+        self.value = None
+
+    def _step(self, index, close, avg_gain, avg_loss):
+        """计算第index根K线收盘后的(avg_gain, avg_loss)；预热阶段存放的是累计和"""
+        if index == 0:
+            return 0.0, 0.0
+        delta = close - self.last_closed_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        period = self.period
+        if index < period:
+            avg_gain += gain
+            avg_loss += loss
+            if index == period - 1:
+                # 首个均值：rolling(period)窗口内第一个差值为NaN按0处理
+                avg_gain /= period
+                avg_loss /= period
+            return avg_gain, avg_loss
+        return (avg_gain * (period - 1) + gain) / period, (avg_loss * (period - 1) + loss) / period
+
+    def _to_rsi(self, avg_gain, avg_loss):
+        if avg_loss == 0:
+            if self.loss_floor is not None:
+                avg_loss = self.loss_floor
+            elif avg_gain == 0:
+                return float('nan')
+            else:
+                return 100.0
+        rs = avg_gain / avg_loss
+        return 100 - (100 / (1 + rs))
+
+    def _commit_forming(self):
+        """把正在形成的K线作为已收盘K线滚动进平滑状态"""
+        self.avg_gain, self.avg_loss = self._step(self.closed_count, self.forming_close, self.avg_gain, self.avg_loss)
+        self.last_closed_close = self.forming_close
+        self.closed_count += 1
+
+    def update(self, open_time, close):
+        """用一根K线（开盘时间, 收盘价）更新RSI，返回当前RSI；数据不足时返回None
+
+        开盘时间与正在形成的K线相同则原地更新，更大则视为新K线开盘，更小的旧K线被忽略。
+        """
+        if self.forming_time is not None:
+            if open_time < self.forming_time:
+                return self.value
+            if open_time > self.forming_time:
+                self._commit_forming()
+        self.forming_time = open_time
+        self.forming_close = close
+
+        index = self.closed_count
+        if index < self.period - 1:
+            self.value = None
+            return None
+        avg_gain, avg_loss = self._step(index, close, self.avg_gain, self.avg_loss)
+        self.value = self._to_rsi(avg_gain, avg_loss)
+        return self.value
+
+    def value_at(self, close):
+        """正在形成的K线收盘价为close时的RSI，不修改状态；数据不足时返回None"""
+        index = self.closed_count
+        if index < self.period - 1:
+            return None
+        return self._to_rsi(*self._step(index, close, self.avg_gain, self.avg_loss))
+
+    def price_for_rsi(self, target):
+        """正在形成的K线RSI恰好等于target时的收盘价（闭式解），数据不足时返回None
+
+        已收盘K线的平滑状态在K线形成期间不变，RSI只随收盘价单调变化，
+        因此"RSI >= target"等价于"收盘价 >= 返回值"，每根K线开盘后计算一次即可。
+        """
+        index = self.closed_count
+        if index < self.period - 1 or index == 0:
+            return None
+        if target >= 100:
+            return float('inf')
+        if target <= 0:
+            return float('-inf')
+        period = self.period
+        # 本根K线涨跌幅为0时的平均涨跌幅，收盘价变化d对应的涨跌幅再按d/period计入
+        if index < period:
+            base_gain, base_loss = self.avg_gain / period, self.avg_loss / period  # 预热阶段存放的是累计和
+        else:
+            base_gain = self.avg_gain * (period - 1) / period
+            base_loss = self.avg_loss * (period - 1) / period
+        rs = target / (100 - target)
+        loss = base_loss if base_loss > 0 or self.loss_floor is None else self.loss_floor
+        if base_gain < rs * loss:
+            # 需要上涨: (base_gain + d/period) / loss = rs
+            return self.last_closed_close + period * (rs * loss - base_gain)
+        # 收盘价不变时RSI已达到target，求下跌幅度: base_gain / (base_loss + x/period) = rs
+        return self.last_closed_close - period * (base_gain / rs - base_loss)
+
+    def warm_start(self, open_times, closes, avg_gain, avg_loss):
+        """用批量计算得到的平滑状态直接初始化（见DataProcessor.calculate_rsi_batch）
+
+        avg_gain/avg_loss为倒数第二根K线（最后一根已收盘K线）处的平均涨跌幅，
+        最后一根K线视为正在形成的K线。
+        """
+        self.reset()
+        if len(closes) <= self.period:
+            # 倒数第二根K线处还没有平滑值（批量结果为NaN），逐根同步
+            return self.sync(open_times, closes)
+        self.closed_count = len(closes) - 1
+        self.last_closed_close = float(closes[-2])
+        self.avg_gain = float(avg_gain)
+        self.avg_loss = float(avg_loss)
+        return self.update(open_times[-1], float(closes[-1]))
+
+    def sync(self, open_times, closes):
+        """用一段K线窗口（按时间升序）同步状态，只处理不早于当前形成K线的部分"""
+        start = 0
+        if self.forming_time is not None:
+            start = len(open_times)
+            while start > 0 and open_times[start - 1] >= self.forming_time:
+                start -= 1
+            if start == 0 and len(open_times) and open_times[0] > self.forming_time:
+                # 与已有状态之间存在缺口，无法连续平滑，重新预热
+                self.reset()
+        for i in range(start, len(open_times)):
+            self.update(open_times[i], closes[i])
+        return self.value
+
+
 class DataProcessor:
     @staticmethod
     def calculate_rsi(data, period=14):
@@ -36,36 +181,82 @@ class DataProcessor:
         data['rsi'] = rsi
         return data
 
+    @staticmethod
+    def calculate_rsi_batch(closes, period=14, loss_floor=0.0001, return_averages=False):
+        """批量计算多个交易对的Wilder RSI
+
+        closes为(交易对数 × K线数)的收盘价矩阵，返回同形状的RSI矩阵，前period-1列为NaN。
+        平滑递推沿时间轴逐列进行，每一步对所有交易对向量化计算，结果与calculate_rsi逐个计算一致。
+        return_averages为True时额外返回(avg_gain, avg_loss)矩阵，可用于IncrementalRSI.warm_start。
+        """
+        closes = np.asarray(closes, dtype=np.float64)
+        if closes.ndim == 1:
+            closes = closes[np.newaxis, :]
+        n_symbols, n_bars = closes.shape
+
+        avg_gain = np.full((n_symbols, n_bars), np.nan)
+        avg_loss = np.full((n_symbols, n_bars), np.nan)
+        if n_bars >= period:
+            # 分离涨跌幅（第一列差值按0处理，与calculate_rsi一致）
+            deltas = np.zeros_like(closes)
+            deltas[:, 1:] = np.diff(closes, axis=1)
+            gains = np.where(deltas > 0, deltas, 0.0)
+            losses = np.where(deltas < 0, -deltas, 0.0)
+
+            # 首个均值为前period个点的简单平均
+            gain = gains[:, :period].mean(axis=1)
+            loss = losses[:, :period].mean(axis=1)
+            avg_gain[:, period - 1] = gain
+            avg_loss[:, period - 1] = loss
+
+            # Wilder平滑：沿时间轴递推，交易对维度向量化
+            keep = (period - 1) / period
+            gains_scaled = gains / period
+            losses_scaled = losses / period
+            for i in range(period, n_bars):
+                gain = gain * keep + gains_scaled[:, i]
+                loss = loss * keep + losses_scaled[:, i]
+                avg_gain[:, i] = gain
+                avg_loss[:, i] = loss
+
+        # 避免除以零
+        divisor = avg_loss
+        if loss_floor is not None:
+            divisor = np.where(avg_loss == 0, loss_floor, avg_loss)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100 - (100 / (1 + avg_gain / divisor))
+        if return_averages:
+            return rsi, avg_gain, avg_loss
+        return rsi
+
+    def __init__(self, config=None):
+        self.config = config or TradingConfig()
+
     def process_kline_data(self, kline_data, state):
-        """处理K线数据并更新交易状态"""
+        """处理K线数据并更新交易状态，返回(K线缓冲区, RSI)"""
         try:
             # 提取K线数据
-            symbol = kline_data['k']['s']
-            close_price = float(kline_data['k']['c'])
-            timestamp = pd.to_datetime(kline_data['k']['t'], unit='ms')
-
-            # 添加到K线列表
-            # 如果是新K线，添加新记录；否则更新最后一条记录
-            if not state.klines or state.klines[-1]['timestamp'] != timestamp:
-                state.klines.append({
-                    'timestamp': timestamp,
-                    'close': close_price
-                })
+            kline = kline_data['k']
+            symbol = kline['s']
+            close_price = float(kline['c'])
+            timestamp = int(kline['t'])
+
+            if state.timeframes is not None:
+                # 推送的是基础周期K线，聚合到主周期和确认周期（同时更新state.klines和state.rsi）
+                state.timeframes.update(timestamp, float(kline['o']), float(kline['h']), float(kline['l']),
+                                        close_price, float(kline['v']))
+                rsi_value = state.rsi.value
             else:
-                state.klines[-1]['close'] = close_price
-
-            # 保持K线列表长度
-            max_klines = self.config.RSI_PERIOD + 10
-            if len(state.klines) > max_klines:
-                state.klines.pop(0)
-
-            # 当有足够数据时计算RSI
-            if len(state.klines) >= self.config.RSI_PERIOD:
-                df = pd.DataFrame(state.klines)
-                rsi_value = DataProcessor.calculate_rsi(df, self.config.RSI_PERIOD)
-                logger.info(f"[{symbol}] 当前RSI: {rsi_value:.2f}, 价格: {close_price}")
-                return df, rsi_value
+                # 新K线追加到环形缓冲区，否则原地更新最后一根K线
+                state.klines.update(timestamp, float(kline['o']), float(kline['h']), float(kline['l']),
+                                    close_price, float(kline['v']))
+
+                # 增量更新RSI，无需重建DataFrame
+                rsi_value = state.rsi.update(timestamp, close_price)
+            if rsi_value is not None:
+                logger.info("[%s] 当前RSI: %.2f, 价格: %s", symbol, rsi_value, close_price)
+                return state.klines, rsi_value
             return None, None
         except Exception as e:
             logger.error(f"处理K线数据错误: {e}")
-            return None, None
\ No newline at end of file
+            return None, None
@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from backtest import INTERVAL_MS
+
+logger = logging.getLogger('fake_exchange')
+
+
+def load_fixture(path):
+    """读取录制的行情夹具（.json或.json.gz）"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_fixture(fixture, path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        json.dump(fixture, f, separators=(',', ':'))
+
+
+def record_fixture(client, symbols, interval, limit=1000):
+    """从交易所录制K线和ticker，格式与REST返回一致"""
+    klines = {symbol: client.get_klines(symbol=symbol, interval=interval, limit=limit) for symbol in symbols}
+    wanted = set(symbols)
+    tickers = [t for t in client.get_symbol_ticker() if t['symbol'] in wanted]
+    return {'interval': interval, 'recorded_at': int(time.time() * 1000), 'klines': klines, 'tickers': tickers}
+
+
+def synthetic_fixture(symbols, bars=1000, interval='15m', seed=0):
+    """生成确定性的随机游走K线夹具，没有录制数据时使用，保证基准可复现"""
+    rng = random.Random(seed)
+    step = INTERVAL_MS[interval]
+    end = 1_700_000_000_000 - 1_700_000_000_000 % step
+    klines = {}
+    for symbol in symbols:
+        price = rng.uniform(0.01, 100.0)
+        rows = []
+        for i in range(bars):
+            open_time = end - (bars - i) * step
+            # 偶尔出现连续单边行情，使RSI能触及超买/超卖阈值
+            drift = rng.choice((0.0, 0.0, 0.0, 0.004, -0.004))
+            close = price * (1 + drift + rng.gauss(0, 0.003))
+            high = max(price, close) * (1 + abs(rng.gauss(0, 0.001)))
+            low = min(price, close) * (1 - abs(rng.gauss(0, 0.001)))
+            volume = rng.uniform(1000, 100000)
+            rows.append([open_time, f"{price:.8f}", f"{high:.8f}", f"{low:.8f}", f"{close:.8f}", f"{volume:.2f}",
+                         open_time + step - 1, f"{volume * close:.8f}", rng.randint(10, 1000), '0', '0', '0'])
+            price = close
+        klines[symbol] = rows
+    tickers = [{'symbol': s, 'price': rows[-1][4]} for s, rows in klines.items()]
+    return {'interval': interval, 'recorded_at': end, 'klines': klines, 'tickers': tickers}
+
+
+def expand_fixture(fixture, count):
+    """夹具中的交易对不足count个时，循环复用已有序列并生成新的交易对名称"""
+    names = list(fixture['klines'])
+    if len(names) >= count:
+        klines = {name: fixture['klines'][name] for name in names[:count]}
+    else:
+        klines = {}
+        for i in range(count):
+            source = names[i % len(names)]
+            klines[source if i < len(names) else f"BENCH{i:04d}USDT"] = fixture['klines'][source]
+    return {**fixture, 'klines': klines}
+
+
+class FakeExchange:
+    """本地模拟的Binance REST与websocket行情服务，回放夹具中的K线
+
+    每个交易对有一个游标，REST只返回游标之前的K线（最后一根视为正在形成的K线）；
+    每次带startTime的K线请求或每次websocket推送都会把游标前进一根，模拟行情推进。
+    latency/jitter为每个REST请求和每轮推送附加的延迟(秒)。
+    """
+
+    def __init__(self, fixture, latency=0.0, jitter=0.0, start_bars=None, advance=True):
+        self.fixture = fixture
+        self.interval = fixture['interval']
+        self.latency = latency
+        self.jitter = jitter
+        self.advance = advance
+        self._klines = {symbol: rows for symbol, rows in fixture['klines'].items()}
+        self._times = {symbol: [row[0] for row in rows] for symbol, rows in self._klines.items()}
+        self._start_bars = start_bars
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+        self.requests = 0
+        self.pushed = 0
+        self._http = None
+        self._ws_loop = None
+        self._ws_server = None
+        self._ws_connections = set()
+        self.rest_url = None
+        self.ws_url = None
+        self.reset()
+
+    def reset(self, start_bars=None):
+        """把所有交易对的游标放回起点"""
+        start = start_bars or self._start_bars
+        with self._lock:
+            self._cursor = {s: min(len(rows), start or len(rows) // 2) for s, rows in self._klines.items()}
+            self.requests = 0
+            self.pushed = 0
+
+    def _delay(self):
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def klines(self, symbol, limit=500, start_time=None, end_time=None):
+        rows = self._klines[symbol]
+        with self._lock:
+            cursor = self._cursor[symbol]
+            if self.advance and start_time is not None and cursor < len(rows):
+                cursor = self._cursor[symbol] = cursor + 1
+        if start_time is not None:
+            start = bisect_left(self._times[symbol], start_time, 0, cursor)
+            rows = rows[start:min(cursor, start + limit)]
+        else:
+            rows = rows[max(0, cursor - limit):cursor]
+        if end_time is not None:
+            rows = [r for r in rows if r[0] <= end_time]
+        return rows
+
+    def skip(self, symbol, bars):
+        """不推送地把游标前进bars根，模拟断线期间行情继续"""
+        with self._lock:
+            self._cursor[symbol] = min(len(self._klines[symbol]), self._cursor[symbol] + bars)
+
+    def open_time(self, symbol, index):
+        return self._times[symbol][index]
+
+    def price(self, symbol):
+        with self._lock:
+            return self._klines[symbol][self._cursor[symbol] - 1][4]
+
+    def tickers(self):
+        return [{'symbol': symbol, 'price': self.price(symbol)} for symbol in self._klines]
+
+    def premium_index(self, symbol):
+        price = self.price(symbol)
+        return {'symbol': symbol, 'markPrice': price, 'indexPrice': price, 'lastFundingRate': '0.00010000',
+                'nextFundingTime': 0, 'time': int(time.time() * 1000)}
+
+    def handle(self, method, path, params):
+        """按REST路径返回(状态码, 响应体)"""
+        self.requests += 1
+        symbol = params.get('symbol')
+        if symbol is not None and symbol not in self._klines:
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}
+        if path in ('/api/v3/ping', '/fapi/v1/ping'):
+            return 200, {}
+        if path in ('/api/v3/time', '/fapi/v1/time'):
+            return 200, {'serverTime': int(time.time() * 1000)}
+        if path in ('/api/v3/klines', '/fapi/v1/klines'):
+            start_time = params.get('startTime')
+            end_time = params.get('endTime')
+            return 200, self.klines(symbol, int(params.get('limit', 500)),
+                                    int(start_time) if start_time else None,
+                                    int(end_time) if end_time else None)
+        if path in ('/api/v3/ticker/price', '/fapi/v1/ticker/price'):
+            return 200, {'symbol': symbol, 'price': self.price(symbol)} if symbol else self.tickers()
+        if path == '/fapi/v1/premiumIndex':
+            return 200, self.premium_index(symbol) if symbol else [self.premium_index(s) for s in self._klines]
+        if path in ('/api/v3/exchangeInfo', '/fapi/v1/exchangeInfo'):
+            return 200, {'symbols': [{'symbol': s, 'status': 'TRADING', 'contractType': 'PERPETUAL',
+                                      'quoteAsset': 'USDT'} for s in self._klines]}
+        if path == '/fapi/v2/balance':
+            return 200, [{'asset': 'USDT', 'balance': '10000.0', 'availableBalance': '10000.0'}]
+        if path == '/fapi/v2/positionRisk':
+            return 200, [{'symbol': s, 'positionAmt': '0', 'entryPrice': '0.0'} for s in self._klines]
+        if path == '/fapi/v1/leverage':
+            return 200, {'symbol': symbol, 'leverage': int(params.get('leverage', 1))}
+        if path == '/fapi/v1/order' and method == 'POST':
+            # 与U本位合约下单回报一致：没有fills，RESULT回报的avgPrice为成交均价，默认ACK回报为0
+            quantity = params.get('quantity', '0')
+            order = {'symbol': symbol, 'orderId': self.requests, 'clientOrderId': f"fake{self.requests}",
+                     'side': params.get('side'), 'type': params.get('type'), 'origQty': quantity,
+                     'updateTime': int(time.time() * 1000)}
+            if params.get('newOrderRespType') == 'RESULT':
+                price = self.price(symbol)
+                order.update(status='FILLED', avgPrice=price, executedQty=quantity,
+                             cumQuote=f"{float(price) * float(quantity):.8f}")
+            else:
+                order.update(status='NEW', avgPrice='0.00', executedQty='0', cumQuote='0')
+            return 200, order
+        return 404, {'code': -1, 'msg': f'Unknown path {path}'}
+
+    def start(self, host='127.0.0.1', port=0, ws_port=0, ws=True):
+        """在后台线程启动REST（和websocket）服务，返回REST地址"""
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # 保持连接，与真实交易所一致
+
+            def setup(self):
+                super().setup()
+                # 响应头和响应体分两次写出，关闭Nagle避免与延迟ACK叠加出40ms的额外延迟
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _serve(self, method):
+                url = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    params.update({k: v[-1] for k, v in parse_qs(self.rfile.read(length).decode()).items()})
+                exchange._delay()
+                status, payload = exchange.handle(method, url.path, params)
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('X-MBX-USED-WEIGHT-1M', '0')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+            def do_DELETE(self):
+                self._serve('DELETE')
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http = ThreadingHTTPServer((host, port), Handler)
+        self._http.daemon_threads = True
+        threading.Thread(target=self._http.serve_forever, name='fake-exchange-rest', daemon=True).start()
+        self.rest_url = f"http://{host}:{self._http.server_address[1]}"
+        if ws:
+            self._start_ws(host, ws_port)
+        return self.rest_url
+
+    def stop(self):
+        if self._http is not None:
+            self._http.shutdown()
+            self._http.server_close()
+            self._http = None
+        if self._ws_loop is not None:
+            self._ws_loop.call_soon_threadsafe(self._ws_server.close)
+            self._ws_loop = None
+
+    # websocket组合流
+
+    def disconnect(self):
+        """由服务端断开所有websocket连接，模拟断线"""
+        if self._ws_loop is None:
+            return
+        for connection in list(self._ws_connections):
+            asyncio.run_coroutine_threadsafe(connection.close(), self._ws_loop)
+
+    def push_event(self, symbol):
+        """推进一根K线并返回对应的kline推送事件，已回放到末尾时返回None"""
+        with self._lock:
+            rows = self._klines[symbol]
+            cursor = self._cursor[symbol]
+            if cursor >= len(rows):
+                return None
+            self._cursor[symbol] = cursor + 1
+            row = rows[cursor]
+        self.pushed += 1
+        return {
+            'e': 'kline', 'E': int(time.time() * 1000), 's': symbol,
+            'k': {'t': row[0], 'T': row[6], 's': symbol, 'i': self.interval, 'o': row[1], 'h': row[2],
+                  'l': row[3], 'c': row[4], 'v': row[5], 'x': False},
+        }
+
+    def _start_ws(self, host, port):
+        import websockets
+
+        logging.getLogger('websockets').setLevel(logging.WARNING)
+        started = threading.Event()
+        exchange = self
+
+        async def stream(connection):
+            subscribed = []
+            stop = asyncio.Event()
+
+            async def pusher():
+                while not stop.is_set():
+                    if not subscribed:
+                        await asyncio.sleep(0.01)
+                        continue
+                    await asyncio.sleep(exchange.latency)
+                    sent = 0
+                    for name in list(subscribed):
+                        event = exchange.push_event(name.split('@')[0].upper())
+                        if event is None:
+                            continue
+                        try:
+                            await connection.send(json.dumps({'stream': name, 'data': event}))
+                        except websockets.ConnectionClosed:
+                            return
+                        sent += 1
+                    if not sent:
+                        await asyncio.sleep(0.05)
+
+            task = asyncio.ensure_future(pusher())
+            exchange._ws_connections.add(connection)
+            try:
+                async for message in connection:
+                    request = json.loads(message)
+                    if request.get('method') == 'SUBSCRIBE':
+                        subscribed.extend(request['params'])
+                        await connection.send(json.dumps({'result': None, 'id': request.get('id')}))
+            except websockets.ConnectionClosed:
+                pass
+            finally:
+                exchange._ws_connections.discard(connection)
+                stop.set()
+                task.cancel()
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+
+            async def serve():
+                self._ws_server = await websockets.serve(stream, host, port, max_size=None)
+                started.set()
+                await self._ws_server.wait_closed()
+
+            self._ws_loop = loop
+            loop.run_until_complete(serve())
+
+        threading.Thread(target=run, name='fake-exchange-ws', daemon=True).start()
+        started.wait(5)
+        self.ws_url = f"ws://{host}:{self._ws_server.sockets[0].getsockname()[1]}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地模拟交易所：录制行情夹具或回放夹具提供REST/websocket服务')
+    sub = parser.add_subparsers(dest='command', required=True)
+    rec = sub.add_parser('record', help='从Binance录制K线与ticker夹具')
+    rec.add_argument('symbols', nargs='+')
+    rec.add_argument('--interval', default='15m')
+    rec.add_argument('--limit', type=int, default=1000)
+    rec.add_argument('--output', required=True, help='夹具文件(.json或.json.gz)')
+    srv = sub.add_parser('serve', help='回放夹具')
+    srv.add_argument('--fixture', default=None, help='夹具文件，为空则生成随机游走K线')
+    srv.add_argument('--symbols', type=int, default=50, help='交易对数量')
+    srv.add_argument('--latency', type=float, default=0.0, help='每个请求附加的延迟(秒)')
+    srv.add_argument('--jitter', type=float, default=0.0)
+    srv.add_argument('--port', type=int, default=8080)
+    srv.add_argument('--ws-port', type=int, default=8081)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == 'record':
+        from binance.client import Client
+        from config import TradingConfig
+        client = Client(requests_params={'proxies': TradingConfig().PROXIES})
+        save_fixture(record_fixture(client, args.symbols, args.interval, args.limit), args.output)
+        logger.info(f"已录制{len(args.symbols)}个交易对的{args.interval}K线到{args.output}")
+    else:
+        fixture = load_fixture(args.fixture) if args.fixture else synthetic_fixture(['ACHUSDT'])
+        exchange = FakeExchange(expand_fixture(fixture, args.symbols), args.latency, args.jitter)
+        exchange.start(port=args.port, ws_port=args.ws_port)
+        logger.info(f"REST: {exchange.rest_url}  websocket: {exchange.ws_url}")
+        logger.info(f"设置BINANCE_REST_BASE_URL={exchange.rest_url} BINANCE_WS_BASE_URL={exchange.ws_url}后启动main.py")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            exchange.stop()
@@ -0,0 +1,111 @@
+import numpy as np
+
+
+class KlineBuffer:
+    """固定容量、基于NumPy的K线环形缓冲区
+
+    每个字段使用两倍容量的数组，写入时同时写到i和i+capacity两个位置，
+    因此任意时刻按时间排序的数据都是一段连续内存，各属性返回零拷贝视图。
+    新K线追加，同一开盘时间的K线原地更新，追加和更新都不分配Python对象。
+    """
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._open_time = np.zeros(2 * capacity, dtype=np.int64)
+        self._data = np.zeros((len(self.FIELDS), 2 * capacity), dtype=np.float64)
+        self._start = 0  # 最早一根K线的位置
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def _write(self, pos, open_time, open_, high, low, close, volume):
+        mirror = pos + self.capacity
+        self._open_time[pos] = self._open_time[mirror] = open_time
+        data = self._data
+        data[0, pos] = data[0, mirror] = open_
+        data[1, pos] = data[1, mirror] = high
+        data[2, pos] = data[2, mirror] = low
+        data[3, pos] = data[3, mirror] = close
+        data[4, pos] = data[4, mirror] = volume
+
+    def update(self, open_time, open_, high, low, close, volume=0.0):
+        """追加新K线或原地更新最后一根K线，早于最后一根的K线被忽略，返回是否写入"""
+        if self._size:
+            last = (self._start + self._size - 1) % self.capacity
+            last_time = self._open_time[last]
+            if open_time == last_time:
+                self._write(last, open_time, open_, high, low, close, volume)
+                return True
+            if open_time < last_time:
+                return False
+        if self._size < self.capacity:
+            pos = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            # 缓冲区已满，覆盖最早的K线
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+        self._write(pos, open_time, open_, high, low, close, volume)
+        return True
+
+    def update_from_rest(self, klines):
+        """用REST K线数组更新缓冲区，只解析不早于最后一根K线的部分，返回写入的K线数量"""
+        start = len(klines)
+        if self._size and klines and int(klines[0][0]) > self.last_open_time:
+            # 与已有数据之间存在缺口，丢弃旧数据
+            self.clear()
+        if self._size:
+            last_time = self.last_open_time
+            while start > 0 and int(klines[start - 1][0]) >= last_time:
+                start -= 1
+        else:
+            start = max(0, len(klines) - self.capacity)
+        for k in klines[start:]:
+            self.update(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+        return len(klines) - start
+
+    def _view(self, array):
+        return array[self._start:self._start + self._size]
+
+    @property
+    def open_times(self):
+        return self._view(self._open_time)
+
+    @property
+    def opens(self):
+        return self._view(self._data[0])
+
+    @property
+    def highs(self):
+        return self._view(self._data[1])
+
+    @property
+    def lows(self):
+        return self._view(self._data[2])
+
+    @property
+    def closes(self):
+        return self._view(self._data[3])
+
+    @property
+    def volumes(self):
+        return self._view(self._data[4])
+
+    @property
+    def last_open_time(self):
+        if not self._size:
+            return None
+        return int(self._open_time[self._start + self._size - 1])
+
+    @property
+    def last_close(self):
+        if not self._size:
+            return None
+        return float(self._data[3, self._start + self._size - 1])
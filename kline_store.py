@@ -0,0 +1,115 @@
+import logging
+import os
+import threading
+
+import numpy as np
+
+logger = logging.getLogger('trading_system')
+
+# 磁盘上每根K线的定长记录
+KLINE_DTYPE = np.dtype([
+    ('open_time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+
+def fetch_pages(fetch, start_time, page_limit=1000, first_limit=99):
+    """从start_time开始分页获取到最新的K线，fetch(start_time, limit)返回REST K线数组
+
+    平时只差一两根K线，第一页用较小的limit（合约K线limit<100权重为1），
+    第一页取满说明落后较多，再按page_limit分页追赶。
+    """
+    limit = min(first_limit, page_limit)
+    klines = page = fetch(start_time, limit)
+    # startTime包含本身，相邻两页重叠一根
+    while len(page) >= limit:
+        limit = page_limit
+        page = fetch(int(page[-1][0]), limit)
+        klines = klines[:-1] + page
+    return klines
+
+
+class KlineStore:
+    """本地K线缓存，按(市场, 交易对, 周期)分文件保存已收盘K线
+
+    每个文件是只追加的定长二进制记录(KLINE_DTYPE)，读取时通过np.memmap映射，
+    重启后可直接从磁盘预热，再只向交易所请求最后一根已收盘K线之后的数据。
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._locks = {}
+        self._last_open_time = {}  # key -> 已保存的最后一根K线开盘时间
+        self._guard = threading.Lock()
+
+    def path(self, market, symbol, interval):
+        return os.path.join(self.root_dir, market, f"{symbol.upper()}_{interval}.bin")
+
+    def _lock(self, key):
+        with self._guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def load(self, market, symbol, interval, limit=None):
+        """读取已保存的K线（按时间升序），limit指定只取最后若干根，返回只读memmap"""
+        path = self.path(market, symbol, interval)
+        count = os.path.getsize(path) // KLINE_DTYPE.itemsize if os.path.exists(path) else 0
+        if count == 0:
+            return np.empty(0, dtype=KLINE_DTYPE)
+        records = np.memmap(path, dtype=KLINE_DTYPE, mode='r', shape=(count,))
+        if limit is not None:
+            records = records[-limit:]
+        return records
+
+    def last_open_time(self, market, symbol, interval):
+        key = (market, symbol, interval)
+        if key not in self._last_open_time:
+            records = self.load(market, symbol, interval, limit=1)
+            self._last_open_time[key] = int(records['open_time'][-1]) if len(records) else None
+        return self._last_open_time[key]
+
+    def append(self, market, symbol, interval, klines):
+        """追加已收盘的REST K线数组，已保存过的K线被跳过，返回新写入的数量"""
+        key = (market, symbol, interval)
+        with self._lock(key):
+            last_time = self.last_open_time(market, symbol, interval)
+            rows = [k for k in klines if last_time is None or int(k[0]) > last_time]
+            if not rows:
+                return 0
+            records = np.empty(len(rows), dtype=KLINE_DTYPE)
+            for i, k in enumerate(rows):
+                records[i] = (int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+            path = self.path(market, symbol, interval)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'ab') as f:
+                f.write(records.tobytes())
+            self._last_open_time[key] = int(records['open_time'][-1])
+            return len(rows)
+
+    def warm_buffer(self, market, symbol, interval, buffer):
+        """把磁盘上最近的K线写入KlineBuffer，返回写入数量"""
+        records = self.load(market, symbol, interval, limit=buffer.capacity)
+        for r in records:
+            buffer.update(int(r['open_time']), r['open'], r['high'], r['low'], r['close'], r['volume'])
+        return len(records)
+
+    def fetch_incremental(self, market, symbol, interval, fetch, start_time=None, warmup_limit=500, page_limit=1000):
+        """只请求start_time（默认为已保存的最后一根K线）之后的数据并保存新收盘的K线
+
+        fetch(start_time, limit)返回REST K线数组，start_time为None时返回最近limit根。
+        REST返回的最后一根K线是正在形成的K线，不写入磁盘。返回本次获取到的全部K线。
+        """
+        if start_time is None:
+            start_time = self.last_open_time(market, symbol, interval)
+        if start_time is None:
+            klines = fetch(None, warmup_limit)
+        else:
+            klines = fetch_pages(fetch, start_time, page_limit)
+        if len(klines) > 1:
+            self.append(market, symbol, interval, klines[:-1])
+        return klines
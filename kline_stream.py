@@ -0,0 +1,204 @@
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import websocket
+
+from kline_store import fetch_pages
+
+logger = logging.getLogger('trading_system')
+
+
+class KlineStream:
+    """通过Binance组合流(<symbol>@kline_<interval>)推送K线数据
+
+    断线后自动重连并重新订阅，重连成功后在独立线程中用REST分页补齐断线期间缺失的K线，
+    补齐前收到的该交易对推送暂存，补齐后再按顺序处理。
+    base_url可指向本地的模拟websocket服务器用于测试。
+    """
+
+    SUBSCRIBE_CHUNK = 200  # 每条SUBSCRIBE消息最多订阅的流数量
+    LABEL = 'K线'  # 日志中的连接名称
+    THREAD_NAME = 'kline-stream'
+
+    def __init__(self, client, config, symbols, on_kline, base_url=None, interval=None):
+        self.client = client
+        self.config = config
+        # 订阅的K线周期，本地聚合时为BASE_INTERVAL
+        self.interval = interval or config.BASE_INTERVAL or config.INTERVAL
+        self.symbols = list(symbols)
+        # 回调: on_kline(kline_data, live)，kline_data与websocket的data字段格式一致，
+        # live为False表示补数据阶段的历史K线，不应触发交易判断
+        self.on_kline = on_kline
+        self.base_url = (base_url or config.WS_BASE_URL).rstrip('/')
+        self.last_open_time = {}  # 每个交易对最近一根K线的开盘时间(ms)
+        self.ws = None
+        self.connected = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._request_id = 0
+        # 补数据状态：_generation每次连接加一，旧连接的补数据线程发现后放弃
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._backfilling = set()  # 正在补数据的交易对
+        self._held = {}  # 补数据期间暂存的推送，按到达顺序
+
+    @property
+    def streams(self):
+        return [f"{symbol.lower()}@kline_{self.interval}" for symbol in self.symbols]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.THREAD_NAME, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self.ws is not None:
+            self.ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _proxy_options(self):
+        """根据配置返回websocket代理参数，本地地址不走代理"""
+        host = urlparse(self.base_url).hostname
+        proxy = (self.config.PROXIES or {}).get('https')
+        if not proxy or host in ('127.0.0.1', 'localhost'):
+            return {}
+        parsed = urlparse(proxy)
+        return {
+            'http_proxy_host': parsed.hostname,
+            'http_proxy_port': parsed.port,
+            'proxy_type': 'http',
+        }
+
+    def _run(self):
+        delay = self.config.WS_RECONNECT_DELAY
+        while not self._stop.is_set():
+            self.ws = websocket.WebSocketApp(
+                f"{self.base_url}/stream",
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            started = time.monotonic()
+            self.ws.run_forever(ping_interval=self.config.WS_PING_INTERVAL, ping_timeout=10,
+                                **self._proxy_options())
+            self.connected.clear()
+            if self._stop.is_set():
+                break
+            # 连接保持足够久则重置退避时间
+            if time.monotonic() - started > self.config.WS_MAX_RECONNECT_DELAY:
+                delay = self.config.WS_RECONNECT_DELAY
+            logger.warning(f"{self.LABEL}websocket连接断开，{delay}秒后重连")
+            self._stop.wait(delay)
+            delay = min(delay * 2, self.config.WS_MAX_RECONNECT_DELAY)
+
+    def _on_open(self, ws):
+        logger.info(f"{self.LABEL}websocket已连接: {self.base_url}")
+        streams = self.streams
+        for i in range(0, len(streams), self.SUBSCRIBE_CHUNK):
+            self._request_id += 1
+            ws.send(json.dumps({
+                'method': 'SUBSCRIBE',
+                'params': streams[i:i + self.SUBSCRIBE_CHUNK],
+                'id': self._request_id,
+            }))
+        self.connected.set()
+        # 订阅后再补数据，补数据期间推送的K线暂存不会丢失；REST请求不阻塞推送线程
+        with self._lock:
+            self._generation += 1
+            start_times = dict(self.last_open_time)
+            self._backfilling = set(start_times)
+            self._held.clear()
+        if start_times:
+            threading.Thread(target=self.backfill, args=(start_times, self._generation),
+                             name=f"{self.THREAD_NAME}-backfill", daemon=True).start()
+
+    def _on_message(self, ws, message):
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            logger.error(f"无法解析websocket消息: {message[:200]}")
+            return
+        data = payload.get('data')
+        if not data or data.get('e') != 'kline':
+            # 订阅确认等非K线消息
+            return
+        symbol = data['k']['s']
+        open_time = int(data['k']['t'])
+        with self._lock:
+            if symbol in self._backfilling:
+                self._held.setdefault(symbol, []).append(data)
+                return
+            if open_time < self.last_open_time.get(symbol, 0):
+                return
+            self.last_open_time[symbol] = open_time
+            self._dispatch(data, live=True)
+
+    def _on_error(self, ws, error):
+        logger.error(f"{self.LABEL}websocket错误: {error}")
+
+    def _on_close(self, ws, status_code, message):
+        logger.info(f"{self.LABEL}websocket已关闭: {status_code} {message}")
+
+    def _dispatch(self, kline_data, live):
+        try:
+            self.on_kline(kline_data, live)
+        except Exception as e:
+            logger.error(f"处理{kline_data['k']['s']}推送K线失败: {e}", exc_info=True)
+
+    def backfill(self, start_times, generation):
+        """用REST分页补齐每个交易对自start_times以来缺失的K线，再处理补数据期间暂存的推送"""
+        for symbol, start_time in start_times.items():
+            if self._stop.is_set() or generation != self._generation:
+                return
+            try:
+                klines = fetch_pages(lambda start, limit: self.client.get_klines(
+                    symbol=symbol, interval=self.interval, startTime=start, limit=limit), start_time)
+            except Exception as e:
+                logger.error(f"补齐{symbol}的K线数据失败: {e}")
+                klines = []
+            with self._lock:
+                if generation != self._generation:
+                    return
+                held = self._held.pop(symbol, [])
+                for i, kline in enumerate(klines):
+                    open_time = int(kline[0])
+                    if open_time < self.last_open_time.get(symbol, 0):
+                        continue
+                    self.last_open_time[symbol] = open_time
+                    # 没有暂存推送时最后一根作为实时K线触发交易判断
+                    self._dispatch(self.rest_to_event(symbol, self.interval, kline),
+                                   live=(not held and i == len(klines) - 1))
+                for i, data in enumerate(held):
+                    open_time = int(data['k']['t'])
+                    if open_time < self.last_open_time.get(symbol, 0):
+                        continue
+                    self.last_open_time[symbol] = open_time
+                    self._dispatch(data, live=(i == len(held) - 1))
+                self._backfilling.discard(symbol)
+            if klines:
+                logger.info(f"已补齐{symbol}的{len(klines)}条K线")
+
+    @staticmethod
+    def rest_to_event(symbol, interval, kline):
+        """把REST K线数组转换为websocket kline事件格式"""
+        return {
+            'e': 'kline',
+            's': symbol,
+            'k': {
+                't': int(kline[0]),
+                'T': int(kline[6]),
+                's': symbol,
+                'i': interval,
+                'o': kline[1],
+                'h': kline[2],
+                'l': kline[3],
+                'c': kline[4],
+                'v': kline[5],
+                'x': False,
+            }
+        }
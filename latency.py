@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('trading_system')
+
+SUB_BUCKET_BITS = 5  # 每个2的幂区间分为16个子桶，相对误差约6%
+_HALF = 1 << (SUB_BUCKET_BITS - 1)
+_BUCKETS = 640  # 覆盖到约2^40纳秒(约18分钟)
+
+
+def _bucket_index(value):
+    if value < (1 << SUB_BUCKET_BITS):
+        return value if value > 0 else 0
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    index = shift * _HALF + (value >> shift)
+    return index if index < _BUCKETS else _BUCKETS - 1
+
+
+def _bucket_value(index):
+    """子桶的下界(纳秒)"""
+    if index < (1 << SUB_BUCKET_BITS):
+        return index
+    shift = index // _HALF - 1
+    return (index - shift * _HALF) << shift
+
+
+class Histogram:
+    """HDR风格的对数-线性直方图，记录为O(1)的整数运算"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        self.counts[_bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0
+        target = self.count * percent / 100
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= target:
+                return min(_bucket_value(i), self.max)
+        return self.max
+
+    def summary(self):
+        """各分位数(微秒)"""
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count / 1000 if self.count else 0.0,
+            'p50_us': self.percentile(50) / 1000,
+            'p90_us': self.percentile(90) / 1000,
+            'p99_us': self.percentile(99) / 1000,
+            'p999_us': self.percentile(99.9) / 1000,
+            'max_us': self.max / 1000,
+        }
+
+
+class LatencyRecorder:
+    """按阶段记录耗时
+
+    热路径只做一次perf_counter_ns和一次直方图计数；每个线程写自己的直方图，
+    汇总时才合并，因此记录时不需要加锁。关闭后now()和record()都是空操作。
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._local = threading.local()
+        self._all = []  # 所有线程的{stage: Histogram}
+        self._guard = threading.Lock()
+        self.started = time.time()
+
+    def _histograms(self):
+        try:
+            return self._local.histograms
+        except AttributeError:
+            histograms = self._local.histograms = {}
+            with self._guard:
+                self._all.append(histograms)
+            return histograms
+
+    def now(self):
+        """返回用于record的起点(纳秒)，关闭时返回0"""
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def record(self, stage, start):
+        """记录从start(由now()返回)到现在的耗时，返回当前时间以便串联下一阶段"""
+        if not start:
+            return 0
+        end = time.perf_counter_ns()
+        histograms = self._histograms()
+        histogram = histograms.get(stage)
+        if histogram is None:
+            histogram = histograms[stage] = Histogram()
+        histogram.record(end - start)
+        return end
+
+    @contextmanager
+    def span(self, stage):
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.record(stage, start)
+
+    def mark_tick(self):
+        """记录当前线程处理的tick起点，用于统计从tick开始到订单确认的端到端延迟"""
+        self._local.tick_start = self.now()
+
+    def record_since_tick(self, stage):
+        self.record(stage, getattr(self._local, 'tick_start', 0))
+
+    def snapshot(self):
+        """合并所有线程的直方图，返回{stage: 分位数摘要}"""
+        merged = {}
+        with self._guard:
+            thread_histograms = list(self._all)
+        for histograms in thread_histograms:
+            for stage, histogram in list(histograms.items()):
+                merged.setdefault(stage, Histogram()).merge(histogram)
+        return {stage: merged[stage].summary() for stage in sorted(merged)}
+
+    def reset(self):
+        with self._guard:
+            for histograms in self._all:
+                histograms.clear()
+        self.started = time.time()
+
+    def log_report(self):
+        for stage, s in self.snapshot().items():
+            logger.info(f"延迟[{stage}] 次数={s['count']}, p50={s['p50_us']:.0f}us, p90={s['p90_us']:.0f}us, "
+                        f"p99={s['p99_us']:.0f}us, 最大={s['max_us']:.0f}us")
+
+    def dump(self, path):
+        """把当前分位数写入JSON文件（先写临时文件再替换）"""
+        data = {'since': self.started, 'time': time.time(), 'stages': self.snapshot()}
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def serve(self, port, host='127.0.0.1'):
+        """在本地端口提供GET /metrics，返回JSON格式的分位数"""
+        recorder = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = json.dumps({'since': recorder.started, 'stages': recorder.snapshot()}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name='latency-metrics', daemon=True).start()
+        logger.info(f"延迟指标接口: http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+    def start_reporter(self, interval, dump_file=None):
+        """后台线程每interval秒输出一次分位数日志并写入dump_file"""
+        def run():
+            while True:
+                time.sleep(interval)
+                self.log_report()
+                if dump_file:
+                    try:
+                        self.dump(dump_file)
+                    except OSError as e:
+                        logger.error(f"写入延迟统计文件失败: {e}")
+
+        thread = threading.Thread(target=run, name='latency-reporter', daemon=True)
+        thread.start()
+        return thread
+
+
+# 进程内共享的记录器
+recorder = LatencyRecorder()
+
+
+def configure(config):
+    """按TradingConfig启用/关闭延迟统计并启动报告线程和指标接口"""
+    recorder.enabled = config.LATENCY_ENABLED
+    if not recorder.enabled:
+        return
+    if config.LATENCY_REPORT_INTERVAL:
+        recorder.start_reporter(config.LATENCY_REPORT_INTERVAL, config.LATENCY_DUMP_FILE or None)
+    if config.LATENCY_HTTP_PORT:
+        recorder.serve(config.LATENCY_HTTP_PORT)
@@ -0,0 +1,90 @@
+import atexit
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# 交易记录的extra参数，按trade_mode属性分流到模拟/真实交易日志，不再匹配消息文本
+TRADE_SIMULATION = {'trade_mode': 'simulation'}
+TRADE_REAL = {'trade_mode': 'real'}
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listeners = {}
+
+
+def trade_extra(simulated):
+    return TRADE_SIMULATION if simulated else TRADE_REAL
+
+
+class TradeModeFilter(logging.Filter):
+    """只放行trade_mode等于mode的记录"""
+
+    def __init__(self, mode):
+        super().__init__()
+        self.mode = mode
+
+    def filter(self, record):
+        return getattr(record, 'trade_mode', None) == self.mode
+
+
+class DeferredQueueHandler(QueueHandler):
+    """只把LogRecord放入队列，消息格式化留给后台监听线程
+
+    标准QueueHandler.prepare会在调用线程上格式化消息，这里直接入队，
+    因此日志参数应当是之后不再修改的值（数字、字符串、不再变动的订单字典）。
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(config, name='trading_system'):
+    """为name日志器建立队列日志管道，返回QueueListener
+
+    工作线程只做一次入队；控制台输出、按trade_mode分流的模拟/真实交易文件以及日志轮转
+    都在监听线程中完成，磁盘I/O不会阻塞下单路径。进程退出时自动刷新队列。
+    """
+    if name in _listeners:
+        return _listeners[name]
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    # 控制台处理器
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setLevel(getattr(logging, config.LOG_LEVEL))
+    console_handler.setFormatter(formatter)
+
+    # 模拟交易日志处理器
+    simulation_file_handler = RotatingFileHandler(
+        config.SIMULATION_LOG_FILE,
+        maxBytes=5 * 1024 * 1024,  # 5MB
+        backupCount=5,
+        encoding='utf-8',
+        delay=True
+    )
+    simulation_file_handler.setLevel(logging.DEBUG)
+    simulation_file_handler.setFormatter(formatter)
+    simulation_file_handler.addFilter(TradeModeFilter('simulation'))
+
+    # 真实交易日志处理器
+    real_file_handler = RotatingFileHandler(
+        config.REAL_LOG_FILE,
+        maxBytes=5 * 1024 * 1024,  # 5MB
+        backupCount=5,
+        encoding='utf-8',
+        delay=True
+    )
+    real_file_handler.setLevel(logging.DEBUG)
+    real_file_handler.setFormatter(formatter)
+    real_file_handler.addFilter(TradeModeFilter('real'))
+
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, console_handler, simulation_file_handler, real_file_handler,
+                             respect_handler_level=True)
+    logger = logging.getLogger(name)
+    logger.handlers = [DeferredQueueHandler(records)]
+    logger.setLevel(getattr(logging, config.LOG_LEVEL))
+    listener.start()
+    atexit.register(listener.stop)
+    _listeners[name] = listener
+    return listener
@@ -1,111 +1,45 @@
-from binance.client import Client
+import time
+
+STARTED_NS = time.perf_counter_ns()  # 进程启动时间，用于统计启动到首次信号评估的耗时
+
 import logging
+import os
 from config import TradingConfig
-from logging.handlers import RotatingFileHandler
 import signal
-import time
-import pandas as pd
+import asyncio
 from concurrent.futures import ThreadPoolExecutor
-import sys
+
+import numpy as np
+from requests.adapters import HTTPAdapter
 
 # 导入自定义模块
 from config import TradingConfig
 from data_processor import DataProcessor
-from binance.client import Client
 from trading_executor import TradingExecutor
+from kline_stream import KlineStream
+from market_bus import MarketBusClient, kline_topic, price_topic
+from scheduler import TickScheduler
+from trading_state import TradingState
+from kline_store import KlineStore, fetch_pages
+from trade_journal import TradeJournal
+from state_store import StateStore, restore_states
+from take_profit import TakeProfitEngine
+from rate_limiter import GovernedClient, governors_for_config
+import latency
+from log_pipeline import setup_logging
+from latency import recorder
 
 config = TradingConfig()
-client = Client(config.active_api_key, config.active_api_secret, testnet=config.TESTNET)
-trading_executor = TradingExecutor(client, config)
+governors = governors_for_config(config)
+client = None  # 由create_client在启动阶段创建，导入main时不访问网络
+journal = TradeJournal(config.JOURNAL_DIR, config.JOURNAL_FLUSH_INTERVAL) if config.JOURNAL_DIR else None
+trading_executor = TradingExecutor(client, config, journal=journal)
+state_store = StateStore(config.STATE_DIR, config.STATE_CHECKPOINT_EVERY) if config.STATE_DIR else None
+trading_executor.state_store = state_store
+data_processor = DataProcessor(config)
+kline_store = KlineStore(config.KLINE_CACHE_DIR) if config.KLINE_CACHE_DIR else None
 
-# 配置日志系统
 logger = logging.getLogger('trading_system')
-# 配置日志文件处理器
-file_handler = RotatingFileHandler(
-    TradingConfig.REAL_LOG_FILE,
-    maxBytes=10*1024*1024,  # 10MB日志轮转
-    backupCount=5,
-    encoding='utf-8'
-)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-file_handler.setLevel(logging.INFO)
-logger.addHandler(file_handler)
-# 保留控制台输出
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
-logger.setLevel(getattr(logging, config.LOG_LEVEL))
-
-# 创建格式化器
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
-# 自定义过滤器：只允许包含买入或卖出关键词的日志
-class TradingFilter(logging.Filter):
-    def filter(self, record):
-        message = record.getMessage()
-        # return '买入' in message or '卖出' in message or '做空' in message or 'RSI' in message
-        return message
-
-# 控制台处理器
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(getattr(logging, config.LOG_LEVEL))
-console_handler.setFormatter(formatter)
-console_handler.addFilter(TradingFilter())
-
-# 模拟交易日志处理器
-simulation_file_handler = RotatingFileHandler(
-    config.SIMULATION_LOG_FILE,
-    maxBytes=5 * 1024 * 1024,  # 5MB
-    backupCount=5,
-    encoding='utf-8'
-)
-simulation_file_handler.setLevel(logging.DEBUG)
-simulation_file_handler.setFormatter(formatter)
-
-# 真实交易日志处理器
-real_file_handler = RotatingFileHandler(
-    config.REAL_LOG_FILE,
-    maxBytes=5 * 1024 * 1024,  # 5MB
-    backupCount=5,
-    encoding='utf-8'
-)
-real_file_handler.setLevel(logging.DEBUG)
-real_file_handler.setFormatter(formatter)
-
-# 模拟交易日志过滤器
-class SimulationLogFilter(logging.Filter):
-    def filter(self, record):
-        return '[模拟]' in record.getMessage()
-
-# 真实交易日志过滤器
-class RealLogFilter(logging.Filter):
-    def filter(self, record):
-        return '[模拟]' not in record.getMessage() and ('买入' in record.getMessage() or '卖出' in record.getMessage() or '做空' in record.getMessage())
-
-simulation_file_handler.addFilter(SimulationLogFilter())
-real_file_handler.addFilter(RealLogFilter())
-
-# 移除默认处理器
-if logger.handlers:
-    logger.handlers = []
-
-# 添加处理器
-logger.addHandler(console_handler)
-logger.addHandler(simulation_file_handler)
-logger.addHandler(real_file_handler)
-
-# 状态跟踪
-import threading
-
-class TradingState:
-    def __init__(self):
-        self.in_position = False
-        self.last_short_price = 0
-        self.klines = []
-        self.take_profit_price = 0
-        self.is_closing_position = False  # 平仓状态标记
-        self.lock = threading.RLock()
 
 # 初始化交易状态字典（持久化每个交易对的状态）
 global state_map
@@ -114,53 +48,253 @@ if 'state_map' not in globals():
 # 确保每个交易对都有持久化的状态实例
 for symbol in config.SYMBOLS:
     if symbol not in state_map:
-        state_map[symbol] = TradingState()
+        state_map[symbol] = TradingState(config)
 
 # 初始化变量
-client = None
+scheduler = None
+first_signal_reported = False
+market_bus = None  # DATA_SOURCE为'bus'时的行情总线订阅端
 
 
 # 定义信号处理函数，用于优雅退出
 def signal_handler(sig, frame):
     logger.info('程序正在退出...')
+    if scheduler is not None:
+        scheduler.stop()
+        scheduler.log_stats()
+    if trading_executor.take_profit is not None:
+        trading_executor.take_profit.stop()
+    if state_store is not None:
+        state_store.close()
     if 'executor' in globals() and executor is not None:
         executor.shutdown(wait=False)
     exit(0)
 
 
-def process_symbol(symbol):
-    logger.info(f"开始处理交易对: {symbol}")
+def create_client():
+    """创建进程内唯一的Binance客户端，构造时不ping，连接由bootstrap的首批并行请求验证"""
+    global client
+    client = GovernedClient(config.active_api_key, config.active_api_secret, {'proxies': config.PROXIES},
+                            testnet=config.TESTNET, governors=governors, base_url=config.REST_BASE_URL, ping=False)
+    # 连接池容纳启动阶段的全部并行请求，避免连接被丢弃后重新握手
+    adapter = HTTPAdapter(pool_maxsize=max(config.BOOTSTRAP_WORKERS, 10))
+    client.session.mount('https://', adapter)
+    client.session.mount('http://', adapter)
+    trading_executor.client = client
+    trading_executor.snapshot.client = client
+    return client
+
+
+def fetch_klines(symbol, state):
+    """获取主周期K线：行情总线窗口、本地缓存加增量请求，或REST最近窗口"""
+
+    def fetch(start_time, limit):
+        params = {'startTime': start_time} if start_time is not None else {}
+        return client.get_klines(symbol=symbol, interval=config.INTERVAL, limit=limit, **params)
+
+    if market_bus is not None:
+        # 行情总线已在本地维护K线窗口，不再请求交易所
+        return market_bus.klines('spot', symbol, config.INTERVAL, state.klines.last_open_time)
+    if kline_store is None:
+        return fetch(None, config.RSI_PERIOD + 100)
+    # 首次处理时从磁盘预热，之后只请求最后一根K线之后的数据
+    if not len(state.klines):
+        with state.lock:
+            warmed = kline_store.warm_buffer('spot', symbol, config.INTERVAL, state.klines)
+        if warmed:
+            logger.info(f"从本地缓存加载{warmed}条{symbol}的K线数据")
+    return kline_store.fetch_incremental('spot', symbol, config.INTERVAL, fetch,
+                                         start_time=state.klines.last_open_time,
+                                         warmup_limit=config.RSI_PERIOD + 100)
+
+
+def load_klines(symbol):
+    """获取K线窗口并同步到交易状态，返回当前RSI（数据不足时为None）"""
+    state = state_map[symbol]
+    if state.timeframes is not None:
+        return load_base_klines(symbol, state)
+
+    start = recorder.now()
+    klines = fetch_klines(symbol, state)
+    start = recorder.record('fetch_klines', start)
+
+    # 只写入新出现或正在形成的K线，不再构建DataFrame
+    with state.lock:
+        start = recorder.record('state_lock_wait', start)
+        updated = state.klines.update_from_rest(klines)
+        logger.debug("%s更新%d条K线，缓冲区共%d条", symbol, updated, len(state.klines))
+        # 刚获取的K线收盘价即为最新价格
+        trading_executor.snapshot.update_price(symbol, state.klines.last_close)
+        start = recorder.record('kline_buffer_update', start)
+        # 增量更新RSI（只处理新出现或正在形成的K线）
+        rsi_value = state.rsi.sync(state.klines.open_times, state.klines.closes)
+        recorder.record('rsi', start)
+        return rsi_value
+
+
+def seed_timeframes(symbol, state):
+    """启动时用REST初始化每个聚合周期的K线窗口（每个周期只请求一次），返回基础K线的补齐起点"""
+    timeframes = state.timeframes
+    for interval, frame in timeframes.frames.items():
+        if not len(frame.klines):
+            klines = client.get_klines(symbol=symbol, interval=interval, limit=config.RSI_PERIOD + 100)
+            with state.lock:
+                timeframes.seed(interval, klines)
+    return timeframes.resume_time()
+
+
+def load_base_klines(symbol, state):
+    """本地聚合模式：只获取基础周期K线并聚合到主周期和确认周期，返回主周期RSI"""
+    timeframes = state.timeframes
+
+    def fetch(start_time, limit):
+        params = {'startTime': start_time} if start_time is not None else {}
+        return client.get_klines(symbol=symbol, interval=config.BASE_INTERVAL, limit=limit, **params)
+
+    start = recorder.now()
+    start_time = timeframes.base_time
+    if start_time is None:
+        start_time = seed_timeframes(symbol, state)
+    if market_bus is not None:
+        klines = market_bus.klines('spot', symbol, config.BASE_INTERVAL, start_time)
+    elif start_time is None:
+        klines = fetch(None, config.KLINE_CAPACITY)
+    else:
+        klines = fetch_pages(fetch, start_time)
+    start = recorder.record('fetch_klines', start)
+
+    with state.lock:
+        start = recorder.record('state_lock_wait', start)
+        for k in klines:
+            timeframes.update(int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+        logger.debug("%s聚合%d条%s K线", symbol, len(klines), config.BASE_INTERVAL)
+        if len(state.klines):
+            trading_executor.snapshot.update_price(symbol, state.klines.last_close)
+        recorder.record('kline_aggregate', start)
+        return state.rsi.value
+
+
+def sync_server_time():
+    """用服务器时间校正签名请求的时间戳偏移"""
+    server_time = client.get_server_time()['serverTime']
+    client.timestamp_offset = server_time - int(time.time() * 1000)
+    logger.info(f"服务器时间偏移: {client.timestamp_offset}ms")
+
+
+def check_symbols(spot_info, futures_info):
+    """用现货和合约的exchangeInfo确认交易对均可交易，不可交易的只记录警告"""
+    for market, info in (('现货', spot_info), ('合约', futures_info)):
+        trading = {s['symbol'] for s in info['symbols'] if s.get('status') == 'TRADING'}
+        missing = [symbol for symbol in config.SYMBOLS if symbol not in trading]
+        if missing:
+            logger.warning(f"以下交易对在{market}市场不可交易: {', '.join(missing)}")
+
+
+def fetch_warmup(symbol):
+    """获取一个交易对的预热K线；本地聚合模式直接完成聚合并返回None"""
+    state = state_map[symbol]
     try:
-        # 获取持久化的交易状态
+        if state.timeframes is not None:
+            load_base_klines(symbol, state)
+            return None
+        return fetch_klines(symbol, state)
+    except Exception as e:
+        logger.error(f"预热{symbol}的K线数据失败: {e}")
+        return None
+
+
+def warm_states(klines_map):
+    """写入预热K线，并按K线数量分组用calculate_rsi_batch一次计算所有交易对的RSI平滑状态"""
+    groups = {}
+    for symbol, klines in klines_map.items():
+        if not klines:
+            continue
         state = state_map[symbol]
+        with state.lock:
+            state.klines.update_from_rest(klines)
+        trading_executor.snapshot.update_price(symbol, state.klines.last_close)
+        groups.setdefault(len(state.klines), []).append(symbol)
+    for count, symbols in groups.items():
+        if count <= config.RSI_PERIOD:
+            # 数据太少，逐根同步
+            for symbol in symbols:
+                state = state_map[symbol]
+                with state.lock:
+                    state.rsi.sync(state.klines.open_times, state.klines.closes)
+            continue
+        closes = np.array([state_map[symbol].klines.closes for symbol in symbols])
+        _, avg_gain, avg_loss = DataProcessor.calculate_rsi_batch(closes, config.RSI_PERIOD, return_averages=True)
+        for i, symbol in enumerate(symbols):
+            state = state_map[symbol]
+            with state.lock:
+                # 倒数第二根为最后一根已收盘K线，最后一根作为正在形成的K线
+                state.rsi.warm_start(state.klines.open_times, state.klines.closes, avg_gain[i, -2], avg_loss[i, -2])
+
+
+def bootstrap():
+    """启动阶段：并行获取服务器时间、交易规则、持仓、杠杆设置和所有交易对的预热K线"""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=config.BOOTSTRAP_WORKERS, thread_name_prefix='bootstrap') as pool:
+        server_time = pool.submit(sync_server_time)
+        spot_info = pool.submit(client.get_exchange_info)
+        futures_info = pool.submit(client.futures_exchange_info)
+        tasks = []
+        if state_store is not None:
+            # 恢复重启前的持仓状态，真实交易时用一次批量持仓查询核对
+            tasks.append(pool.submit(restore_states, state_store, state_map, config, client,
+                                     root_dir=config.STATE_DIR))
+        if not config.SIMULATION_MODE:
+            tasks.extend(pool.submit(trading_executor.set_leverage, symbol) for symbol in config.SYMBOLS)
+        klines_map = {}
+        if config.DATA_SOURCE != 'bus':
+            # 行情总线模式由总线推送窗口，不需要预热
+            klines_map = dict(zip(config.SYMBOLS, pool.map(fetch_warmup, config.SYMBOLS)))
 
-        # 获取K线数据
         try:
-            klines = client.get_klines(
-                symbol=symbol,
-                interval=config.INTERVAL,
-                limit=config.RSI_PERIOD + 100
-            )
+            server_time.result()
+        except Exception as e:
+            # 第一批请求同时用于验证连接，服务器时间都获取不到时无法继续
+            logger.error(f"连接交易所失败: {e}")
+            raise
+        try:
+            check_symbols(spot_info.result(), futures_info.result())
+        except Exception as e:
+            logger.error(f"获取交易规则失败: {e}")
+        for task in tasks:
+            task.result()
+    warm_states(klines_map)
+    warmed = sum(1 for symbol in config.SYMBOLS if state_map[symbol].rsi.value is not None)
+    logger.info(f"启动预热完成: {warmed}/{len(config.SYMBOLS)}个交易对RSI就绪，耗时{time.perf_counter() - started:.2f}秒，"
+                f"距进程启动{(time.perf_counter_ns() - STARTED_NS) / 1e9:.2f}秒")
 
-            # 处理K线数据
-            df = pd.DataFrame(klines, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_asset_volume', 'number_of_trades', 'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'])
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df['close'] = df['close'].astype(float)
 
-            # 初始化K线列表
-            state.klines = df[['timestamp', 'close']].to_dict('records')
-            logger.info(f"成功加载{len(state.klines)}条{symbol}的K线数据")
+def report_first_signal():
+    """记录进程启动到首次信号评估的耗时（只记录一次）"""
+    global first_signal_reported
+    if first_signal_reported:
+        return
+    first_signal_reported = True
+    recorder.record('time_to_first_signal', STARTED_NS)
+    logger.info(f"启动到首次信号评估耗时{(time.perf_counter_ns() - STARTED_NS) / 1e9:.2f}秒")
 
-            # 计算初始RSI
-            if len(state.klines) >= config.RSI_PERIOD:
-                # 计算RSI并提取最新值
-                  kline_df = pd.DataFrame(state.klines)
-                  DataProcessor.calculate_rsi(kline_df, config.RSI_PERIOD)
-                  rsi_value = kline_df['rsi'].iloc[-1] if not kline_df.empty else 50
-                  trading_executor.check_trading_conditions(symbol, rsi_value, state)
-                  logger.info(f"{symbol}当前RSI: {rsi_value:.2f}")
 
+def process_symbol(symbol):
+    logger.info("开始处理交易对: %s", symbol)
+    try:
+        # 获取持久化的交易状态
+        state = state_map[symbol]
 
+        # 获取K线数据
+        try:
+            recorder.mark_tick()
+            rsi_value = load_klines(symbol)
+            if rsi_value is not None:
+                if not first_signal_reported:
+                    report_first_signal()
+                start = recorder.now()
+                trading_executor.check_trading_conditions(symbol, rsi_value, state)
+                recorder.record('check_trading_conditions', start)
+                logger.info("%s当前RSI: %.2f", symbol, rsi_value)
 
         except Exception as e:
             logger.error(f"获取{symbol}的K线数据失败: {e}")
@@ -170,29 +304,208 @@ def process_symbol(symbol):
         logger.error(f"处理{symbol}时发生错误: {e}", exc_info=True)
 
 
-def main():
-    global client
-
-    # 初始化Binance客户端
-    client = Client(config.active_api_key, config.active_api_secret, {'proxies': config.PROXIES}, testnet=config.TESTNET)
-    client.ping()  # 测试连接并自动同步时间
-
+def handle_stream_kline(kline_data, live):
+    """处理websocket推送（或补齐）的K线，实时K线触发交易判断"""
+    symbol = kline_data['k']['s']
+    state = state_map[symbol]
+    start = recorder.now()
+    with state.lock:
+        _, rsi_value = data_processor.process_kline_data(kline_data, state)
+    recorder.record('stream_kline', start)
+    if not live:
+        return
+    close_price = float(kline_data['k']['c'])
+    trading_executor.snapshot.update_price(symbol, close_price)
+    if rsi_value is None:
+        return
+    if not first_signal_reported:
+        report_first_signal()
+    # 每次实时推送都输出日志并写入交易日志（内存缓冲），不等待下单判断
+    start = recorder.now()
+    trading_executor.record_tick(symbol, close_price, rsi_value, state)
+    recorder.record('record_tick', start)
+    # 只有价格越过预先计算的触发价格时才进入下单判断；同一交易对只保留最新一次评估，避免推送积压
+    if state.signal(close_price):
+        scheduler.submit(symbol, evaluate_stream_signal, symbol, rsi_value, state, False)
+
+
+def evaluate_stream_signal(symbol, rsi_value, state, record=True):
+    if not first_signal_reported:
+        report_first_signal()
+    recorder.mark_tick()
+    start = recorder.now()
+    trading_executor.check_trading_conditions(symbol, rsi_value, state, record)
+    recorder.record('check_trading_conditions', start)
+
+
+def evaluate_price_tick(symbol, price, state):
+    """最新价越过触发价格时评估，RSI按该价格作为当前K线收盘价计算"""
+    rsi_value = state.rsi.value_at(price)
+    if rsi_value is not None:
+        evaluate_stream_signal(symbol, rsi_value, state)
+
+
+def run_websocket(max_workers):
+    """WebSocket模式：先用REST初始化每个交易对，再通过推送增量更新"""
+    global executor, scheduler
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        scheduler = TickScheduler(executor, config.REFRESH_INTERVAL, config.STATS_LOG_INTERVAL)
+        # 每个交易对只通过REST初始化一次
+        list(executor.map(process_symbol, config.SYMBOLS))
+
+        stream = KlineStream(client, config, config.SYMBOLS, on_kline=handle_stream_kline)
+        for symbol in config.SYMBOLS:
+            state = state_map[symbol]
+            if state.timeframes is not None:
+                if state.timeframes.base_time is not None:
+                    stream.last_open_time[symbol] = state.timeframes.base_time
+            elif len(state.klines):
+                stream.last_open_time[symbol] = state.klines.last_open_time
+        stream.start()
+        logger.info('程序正在运行，按Ctrl+C退出...')
+        try:
+            while True:
+                time.sleep(1)
+        finally:
+            stream.stop()
+
+
+def run_bus(max_workers):
+    """行情总线模式：订阅market_bus.py推送的K线和最新价，收到更新后评估对应交易对"""
+    global executor, scheduler, market_bus
+    prices = price_topic('spot')
+    interval = config.BASE_INTERVAL or config.INTERVAL
+    symbols = {kline_topic('spot', symbol, interval): symbol for symbol in config.SYMBOLS}
+
+    def on_update(topic, message):
+        if topic == prices:
+            for symbol in config.SYMBOLS:
+                price = message['data'].get(symbol)
+                if price is None:
+                    continue
+                price = float(price)
+                trading_executor.snapshot.update_price(symbol, price)
+                # 每个价格tick只与触发价格比较，越过时立即评估，不等下一根K线推送
+                state = state_map[symbol]
+                if state.signal(price):
+                    scheduler.submit(symbol, evaluate_price_tick, symbol, price, state)
+        elif topic in symbols:
+            # 同一交易对只保留最新一次评估
+            scheduler.submit(symbols[topic], process_symbol, symbols[topic])
 
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        scheduler = TickScheduler(executor, config.REFRESH_INTERVAL, config.STATS_LOG_INTERVAL)
+        market_bus = MarketBusClient(config.MARKET_BUS, on_update, limit=config.RSI_PERIOD + 100,
+                                     capacity=config.KLINE_CAPACITY)
+        market_bus.subscribe(list(symbols) + [prices])
+        market_bus.start()
+        logger.info('程序正在运行，按Ctrl+C退出...')
+        try:
+            while True:
+                time.sleep(1)
+        finally:
+            market_bus.stop()
+
+
+def run_threads():
+    """线程池运行时：REST轮询或WebSocket推送"""
+    global executor, scheduler
+
+    # 整个进程只创建一个Binance客户端，各交易对的初始化并行完成
+    create_client()
+    bootstrap()
+    if trading_executor.allocator is not None:
+        # 恢复的持仓重新计入协调器的占用额度，避免协调器或分片重启后超额分配
+        trading_executor.allocator.adopt({symbol: state.last_short_price * state.position_size
+                                          for symbol, state in state_map.items() if state.in_position})
+
+    # 止盈由合约价格推送触发，不再等待下一次轮询
+    if config.TAKE_PROFIT_STREAM:
+        trading_executor.take_profit = TakeProfitEngine(trading_executor, state_map, config)
+        trading_executor.take_profit.sync()
+        trading_executor.take_profit.start()
 
     # 注册信号处理器
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
-    logger.info('使用REST API数据源')
     # 创建线程池，最大线程数为交易对数量
     max_workers = min(len(config.SYMBOLS), 10)  # 限制最大线程数为10
+    if config.DATA_SOURCE == 'websocket':
+        logger.info('使用WebSocket数据源')
+        run_websocket(max_workers)
+        return
+    if config.DATA_SOURCE == 'bus':
+        logger.info(f"使用本地行情总线数据源: {config.MARKET_BUS}")
+        run_bus(max_workers)
+        return
+
+    logger.info('使用REST API数据源')
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         logger.info('程序正在运行，按Ctrl+C退出...')
-        while True:
-            # 提交所有交易对的处理任务
-            futures = {executor.submit(process_symbol, symbol): symbol for symbol in config.SYMBOLS}
-            # 等待刷新间隔
-            time.sleep(config.REFRESH_INTERVAL - 0.001)
+        # 按单调时钟对齐轮次，每个交易对最多一个任务在执行
+        scheduler = TickScheduler(executor, config.REFRESH_INTERVAL, config.STATS_LOG_INTERVAL)
+        scheduler.run_forever(config.SYMBOLS, process_symbol)
+
+
+def run_shard(index, symbols, allocator, weight_share=1.0):
+    """作为分片进程运行：只处理symbols，开仓额度由协调器分配，IP权重按weight_share分摊"""
+    global journal, state_store
+    config.SYMBOLS = list(symbols)
+    suffix = f".shard{index}"
+    config.LOG_FILE += suffix
+    config.SIMULATION_LOG_FILE += suffix
+    config.REAL_LOG_FILE += suffix
+    if config.LATENCY_DUMP_FILE:
+        config.LATENCY_DUMP_FILE += suffix
+    if config.LATENCY_HTTP_PORT:
+        config.LATENCY_HTTP_PORT += index
+    setup_logging(config)
+    logger.info(f"分片{index}启动，负责{len(symbols)}个交易对，权重比例{weight_share:.2f}")
+
+    state_map.clear()
+    for symbol in config.SYMBOLS:
+        state_map[symbol] = TradingState(config)
+    if config.JOURNAL_DIR:
+        # 每个分片写自己的子目录，JournalReader会合并读取
+        journal = TradeJournal(os.path.join(config.JOURNAL_DIR, f"shard{index}"), config.JOURNAL_FLUSH_INTERVAL)
+        trading_executor.journal = journal
+    if config.STATE_DIR:
+        state_store = StateStore(os.path.join(config.STATE_DIR, f"shard{index}"), config.STATE_CHECKPOINT_EVERY)
+        trading_executor.state_store = state_store
+    trading_executor.allocator = allocator
+    # 同一主机上的分片共用IP权重额度
+    for governor in governors.values():
+        governor.set_share(weight_share)
+
+    latency.configure(config)
+    run_threads()
+
+
+def main():
+    # 配置日志系统：工作线程只把记录放入队列，格式化、按交易类型分流和文件轮转在后台线程完成
+    setup_logging(config)
+
+    if config.SHARD_WORKERS > 0:
+        if config.RUNTIME == 'asyncio':
+            # 分片进程按线程运行时启动，asyncio设置不会生效
+            logger.error("分片运行(SHARD_WORKERS>0)只支持RUNTIME='thread'，请修改配置后重新启动")
+            return
+        # 交易对分给多个进程，由协调器统一管理余额和持仓占用
+        from sharding import run_coordinator
+        run_coordinator(config, config.SHARD_WORKERS)
+        return
+
+    # 延迟统计：定期输出分位数并写入文件/本地接口
+    latency.configure(config)
+
+    if config.RUNTIME == 'asyncio':
+        # asyncio运行时自行管理AsyncClient和信号处理
+        from async_engine import run_async
+        asyncio.run(run_async(config, state_map))
+        return
+
+    run_threads()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,369 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import TradingConfig
+from kline_store import fetch_pages
+
+logger = logging.getLogger('trading_system')
+
+# 主题格式
+#   kline:<market>:<symbol>:<interval>  K线窗口，首次订阅先收到整个窗口，之后只推送新出现或正在形成的K线
+#   price:<market>                      全部交易对最新价 {symbol: price}
+#   premium:futures                     全部永续合约标记价与资金费率 {symbol: premiumIndex}
+def kline_topic(market, symbol, interval):
+    return f"kline:{market}:{symbol}:{interval}"
+
+
+def price_topic(market):
+    return f"price:{market}"
+
+
+PREMIUM_TOPIC = 'premium:futures'
+
+
+class MarketDataPublisher:
+    """行情发布进程：唯一持有交易所连接，按订阅轮询K线和批量行情并推送给所有本地订阅者
+
+    同一主题无论有多少订阅者都只请求一次交易所；订阅通过Unix socket，协议为每行一个JSON：
+    订阅者发送{"op": "subscribe", "topics": [...], "limit": 106}，发布者推送{"topic": ..., "rows"/"data": ...}。
+    """
+
+    def __init__(self, config, path, poll_interval=None, window=None):
+        from kline_store import KlineStore
+        from rate_limiter import GovernedClient, governors_for_config
+
+        self.config = config
+        self.path = path
+        self.poll_interval = poll_interval or config.REFRESH_INTERVAL
+        self.window = window or config.KLINE_CAPACITY  # 每个K线主题保留的最大K线数
+        self.client = GovernedClient(config.active_api_key, config.active_api_secret, {'proxies': config.PROXIES},
+                                     testnet=config.TESTNET, governors=governors_for_config(config),
+                                     base_url=config.REST_BASE_URL)
+        self.kline_store = KlineStore(config.KLINE_CACHE_DIR) if config.KLINE_CACHE_DIR else None
+        self._windows = {}  # kline主题 -> K线数组列表(按时间升序)
+        self._limits = {}  # kline主题 -> 订阅者需要的预热数量
+        self._latest = {}  # 批量主题 -> 最近一次数据，新订阅者立即收到
+        self._subscribers = {}  # 主题 -> set(_Subscriber)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._server = None
+        # 统计
+        self.polls = 0
+        self.published = 0
+        self.errors = 0
+
+    def subscribe(self, subscriber, topics, limit):
+        initial = []  # 已有数据的主题立即发送当前窗口/最新数据
+        with self._lock:
+            for topic in topics:
+                self._subscribers.setdefault(topic, set()).add(subscriber)
+                if topic.startswith('kline:'):
+                    self._limits[topic] = max(self._limits.get(topic, 0), limit)
+                    if self._windows.get(topic):
+                        initial.append({'topic': topic, 'rows': self._windows[topic], 'snapshot': True})
+                elif topic in self._latest:
+                    initial.append({'topic': topic, 'data': self._latest[topic]})
+        for message in initial:
+            subscriber.send(message)
+        logger.info(f"行情总线新增订阅: {len(topics)}个主题，共{len(self._subscribers)}个主题")
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for topic in [t for t, subs in self._subscribers.items() if subscriber in subs]:
+                self._subscribers[topic].discard(subscriber)
+                if not self._subscribers[topic]:
+                    # 没有订阅者的主题停止轮询
+                    del self._subscribers[topic]
+                    self._windows.pop(topic, None)
+                    self._limits.pop(topic, None)
+                    self._latest.pop(topic, None)
+
+    def publish(self, topic, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(topic, ()))
+        for subscriber in subscribers:
+            if not subscriber.send(message):
+                self.unsubscribe(subscriber)
+        self.published += 1
+
+    def _fetch_klines(self, market, symbol, interval, start_time, limit):
+        params = {'startTime': start_time} if start_time is not None else {}
+        if market == 'futures':
+            return self.client.futures_klines(symbol=symbol, interval=interval, limit=limit, **params)
+        return self.client.get_klines(symbol=symbol, interval=interval, limit=limit, **params)
+
+    def poll_klines(self, topic):
+        _, market, symbol, interval = topic.split(':')
+        with self._lock:
+            rows = self._windows.get(topic)
+            limit = self._limits.get(topic, self.config.RSI_PERIOD + 100)
+        last_time = int(rows[-1][0]) if rows else None
+
+        def fetch(start_time, count):
+            return self._fetch_klines(market, symbol, interval, start_time, count)
+
+        if last_time is None:
+            # 新主题先取完整的预热窗口，之后只请求最后一根K线之后的数据
+            klines = fetch(None, limit)
+            if self.kline_store is not None and len(klines) > 1:
+                self.kline_store.append(market, symbol, interval, klines[:-1])
+        elif self.kline_store is not None:
+            klines = self.kline_store.fetch_incremental(market, symbol, interval, fetch, start_time=last_time)
+        else:
+            klines = fetch_pages(fetch, last_time)
+        new_rows = [k for k in klines if last_time is None or int(k[0]) >= last_time]
+        if not new_rows:
+            return
+        first = int(new_rows[0][0])
+        rows = ([k for k in rows if int(k[0]) < first] if rows else []) + new_rows
+        rows = rows[-max(self.window, limit):]
+        with self._lock:
+            if topic not in self._subscribers:
+                return
+            snapshot = topic not in self._windows
+            self._windows[topic] = rows
+        self.publish(topic, {'topic': topic, 'rows': rows if snapshot else new_rows, 'snapshot': snapshot})
+
+    def poll_bulk(self, topic):
+        if topic == price_topic('spot'):
+            data = {t['symbol']: float(t['price']) for t in self.client.get_symbol_ticker()}
+        elif topic == price_topic('futures'):
+            data = {t['symbol']: float(t['price']) for t in self.client.futures_symbol_ticker()}
+        elif topic == PREMIUM_TOPIC:
+            data = {p['symbol']: {'markPrice': p['markPrice'], 'lastFundingRate': p['lastFundingRate'],
+                                  'nextFundingTime': p['nextFundingTime']}
+                    for p in self.client.futures_mark_price()}
+        else:
+            logger.warning(f"行情总线未知主题: {topic}")
+            return
+        with self._lock:
+            if topic not in self._subscribers:
+                return
+            self._latest[topic] = data
+        self.publish(topic, {'topic': topic, 'data': data})
+
+    def _poll(self, topic):
+        try:
+            if topic.startswith('kline:'):
+                self.poll_klines(topic)
+            else:
+                self.poll_bulk(topic)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"行情总线获取{topic}失败: {e}")
+
+    def serve_forever(self, max_workers=10):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # 上次异常退出留下的socket文件
+        self._server = _BusServer(self.path, self)
+        threading.Thread(target=self._server.serve_forever, name='market-bus', daemon=True).start()
+        logger.info(f"行情总线已启动: {self.path}，轮询间隔{self.poll_interval}秒")
+        last_stats = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            next_round = time.monotonic()
+            while not self._stop.is_set():
+                with self._lock:
+                    topics = list(self._subscribers)
+                # 每个主题每轮只请求一次，与订阅者数量无关
+                list(executor.map(self._poll, topics))
+                self.polls += 1
+                if self.config.STATS_LOG_INTERVAL and time.monotonic() - last_stats >= self.config.STATS_LOG_INTERVAL:
+                    last_stats = time.monotonic()
+                    logger.info(f"行情总线: 主题={len(topics)}, 轮次={self.polls}, 推送={self.published}, "
+                                f"错误={self.errors}")
+                next_round += self.poll_interval
+                self._stop.wait(max(0.0, next_round - time.monotonic()))
+                next_round = max(next_round, time.monotonic() - self.poll_interval)
+        self._server.shutdown()
+        self._server.server_close()
+        os.unlink(self.path)
+
+    def stop(self):
+        self._stop.set()
+
+
+class _Subscriber:
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        data = json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n'
+        try:
+            with self._lock:
+                self.wfile.write(data)
+                self.wfile.flush()
+            return True
+        except OSError:
+            return False
+
+
+class _BusHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        publisher = self.server.publisher
+        subscriber = _Subscriber(self.wfile)
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                if request.get('op') == 'subscribe':
+                    publisher.subscribe(subscriber, request.get('topics', []), int(request.get('limit', 0)))
+        finally:
+            publisher.unsubscribe(subscriber)
+
+
+class _BusServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, publisher):
+        self.publisher = publisher
+        super().__init__(path, _BusHandler)
+
+
+class MarketBusClient:
+    """行情总线订阅端：后台线程接收推送并维护本地的K线窗口和批量行情
+
+    on_update(topic, message)在接收线程上调用，应尽快返回（例如只提交到线程池）。
+    连接断开后自动重连并重新订阅，重连后收到的第一批K线是完整窗口。
+    """
+
+    def __init__(self, path, on_update=None, limit=0, capacity=1000, reconnect_delay=1.0):
+        self.path = path
+        self.on_update = on_update
+        self.limit = limit  # 每个K线主题需要的预热数量
+        self.capacity = max(capacity, limit)  # 本地每个K线主题保留的最大K线数
+        self.reconnect_delay = reconnect_delay
+        self.topics = []
+        self._windows = {}  # kline主题 -> K线数组列表
+        self._data = {}  # 批量主题 -> 最新数据
+        self._ready = {}  # 主题 -> 收到第一条数据的Event
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sock = None
+        self._thread = None
+
+    def subscribe(self, topics):
+        topics = [t for t in topics if t not in self.topics]
+        with self._lock:
+            self.topics.extend(topics)
+            for topic in topics:
+                self._ready.setdefault(topic, threading.Event())
+        if self._sock is not None and topics:
+            self._send_subscribe(self._sock, topics)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='market-bus-client', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def wait_ready(self, topics, timeout=None):
+        """等待每个主题收到第一条数据，超时返回False"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for topic in topics:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._ready[topic].wait(remaining):
+                return False
+        return True
+
+    def klines(self, market, symbol, interval, start_time=None):
+        """返回本地窗口中开盘时间不早于start_time的K线数组（与REST startTime参数语义一致）"""
+        with self._lock:
+            rows = self._windows.get(kline_topic(market, symbol, interval), [])
+        if start_time is None:
+            return list(rows)
+        return [k for k in rows if int(k[0]) >= start_time]
+
+    def data(self, topic):
+        with self._lock:
+            return self._data.get(topic, {})
+
+    def _send_subscribe(self, sock, topics):
+        message = {'op': 'subscribe', 'topics': topics, 'limit': self.limit}
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+    def _apply(self, message):
+        topic = message.get('topic')
+        with self._lock:
+            if 'rows' in message:
+                rows = message['rows']
+                window = self._windows.get(topic)
+                if message.get('snapshot') or not window:
+                    window = list(rows)
+                else:
+                    first = int(rows[0][0])
+                    window = [k for k in window if int(k[0]) < first] + list(rows)
+                self._windows[topic] = window[-self.capacity:]
+            else:
+                self._data[topic] = message.get('data', {})
+            ready = self._ready.get(topic)
+        if ready is not None:
+            ready.set()
+        if self.on_update is not None:
+            try:
+                self.on_update(topic, message)
+            except Exception as e:
+                logger.error(f"处理行情总线推送{topic}失败: {e}", exc_info=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(self.path)
+            except OSError as e:
+                logger.warning(f"无法连接行情总线{self.path}: {e}，{self.reconnect_delay}秒后重试")
+                self._stop.wait(self.reconnect_delay)
+                continue
+            self._sock = sock
+            with self._lock:
+                topics = list(self.topics)
+                # 重连后重新接收完整窗口
+                self._windows.clear()
+            if topics:
+                self._send_subscribe(sock, topics)
+            logger.info(f"已连接行情总线: {self.path}，订阅{len(topics)}个主题")
+            try:
+                for line in sock.makefile('rb'):
+                    self._apply(json.loads(line))
+            except (OSError, ValueError) as e:
+                logger.error(f"行情总线连接错误: {e}")
+            self._sock = None
+            sock.close()
+            if not self._stop.is_set():
+                logger.warning(f"行情总线连接断开，{self.reconnect_delay}秒后重连")
+                self._stop.wait(self.reconnect_delay)
+
+
+if __name__ == '__main__':
+    from log_pipeline import setup_logging
+
+    parser = argparse.ArgumentParser(description='本地行情总线：统一获取行情并推送给main.py和RSI_15min_monitor.py')
+    parser.add_argument('--socket', default=None, help='Unix socket路径，默认使用配置中的MARKET_BUS')
+    parser.add_argument('--interval', type=float, default=None, help='轮询间隔(秒)，默认使用REFRESH_INTERVAL')
+    args = parser.parse_args()
+
+    config = TradingConfig()
+    setup_logging(config)
+    publisher = MarketDataPublisher(config, args.socket or config.MARKET_BUS or 'market_bus.sock', args.interval)
+    signal.signal(signal.SIGINT, lambda sig, frame: publisher.stop())
+    signal.signal(signal.SIGTERM, lambda sig, frame: publisher.stop())
+    publisher.serve_forever()
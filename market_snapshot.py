@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+
+from binance.exceptions import BinanceAPIException
+
+logger = logging.getLogger('trading_system')
+
+
+class MarketSnapshot:
+    """价格与账户余额快照，带TTL和事件失效
+
+    价格优先使用刚获取的K线收盘价，过期后通过一次全交易对ticker批量刷新；
+    余额在所有交易对之间共享，按TTL定期刷新，成交后立即失效。
+    并发请求同一份数据时只有一个线程访问交易所，其余线程等待并复用结果。
+    """
+
+    def __init__(self, client, price_ttl=2.0, balance_ttl=30.0):
+        self.client = client
+        self.price_ttl = price_ttl
+        self.balance_ttl = balance_ttl
+        self._prices = {}  # symbol -> (价格, 更新时间)
+        self._balances = {}  # asset -> 可用余额
+        self._balance_time = None  # 余额更新时间，None表示已失效
+        self._price_lock = threading.Lock()
+        self._balance_lock = threading.Lock()
+        self.price_refreshes = 0  # 批量ticker请求次数
+        self.balance_refreshes = 0  # 账户余额请求次数
+
+    def update_price(self, symbol, price, timestamp=None):
+        if price is None or price <= 0:
+            return
+        self._prices[symbol] = (float(price), timestamp if timestamp is not None else time.monotonic())
+
+    def cached_price(self, symbol):
+        """返回未过期的价格，不访问交易所"""
+        entry = self._prices.get(symbol)
+        if entry is not None and time.monotonic() - entry[1] <= self.price_ttl:
+            return entry[0]
+        return None
+
+    def last_price(self, symbol):
+        """返回最近一次的价格（不论是否过期），没有时返回None，不访问交易所"""
+        entry = self._prices.get(symbol)
+        return entry[0] if entry is not None else None
+
+    def get_price(self, symbol):
+        """返回最新价格，过期时批量刷新所有交易对的ticker"""
+        price = self.cached_price(symbol)
+        if price is not None:
+            return price
+        with self._price_lock:
+            # 等锁期间其他线程可能已经刷新
+            price = self.cached_price(symbol)
+            if price is not None:
+                return price
+            self.refresh_prices()
+        return self.cached_price(symbol)
+
+    def refresh_prices(self):
+        try:
+            tickers = self.client.get_symbol_ticker()
+        except Exception as e:
+            logger.error(f"批量获取最新价格失败: {str(e)}")
+            return
+        now = time.monotonic()
+        for ticker in tickers:
+            self._prices[ticker['symbol']] = (float(ticker['price']), now)
+        self.price_refreshes += 1
+
+    def invalidate_balance(self):
+        """成交后调用，下次读取余额时重新获取"""
+        self._balance_time = None
+
+    def cached_balance(self, asset):
+        """返回未过期的可用余额，不访问交易所；已失效或过期时返回None"""
+        if self._balance_time is None or time.monotonic() - self._balance_time > self.balance_ttl:
+            return None
+        return self._balances.get(asset, 0.0)
+
+    def set_balances(self, balances):
+        """用futures_account_balance的返回结果更新余额快照"""
+        self._balances = {b['asset']: float(b['availableBalance']) for b in balances}
+        self._balance_time = time.monotonic()
+        self.balance_refreshes += 1
+
+    def get_balance(self, asset):
+        balance = self.cached_balance(asset)
+        if balance is not None:
+            return balance
+        with self._balance_lock:
+            balance = self.cached_balance(asset)
+            if balance is None:
+                self.refresh_balances()
+                balance = self._balances.get(asset, 0.0)
+            return balance
+
+    def refresh_balances(self):
+        try:
+            balances = self.client.futures_account_balance()
+        except BinanceAPIException as e:
+            logger.error(f"获取合约余额API错误: 代码{e.code}, 消息{e.message}")
+            return
+        except Exception as e:
+            logger.error(f"获取合约余额未知错误: {str(e)}")
+            return
+        self.set_balances(balances)
@@ -0,0 +1,260 @@
+import argparse
+import itertools
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest import INTERVAL_MS
+from config import TradingConfig
+from data_processor import IncrementalRSI
+from kline_store import KlineStore
+
+logger = logging.getLogger('optimizer')
+
+PARAM_NAMES = ('RSI_PERIOD', 'OVERBOUGHT', 'OVERSOLD', 'TAKE_PROFIT_PERCENT')
+
+
+def rsi_series(open_times, closes, period, strategy_ms):
+    """逐根K线的增量RSI（与Backtester回放时看到的值一致），数据不足处为NaN"""
+    rsi = IncrementalRSI(period)
+    buckets = (open_times - open_times % strategy_ms).tolist()
+    out = np.full(len(closes), np.nan)
+    update = rsi.update
+    for i, (bucket, close) in enumerate(zip(buckets, closes.tolist())):
+        value = update(bucket, close)
+        if value is not None:
+            out[i] = value
+    return out
+
+
+def simulate(closes, rsi, overbought, oversold, take_profit_percent, balance, fee_rate=0.0004, slippage=0.0):
+    """按TradingExecutor的做空规则快速模拟，结果与Backtester一致
+
+    只在信号点之间跳转：开仓点由RSI>=超买的下标集合二分查找得到，
+    平仓点取RSI<=超卖与价格触及止盈两者中较早的一个，止盈用NumPy分块扫描。
+    返回(最终权益, 交易次数, 盈利次数, 最大回撤, 最大回撤百分比)。
+    """
+    n = len(closes)
+    entries = np.flatnonzero(rsi >= overbought)
+    exits = np.flatnonzero(rsi <= oversold)
+    peak = balance
+    max_drawdown = max_drawdown_percent = 0.0
+    trades = wins = 0
+    i = 0
+    while True:
+        k = np.searchsorted(entries, i)
+        if k >= len(entries):
+            break
+        entry = entries[k]
+        price = closes[entry]
+        quantity = balance / price * 0.25  # 四分之一USDT仓位
+        entry_price = price * (1 - slippage)
+        entry_fee = entry_price * quantity * fee_rate
+        take_profit = price * (1 - take_profit_percent / 100)
+
+        # 下一个平仓点：超卖或触及止盈
+        k = np.searchsorted(exits, entry + 1)
+        exit_ = exits[k] if k < len(exits) else n
+        start = entry + 1
+        chunk = 256
+        while start < exit_:
+            end = min(exit_, start + chunk)
+            hit = np.flatnonzero(closes[start:end] <= take_profit)
+            if len(hit):
+                exit_ = start + hit[0]
+                break
+            start = end
+            chunk *= 2
+
+        # 持仓期间按收盘价计算浮动权益
+        held = closes[entry:min(exit_, n)]
+        equity = balance - entry_fee + (entry_price - held) * quantity
+        if exit_ < n:
+            exit_price = closes[exit_] * (1 + slippage)
+            fees = entry_fee + exit_price * quantity * fee_rate
+            pnl = (entry_price - exit_price) * quantity - fees
+            balance += pnl
+            trades += 1
+            wins += pnl > 0
+            equity = np.append(equity, balance)
+        running_peak = np.maximum.accumulate(np.maximum(equity, peak))
+        drawdown = running_peak - equity
+        j = int(np.argmax(drawdown))
+        if drawdown[j] > max_drawdown:
+            max_drawdown = float(drawdown[j])
+            max_drawdown_percent = max_drawdown / running_peak[j] * 100
+        peak = float(running_peak[-1])
+        if exit_ >= n:
+            return float(equity[-1]), trades, wins, max_drawdown, max_drawdown_percent
+        i = exit_ + 1
+    return balance, trades, wins, max_drawdown, max_drawdown_percent
+
+
+def grid(param_ranges):
+    """参数网格：param_ranges为{参数名: 取值列表}"""
+    names = list(param_ranges)
+    return [dict(zip(names, values)) for values in itertools.product(*param_ranges.values())]
+
+
+def random_search(param_ranges, samples, seed=None):
+    """从参数网格中无放回随机抽取samples组"""
+    combos = grid(param_ranges)
+    if samples >= len(combos):
+        return combos
+    return random.Random(seed).sample(combos, samples)
+
+
+class SharedKlines:
+    """把一个交易对的开盘时间和收盘价放入共享内存，子进程按名称映射而不是pickle数组"""
+
+    def __init__(self, open_times, closes):
+        n = len(closes)
+        self.length = n
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, n * 16))
+        np.ndarray(n, dtype=np.int64, buffer=self.shm.buf)[:] = open_times
+        np.ndarray(n, dtype=np.float64, buffer=self.shm.buf, offset=n * 8)[:] = closes
+
+    @property
+    def handle(self):
+        return self.shm.name, self.length
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach(handle):
+    name, n = handle
+    shm = shared_memory.SharedMemory(name=name)
+    open_times = np.ndarray(n, dtype=np.int64, buffer=shm.buf)
+    closes = np.ndarray(n, dtype=np.float64, buffer=shm.buf, offset=n * 8)
+    return shm, open_times, closes
+
+
+def _evaluate_period(symbol, handle, period, combos, strategy_ms, balance, fee_rate, slippage):
+    """子进程任务：同一交易对、同一RSI周期的所有参数组合共用一条RSI序列"""
+    shm, open_times, closes = _attach(handle)
+    try:
+        rsi = rsi_series(open_times, closes, period, strategy_ms)
+        results = []
+        for combo in combos:
+            final, trades, wins, max_drawdown, max_drawdown_percent = simulate(
+                closes, rsi, combo['OVERBOUGHT'], combo['OVERSOLD'], combo['TAKE_PROFIT_PERCENT'],
+                balance, fee_rate, slippage
+            )
+            results.append({
+                'symbol': symbol, **combo,
+                'pnl': final - balance, 'trades': trades, 'wins': wins,
+                'max_drawdown': max_drawdown, 'max_drawdown_percent': max_drawdown_percent,
+            })
+        return results
+    finally:
+        del open_times, closes
+        shm.close()
+
+
+def sweep(klines, combos, config=None, fee_rate=0.0004, slippage=0.0, max_workers=None):
+    """在多个交易对上并行评估参数组合，返回按总盈亏排序的结果表(DataFrame)
+
+    klines为{symbol: (open_times, closes)}。
+    """
+    config = config or TradingConfig()
+    strategy_ms = INTERVAL_MS[config.INTERVAL]
+    balance = config.SIMULATED_BALANCE
+    by_period = {}
+    for combo in combos:
+        by_period.setdefault(combo['RSI_PERIOD'], []).append(combo)
+
+    shared = {symbol: SharedKlines(np.asarray(t, dtype=np.int64), np.asarray(c, dtype=np.float64))
+              for symbol, (t, c) in klines.items()}
+    started = time.perf_counter()
+    rows = []
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            futures = [
+                pool.submit(_evaluate_period, symbol, data.handle, period, period_combos,
+                            strategy_ms, balance, fee_rate, slippage)
+                for symbol, data in shared.items()
+                for period, period_combos in by_period.items()
+            ]
+            for future in futures:
+                rows.extend(future.result())
+    finally:
+        for data in shared.values():
+            data.release()
+    logger.info(f"完成{len(combos)}组参数 × {len(klines)}个交易对的评估，耗时{time.perf_counter() - started:.2f}秒")
+
+    import pandas as pd  # 只在汇总结果时需要，工作进程不导入
+
+    per_symbol = pd.DataFrame(rows)
+    if per_symbol.empty:
+        return per_symbol
+    ranked = per_symbol.groupby(list(PARAM_NAMES), as_index=False).agg(
+        pnl=('pnl', 'sum'),
+        trades=('trades', 'sum'),
+        wins=('wins', 'sum'),
+        max_drawdown=('max_drawdown', 'max'),
+        max_drawdown_percent=('max_drawdown_percent', 'max'),
+    )
+    ranked['win_rate'] = np.where(ranked['trades'] > 0, ranked['wins'] / ranked['trades'].clip(lower=1) * 100, 0.0)
+    return ranked.sort_values('pnl', ascending=False).reset_index(drop=True)
+
+
+def _parse_range(text, cast):
+    """解析'6,8,10'或'80:96:2'(起:止:步长，含止)格式的取值列表"""
+    if ':' in text:
+        start, stop, step = (cast(x) for x in text.split(':'))
+        values = np.arange(start, stop + step / 2, step)
+        return [cast(v) for v in values]
+    return [cast(x) for x in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RSI做空策略参数扫描')
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--market', default='spot', choices=['spot', 'futures'])
+    parser.add_argument('--bar-interval', default=None, help='回放K线周期，默认与策略周期相同')
+    parser.add_argument('--period', default='6,8,10,14')
+    parser.add_argument('--overbought', default='80:96:2')
+    parser.add_argument('--oversold', default='40:70:5')
+    parser.add_argument('--take-profit', default='1,2,5,10')
+    parser.add_argument('--samples', type=int, default=0, help='随机抽样组数，0为全网格')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--fee', type=float, default=0.0004)
+    parser.add_argument('--slippage', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--output', default=None, help='完整结果写入CSV文件')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = TradingConfig()
+    bar_interval = args.bar_interval or config.INTERVAL
+    store = KlineStore(config.KLINE_CACHE_DIR)
+    klines = {}
+    for symbol in args.symbols:
+        records = store.load(args.market, symbol, bar_interval)
+        if not len(records):
+            logger.warning(f"本地缓存中没有{symbol} {bar_interval}的K线数据，已跳过")
+            continue
+        klines[symbol] = (np.array(records['open_time']), np.array(records['close']))
+
+    param_ranges = {
+        'RSI_PERIOD': _parse_range(args.period, int),
+        'OVERBOUGHT': _parse_range(args.overbought, float),
+        'OVERSOLD': _parse_range(args.oversold, float),
+        'TAKE_PROFIT_PERCENT': _parse_range(args.take_profit, float),
+    }
+    combos = random_search(param_ranges, args.samples, args.seed) if args.samples else grid(param_ranges)
+    # 超卖阈值不低于超买阈值的组合没有意义
+    combos = [c for c in combos if c['OVERSOLD'] < c['OVERBOUGHT']]
+
+    results = sweep(klines, combos, config, args.fee, args.slippage, args.workers)
+    if args.output:
+        results.to_csv(args.output, index=False)
+    print(results.head(args.top).to_string())
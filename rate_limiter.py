@@ -0,0 +1,319 @@
+import asyncio
+import logging
+import threading
+import time
+
+from binance.client import AsyncClient, Client
+from binance.exceptions import BinanceAPIException
+
+logger = logging.getLogger('trading_system')
+
+PRIORITY_ORDER = 0  # 下单/撤单，始终优先
+PRIORITY_DATA = 1  # 行情与账户查询，需为下单保留余量
+
+
+class RateLimitedError(Exception):
+    """交易所返回429/418，请求未被重试"""
+
+    def __init__(self, status_code, retry_after):
+        super().__init__(f"触发限频: HTTP {status_code}, {retry_after:.0f}秒后重试")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def estimate_weight(path, params=None):
+    """估算一次REST请求的权重（以Binance文档为准的近似值）"""
+    params = params or {}
+    has_symbol = 'symbol' in params
+    if path.endswith('/klines'):
+        if '/fapi/' not in path:
+            return 2
+        limit = int(params.get('limit', 500))
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    if path.endswith('/ticker/price'):
+        if '/fapi/' in path:
+            return 1 if has_symbol else 2
+        return 2 if has_symbol else 4
+    if path.endswith('/premiumIndex'):
+        return 1 if has_symbol else 10
+    if path.endswith('/balance') or path.endswith('/account'):
+        return 5 if '/fapi/' in path else 20
+    if path.endswith('/positionRisk'):
+        return 5
+    if path.endswith('/exchangeInfo'):
+        return 1 if '/fapi/' in path else 20
+    return 1
+
+
+def is_order_path(path):
+    return path.endswith('/order') or path.endswith('/batchOrders')
+
+
+class WeightGovernor:
+    """全局请求权重令牌桶，所有线程共享
+
+    按每分钟权重上限匀速补充令牌，行情请求只能用到保留余量之上的部分，下单请求可以用完全部令牌。
+    每次响应后根据X-MBX-USED-WEIGHT-1M校正剩余令牌；收到429/418时按Retry-After暂停所有请求。
+    """
+
+    def __init__(self, name, weight_limit, safety=0.8, order_reserve=0.1, order_limit_10s=None):
+        self.name = name
+        self.full_capacity = weight_limit * safety  # 整个IP可用的权重
+        self.order_reserve = order_reserve
+        self.base_order_limit_10s = order_limit_10s
+        self.share = 1.0
+        self.capacity = self.full_capacity
+        self.rate = self.capacity / 60.0  # 每秒补充的令牌
+        self.reserve = self.capacity * order_reserve
+        self.order_limit_10s = order_limit_10s
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.used_weight = 0  # 交易所返回的最近一分钟已用权重
+        self.order_count_10s = 0
+        self._order_window_until = 0.0
+        self._cond = threading.Condition()
+        # 统计
+        self.requests = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.rate_limited = 0
+
+    def set_share(self, share):
+        """同一IP/账户上有多个进程时，本进程只使用share比例的权重和下单额度"""
+        with self._cond:
+            self.share = share
+            self.capacity = self.full_capacity * share
+            self.rate = self.capacity / 60.0
+            self.reserve = self.capacity * self.order_reserve
+            self.tokens = min(self.tokens, self.capacity)
+            if self.base_order_limit_10s:
+                self.order_limit_10s = max(1, int(self.base_order_limit_10s * share))
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _wait_time(self, weight, priority, now):
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if priority == PRIORITY_ORDER:
+            if (self.order_limit_10s and self.order_count_10s >= self.order_limit_10s
+                    and now < self._order_window_until):
+                return self._order_window_until - now
+            floor = 0.0
+        else:
+            floor = self.reserve
+        shortage = weight + floor - self.tokens
+        if shortage <= 0:
+            return 0.0
+        return shortage / self.rate
+
+    def _try_take(self, weight, priority):
+        """尝试扣除令牌，成功返回0，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = self._wait_time(weight, priority, now)
+        if wait <= 0:
+            self.tokens -= weight
+            self.requests += 1
+        return wait
+
+    def acquire(self, weight=1, priority=PRIORITY_DATA):
+        """阻塞直到有足够的权重预算，返回等待时间(秒)"""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                wait = self._try_take(weight, priority)
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+        return self._record_wait(started)
+
+    async def acquire_async(self, weight=1, priority=PRIORITY_DATA):
+        """acquire的asyncio版本，等待时不阻塞事件循环"""
+        started = time.monotonic()
+        while True:
+            with self._cond:
+                wait = self._try_take(weight, priority)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        return self._record_wait(started)
+
+    def _record_wait(self, started):
+        waited = time.monotonic() - started
+        if waited > 0.001:
+            self.waits += 1
+            self.total_wait += waited
+        return waited
+
+    def update_from_headers(self, headers):
+        """根据响应头校正已用权重和下单计数"""
+        used = headers.get('X-MBX-USED-WEIGHT-1M') or headers.get('X-MBX-USED-WEIGHT-1m')
+        order_count = headers.get('X-MBX-ORDER-COUNT-10S') or headers.get('X-MBX-ORDER-COUNT-10s')
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if used is not None:
+                self.used_weight = int(used)
+                # 已用权重是整个IP的合计，按IP总额度校正
+                self.tokens = min(self.tokens, self.full_capacity - self.used_weight)
+            if order_count is not None:
+                if now >= self._order_window_until:
+                    self._order_window_until = now + 10
+                self.order_count_10s = int(order_count)
+
+    def on_rate_limited(self, status_code, retry_after=None):
+        """收到429/418后暂停所有请求直到Retry-After到期"""
+        try:
+            seconds = float(retry_after)
+        except (TypeError, ValueError):
+            # 418表示IP已被封禁，未给出时间时保守等待更久
+            seconds = 60.0 if status_code == 429 else 300.0
+        with self._cond:
+            self.rate_limited += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+        logger.warning(f"[{self.name}] 触发限频(HTTP {status_code})，暂停请求{seconds:.1f}秒")
+        return seconds
+
+    def stats(self):
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                'name': self.name,
+                'tokens': self.tokens,
+                'used_weight': self.used_weight,
+                'requests': self.requests,
+                'waits': self.waits,
+                'total_wait': self.total_wait,
+                'rate_limited': self.rate_limited,
+                'blocked_for': max(0.0, self.blocked_until - time.monotonic()),
+            }
+
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+def get_governor(name, weight_limit, **kwargs):
+    """按名称获取进程内共享的governor（如'spot'、'futures'），首次调用时创建"""
+    with _governors_lock:
+        if name not in _governors:
+            _governors[name] = WeightGovernor(name, weight_limit, **kwargs)
+        return _governors[name]
+
+
+def governors_for_config(config):
+    """根据TradingConfig创建现货和合约两个权重池（两者的IP限额相互独立）"""
+    options = {'safety': config.RATE_LIMIT_SAFETY, 'order_reserve': config.ORDER_WEIGHT_RESERVE}
+    return {
+        'spot': get_governor('spot', config.SPOT_WEIGHT_LIMIT, **options),
+        'futures': get_governor('futures', config.FUTURES_WEIGHT_LIMIT,
+                                order_limit_10s=config.FUTURES_ORDER_LIMIT_10S, **options),
+    }
+
+
+def _governor_for_uri(governors, uri):
+    return governors['futures'] if '/fapi/' in uri else governors['spot']
+
+
+def base_url_overrides(base_url):
+    """把现货和U本位合约REST地址指向base_url（如本地模拟交易所），返回需要覆盖的属性"""
+    if not base_url:
+        return {}
+    base_url = base_url.rstrip('/')
+    return {'API_URL': f"{base_url}/api", 'FUTURES_URL': f"{base_url}/fapi"}
+
+
+def _retry_after(response):
+    if response is None:
+        return None
+    return response.headers.get('Retry-After')
+
+
+class GovernedClient(Client):
+    """所有REST请求都先经过WeightGovernor的python-binance客户端
+
+    429/418不再重试，由governor按Retry-After暂停后续请求。
+    """
+
+    def __init__(self, *args, governors=None, base_url=None, ping=True, **kwargs):
+        # Client.__init__会调用ping，因此必须先设置governor和地址
+        self.governors = governors
+        for name, url in base_url_overrides(base_url).items():
+            setattr(self, name, url)
+        # ping=False时跳过构造时的ping，由调用方在启动阶段用并行的首批请求验证连接
+        self._skip_init_ping = not ping
+        super().__init__(*args, **kwargs)
+
+    def ping(self):
+        if self._skip_init_ping:
+            self._skip_init_ping = False
+            return {}
+        return super().ping()
+
+    def _request(self, method, uri, signed, force_params=False, **kwargs):
+        if not self.governors:
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        governor = _governor_for_uri(self.governors, uri)
+        path = uri.split('?', 1)[0]
+        priority = PRIORITY_ORDER if is_order_path(path) else PRIORITY_DATA
+        governor.acquire(estimate_weight(path, kwargs.get('data') or kwargs.get('params')), priority)
+        try:
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        except BinanceAPIException as e:
+            if e.status_code in (429, 418):
+                seconds = governor.on_rate_limited(e.status_code, _retry_after(e.response))
+                raise RateLimitedError(e.status_code, seconds) from e
+            raise
+
+    def _handle_response(self, response):
+        # 多线程共用一个客户端，self.response会被其他线程覆盖，因此在这里按本次响应更新权重
+        if self.governors:
+            _governor_for_uri(self.governors, response.url).update_from_headers(response.headers)
+        return super()._handle_response(response)
+
+
+class AsyncGovernedClient(AsyncClient):
+    """GovernedClient的asyncio版本"""
+
+    def __init__(self, *args, governors=None, base_url=None, **kwargs):
+        self.governors = governors
+        for name, url in base_url_overrides(base_url).items():
+            setattr(self, name, url)
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    async def create(cls, *args, governors=None, base_url=None, **kwargs):
+        # AsyncClient.create只按位置参数构造实例，地址覆盖通过子类属性传入
+        overrides = base_url_overrides(base_url)
+        if overrides:
+            cls = type(cls.__name__, (cls,), overrides)
+        # 先创建不带governor的实例完成ping和时间同步，再挂上governor
+        self = await super(AsyncGovernedClient, cls).create(*args, **kwargs)
+        self.governors = governors
+        return self
+
+    async def _request(self, method, uri, signed, force_params=False, **kwargs):
+        if not self.governors:
+            return await super()._request(method, uri, signed, force_params, **kwargs)
+        governor = _governor_for_uri(self.governors, uri)
+        path = uri.split('?', 1)[0]
+        priority = PRIORITY_ORDER if is_order_path(path) else PRIORITY_DATA
+        await governor.acquire_async(estimate_weight(path, kwargs.get('data') or kwargs.get('params')), priority)
+        try:
+            return await super()._request(method, uri, signed, force_params, **kwargs)
+        except BinanceAPIException as e:
+            if e.status_code in (429, 418):
+                seconds = governor.on_rate_limited(e.status_code, _retry_after(e.response))
+                raise RateLimitedError(e.status_code, seconds) from e
+            raise
+
+    async def _handle_response(self, response):
+        # 并发的协程共用self.response，因此在这里按本次响应更新权重
+        if self.governors:
+            _governor_for_uri(self.governors, str(response.url)).update_from_headers(response.headers)
+        return await super()._handle_response(response)
@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger('trading_system')
+
+
+class TickScheduler:
+    """按交易对调度评估任务，保证每个交易对同时最多只有一个任务在执行
+
+    任务执行期间到达的新tick只保留最新的一个，执行结束后立即补跑；
+    被更新tick取代的旧tick直接丢弃并计数，线程池队列长度因此有上界。
+    轮次按单调时钟对齐，调度本身落后时跳过错过的轮次而不是集中补跑。
+    """
+
+    def __init__(self, executor, interval, stats_interval=60):
+        self.executor = executor
+        self.interval = interval
+        self.stats_interval = stats_interval  # 统计日志输出间隔(秒)，0为关闭
+        self._lock = threading.Lock()
+        self._inflight = set()
+        self._pending = {}  # symbol -> (fn, args, 提交时间)
+        self._stop = threading.Event()
+
+        # 统计计数
+        self.submitted = 0  # 实际提交到线程池的任务数
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0  # 因已有任务在执行而延后合并的tick数
+        self.skipped = 0  # 被更新tick取代而丢弃的tick数
+        self.missed_rounds = 0  # 调度循环落后而跳过的轮次数
+        self.rounds = 0
+        self.last_round_lag = 0.0  # 最近一轮相对计划时间的延迟(秒)
+        self.max_round_lag = 0.0
+        self.last_queue_lag = 0.0  # 最近一个任务从提交到开始执行的等待(秒)
+        self.max_queue_lag = 0.0
+
+    def submit(self, symbol, fn, *args):
+        """提交交易对的评估任务，已有任务在执行时合并为待执行的最新tick，返回是否立即提交"""
+        now = time.monotonic()
+        with self._lock:
+            if symbol in self._inflight:
+                if symbol in self._pending:
+                    self.skipped += 1
+                self._pending[symbol] = (fn, args, now)
+                self.coalesced += 1
+                return False
+            self._inflight.add(symbol)
+            self.submitted += 1
+        try:
+            self.executor.submit(self._run, symbol, fn, args, now)
+        except Exception:
+            # 提交失败（如线程池已关闭）时撤销占位，否则该交易对之后的tick都只会被合并而不再执行
+            with self._lock:
+                self._inflight.discard(symbol)
+                self._pending.pop(symbol, None)
+                self.submitted -= 1
+            raise
+        return True
+
+    def _run(self, symbol, fn, args, submitted_at):
+        queue_lag = time.monotonic() - submitted_at
+        self.last_queue_lag = queue_lag
+        if queue_lag > self.max_queue_lag:
+            self.max_queue_lag = queue_lag
+        try:
+            fn(*args)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.error(f"[{symbol}] 调度任务执行失败: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self.completed += 1
+                nxt = self._pending.pop(symbol, None)
+                if nxt is None:
+                    self._inflight.discard(symbol)
+                else:
+                    self.submitted += 1
+        if nxt is not None:
+            fn, args, submitted_at = nxt
+            try:
+                self.executor.submit(self._run, symbol, fn, args, submitted_at)
+            except Exception:
+                # 提交失败（如线程池已关闭）时与submit一样撤销占位和计数
+                with self._lock:
+                    self._inflight.discard(symbol)
+                    self._pending.pop(symbol, None)
+                    self.submitted -= 1
+
+    def run_forever(self, symbols, fn):
+        """每个interval对所有交易对提交一轮fn(symbol)，直到stop()被调用"""
+        start = time.monotonic()
+        last_stats = start
+        round_index = 0
+        while not self._stop.is_set():
+            lag = time.monotonic() - (start + round_index * self.interval)
+            self.last_round_lag = lag
+            if lag > self.max_round_lag:
+                self.max_round_lag = lag
+            for symbol in symbols:
+                self.submit(symbol, fn, symbol)
+            self.rounds += 1
+            round_index += 1
+
+            now = time.monotonic()
+            next_round = start + round_index * self.interval
+            if now >= next_round:
+                # 本轮提交耗时超过一个周期，跳过已错过的轮次
+                missed = int((now - next_round) // self.interval) + 1
+                self.missed_rounds += missed
+                round_index += missed
+                next_round = start + round_index * self.interval
+
+            if self.stats_interval and now - last_stats >= self.stats_interval:
+                last_stats = now
+                self.log_stats()
+            self._stop.wait(max(0.0, next_round - time.monotonic()))
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'in_flight': len(self._inflight),
+                'pending': len(self._pending),
+                'coalesced': self.coalesced,
+                'skipped': self.skipped,
+                'missed_rounds': self.missed_rounds,
+                'last_round_lag': self.last_round_lag,
+                'max_round_lag': self.max_round_lag,
+                'last_queue_lag': self.last_queue_lag,
+                'max_queue_lag': self.max_queue_lag,
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"调度统计: 轮次={stats['rounds']}, 提交={stats['submitted']}, 完成={stats['completed']}, "
+            f"失败={stats['failed']}, 执行中={stats['in_flight']}, 合并tick={stats['coalesced']}, "
+            f"丢弃tick={stats['skipped']}, 跳过轮次={stats['missed_rounds']}, "
+            f"轮次延迟={stats['last_round_lag'] * 1000:.1f}ms(最大{stats['max_round_lag'] * 1000:.1f}ms), "
+            f"排队延迟={stats['last_queue_lag'] * 1000:.1f}ms(最大{stats['max_queue_lag'] * 1000:.1f}ms)"
+        )
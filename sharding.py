@@ -0,0 +1,357 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import signal
+import socket
+import socketserver
+import threading
+import time
+
+from config import TradingConfig
+
+logger = logging.getLogger('trading_system')
+
+POSITION_FRACTION = 0.25  # 每笔开仓占可用余额的比例，与TradingExecutor一致
+MIN_NOTIONAL = 5.0  # 分配金额低于该值(USDT)时拒绝开仓
+
+
+def split_symbols(symbols, shards):
+    """把交易对轮询分给shards个分片，返回每个分片的交易对列表"""
+    return [list(symbols[i::shards]) for i in range(shards)]
+
+
+def parse_address(text):
+    host, port = text.rsplit(':', 1)
+    return host, int(port)
+
+
+class ExposureLedger:
+    """所有分片共享的余额与持仓占用
+
+    每笔开仓分配(余额 - 已占用) × fraction的名义金额，且占用总额不超过余额 × max_exposure，
+    各分片不会各自按全部余额的四分之一重复开仓。模拟模式下余额为初始余额加已实现盈亏；
+    提供balance_source时按TTL从账户读取钱包余额，平仓后立即重新读取。
+    """
+
+    def __init__(self, balance, max_exposure=1.0, fraction=POSITION_FRACTION, min_notional=MIN_NOTIONAL,
+                 balance_source=None, balance_ttl=30.0):
+        self.balance = balance
+        self.max_exposure = max_exposure
+        self.fraction = fraction
+        self.min_notional = min_notional
+        self.balance_source = balance_source
+        self.balance_ttl = balance_ttl
+        self._balance_time = 0.0
+        self.reserved = {}  # symbol -> (名义金额, 分片编号)
+        self.used = 0.0
+        self.realized_pnl = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _refresh_balance(self):
+        if self.balance_source is None or time.monotonic() - self._balance_time < self.balance_ttl:
+            return
+        try:
+            self.balance = float(self.balance_source())
+            self._balance_time = time.monotonic()
+        except Exception as e:
+            logger.error(f"协调器获取账户余额失败: {e}")
+
+    def reserve(self, symbol, shard=None):
+        """为symbol的一笔开仓分配名义金额(USDT)，额度不足时返回0"""
+        with self._lock:
+            if symbol in self.reserved:
+                return self.reserved[symbol][0]
+            self._refresh_balance()
+            amount = min((self.balance - self.used) * self.fraction, self.balance * self.max_exposure - self.used)
+            if amount < self.min_notional:
+                self.rejected += 1
+                return 0.0
+            self.reserved[symbol] = (amount, shard)
+            self.used += amount
+            return amount
+
+    def adopt(self, symbol, amount, shard=None):
+        """登记分片已持有的仓位（重启后恢复的持仓），不受额度限制，重复登记时以最新金额为准"""
+        with self._lock:
+            entry = self.reserved.get(symbol)
+            if entry is not None:
+                self.used -= entry[0]
+            self.reserved[symbol] = (amount, shard)
+            self.used += amount
+
+    def release(self, symbol, pnl=0.0):
+        """平仓或开仓失败后归还额度，pnl为已实现盈亏"""
+        with self._lock:
+            entry = self.reserved.pop(symbol, None)
+            if entry is not None:
+                self.used -= entry[0]
+            self.realized_pnl += pnl
+            if self.balance_source is None:
+                self.balance += pnl
+            else:
+                self._balance_time = 0.0  # 下次分配前重新读取余额
+
+    def status(self):
+        with self._lock:
+            return {
+                'balance': self.balance,
+                'used': self.used,
+                'positions': len(self.reserved),
+                'realized_pnl': self.realized_pnl,
+                'rejected': self.rejected,
+            }
+
+
+class CoordinatorServer(socketserver.ThreadingTCPServer):
+    """协调器的TCP服务，协议为每行一个JSON请求/响应
+
+    {"op": "hello", "shard": 0, "symbols": [...], "positions": {"ACHUSDT": 250.0}}
+    {"op": "adopt", "positions": {"ACHUSDT": 250.0}}
+    {"op": "reserve", "symbol": "ACHUSDT"} -> {"ok": true, "amount": 250.0}
+    {"op": "release", "symbol": "ACHUSDT", "pnl": 1.5}
+    {"op": "status"}
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, ledger):
+        self.ledger = ledger
+        self.workers = {}  # 分片编号 -> 交易对数量
+        super().__init__(address, _CoordinatorHandler)
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        server = self.server
+        shard = None
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                op = request.get('op')
+                if op == 'hello':
+                    shard = request.get('shard')
+                    server.workers[shard] = len(request.get('symbols', []))
+                    logger.info(f"分片{shard}已连接，负责{server.workers[shard]}个交易对")
+                    # 协调器或分片重启后，分片已持有的仓位重新计入占用
+                    for symbol, amount in request.get('positions', {}).items():
+                        server.ledger.adopt(symbol, float(amount), shard)
+                    response = {'ok': True}
+                elif op == 'adopt':
+                    for symbol, amount in request.get('positions', {}).items():
+                        server.ledger.adopt(symbol, float(amount), shard)
+                    response = {'ok': True}
+                elif op == 'reserve':
+                    response = {'ok': True, 'amount': server.ledger.reserve(request['symbol'], shard)}
+                elif op == 'release':
+                    server.ledger.release(request['symbol'], float(request.get('pnl', 0.0)))
+                    response = {'ok': True}
+                elif op == 'status':
+                    response = {'ok': True, **server.ledger.status(), 'workers': len(server.workers)}
+                else:
+                    response = {'ok': False, 'error': f"未知操作: {op}"}
+            except (ValueError, KeyError) as e:
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+        if shard is not None:
+            logger.warning(f"分片{shard}已断开")
+
+
+class RemoteAllocator:
+    """工作进程访问协调器的客户端，接口与ExposureLedger的reserve/release一致
+
+    连接断开时自动重连；协调器不可用时reserve返回0（不开仓），未送达的release在重连后补发。
+    本分片持有的仓位金额在每次连接的hello中发送，协调器重启后据此恢复占用。
+    """
+
+    def __init__(self, address, shard, symbols=(), timeout=5.0):
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.shard = shard
+        self.symbols = list(symbols)
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+        self._pending_releases = []
+        self.positions = {}  # symbol -> 本分片持仓占用的名义金额
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._reader = sock.makefile('rb')
+        self._send({'op': 'hello', 'shard': self.shard, 'symbols': self.symbols, 'positions': self.positions})
+        # 每条送达后才移出队列，补发中途断开时剩余的留到下次重连
+        while self._pending_releases:
+            self._send(self._pending_releases[0])
+            self._pending_releases.pop(0)
+
+    def _send(self, request):
+        self._sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError('协调器已关闭连接')
+        return json.loads(line)
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    def _call(self, request):
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(request)
+                except (OSError, ValueError) as e:
+                    self._close()
+                    if attempt:
+                        raise ConnectionError(f"无法连接协调器{self.address}: {e}") from e
+
+    def reserve(self, symbol):
+        try:
+            amount = float(self._call({'op': 'reserve', 'symbol': symbol}).get('amount', 0.0))
+        except ConnectionError as e:
+            logger.error(f"[{symbol}] 申请开仓额度失败: {e}")
+            return 0.0
+        if amount > 0:
+            self.positions[symbol] = amount
+        return amount
+
+    def adopt(self, positions):
+        """登记启动时恢复的持仓{symbol: 名义金额}；协调器暂不可用时在下次连接的hello中补发"""
+        self.positions.update(positions)
+        if not positions:
+            return
+        try:
+            self._call({'op': 'adopt', 'positions': positions})
+        except ConnectionError as e:
+            logger.error(f"向协调器登记恢复的持仓失败，重连后补发: {e}")
+
+    def release(self, symbol, pnl=0.0):
+        self.positions.pop(symbol, None)
+        request = {'op': 'release', 'symbol': symbol, 'pnl': pnl}
+        try:
+            self._call(request)
+        except ConnectionError as e:
+            logger.error(f"[{symbol}] 归还开仓额度失败，重连后补发: {e}")
+            with self._lock:
+                self._pending_releases.append(request)
+
+    def status(self):
+        return self._call({'op': 'status'})
+
+
+def _balance_source(config):
+    """真实交易时协调器读取合约钱包USDT余额"""
+    from rate_limiter import GovernedClient, governors_for_config
+
+    client = GovernedClient(config.active_api_key, config.active_api_secret, {'proxies': config.PROXIES},
+                            testnet=config.TESTNET, governors=governors_for_config(config),
+                            base_url=config.REST_BASE_URL)
+
+    def fetch():
+        for balance in client.futures_account_balance():
+            if balance['asset'] == 'USDT':
+                return float(balance['balance'])
+        return 0.0
+
+    return fetch
+
+
+def worker_main(index, symbols, address, weight_share=1.0):
+    """工作进程入口：只处理symbols，开仓额度向协调器申请"""
+    import main
+
+    allocator = RemoteAllocator(address, index, symbols)
+    main.run_shard(index, symbols, allocator, weight_share)
+
+
+def run_coordinator(config, shards, address=None, spawn=True):
+    """启动协调器；spawn为True时在本机启动shards个工作进程并在其退出后重启"""
+    host, port = parse_address(address or config.SHARD_COORDINATOR)
+    if config.SIMULATION_MODE:
+        ledger = ExposureLedger(config.SIMULATED_BALANCE, config.SHARD_MAX_EXPOSURE)
+    else:
+        ledger = ExposureLedger(0.0, config.SHARD_MAX_EXPOSURE, balance_source=_balance_source(config),
+                                balance_ttl=config.BALANCE_TTL)
+    server = CoordinatorServer((host, port), ledger)
+    threading.Thread(target=server.serve_forever, name='shard-coordinator', daemon=True).start()
+    address = f"{host}:{server.server_address[1]}"
+    logger.info(f"分片协调器已启动: {address}，{len(config.SYMBOLS)}个交易对分为{shards}个分片")
+
+    processes = {}
+    slices = split_symbols(config.SYMBOLS, shards)
+    # spawn启动的子进程不继承父进程的线程和锁；本机所有分片共用一个IP的权重额度
+    context = multiprocessing.get_context('spawn')
+
+    def start_worker(index):
+        process = context.Process(target=worker_main, args=(index, slices[index], address, 1.0 / shards),
+                                  name=f"shard-{index}", daemon=True)
+        process.start()
+        processes[index] = process
+
+    stop = threading.Event()
+
+    def handle_signal(sig, frame):
+        stop.set()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    if spawn:
+        for index in range(shards):
+            start_worker(index)
+
+    last_stats = time.monotonic()
+    while not stop.wait(1.0):
+        for index, process in list(processes.items()):
+            if not process.is_alive():
+                logger.error(f"分片{index}进程已退出(退出码{process.exitcode})，正在重启")
+                start_worker(index)
+        if config.STATS_LOG_INTERVAL and time.monotonic() - last_stats >= config.STATS_LOG_INTERVAL:
+            last_stats = time.monotonic()
+            s = ledger.status()
+            logger.info(f"分片协调器: 分片={len(server.workers)}, 余额={s['balance']:.2f}, 已占用={s['used']:.2f}, "
+                        f"持仓={s['positions']}, 已实现盈亏={s['realized_pnl']:.2f}, 拒绝开仓={s['rejected']}")
+
+    logger.info('分片协调器正在退出...')
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        process.join(timeout=10)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='多进程/多主机分片运行')
+    sub = parser.add_subparsers(dest='command', required=True)
+    coordinator = sub.add_parser('coordinator', help='启动协调器（默认同时在本机启动所有分片）')
+    coordinator.add_argument('--shards', type=int, default=None, help='分片数，默认使用配置中的SHARD_WORKERS')
+    coordinator.add_argument('--address', default=None, help='监听地址host:port')
+    coordinator.add_argument('--no-spawn', action='store_true', help='不启动本机分片，等待其他主机的分片连接')
+    worker = sub.add_parser('worker', help='启动一个分片，连接到协调器')
+    worker.add_argument('--shard', type=int, required=True, help='分片编号(从0开始)')
+    worker.add_argument('--shards', type=int, required=True)
+    worker.add_argument('--coordinator', default=None, help='协调器地址host:port')
+    worker.add_argument('--weight-share', type=float, default=1.0, help='本进程可用的IP请求权重比例')
+    args = parser.parse_args()
+
+    config = TradingConfig()
+    if args.command == 'coordinator':
+        from log_pipeline import setup_logging
+        setup_logging(config)
+        run_coordinator(config, args.shards or config.SHARD_WORKERS or 1, args.address, spawn=not args.no_spawn)
+    else:
+        symbols = split_symbols(config.SYMBOLS, args.shards)[args.shard]
+        worker_main(args.shard, symbols, args.coordinator or config.SHARD_COORDINATOR, args.weight_share)
@@ -0,0 +1,183 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger('trading_system')
+
+# 每个交易对持仓状态的定长记录(53字节)
+STATE_DTYPE = np.dtype([
+    ('timestamp', '<i8'),  # 毫秒时间戳，合并多个目录时较新的记录优先
+    ('last_short_price', '<f8'),
+    ('take_profit_price', '<f8'),
+    ('position_size', '<f8'),
+    ('symbol', 'S20'),
+    ('in_position', 'u1'),
+])
+
+WAL_FILE = 'state.wal'
+CHECKPOINT_FILE = 'state.bin'
+
+
+def _read_records(path):
+    """读取定长记录文件，忽略崩溃时写了一半的最后一条"""
+    if not os.path.exists(path):
+        return np.empty(0, dtype=STATE_DTYPE)
+    with open(path, 'rb') as f:
+        data = f.read()
+    count = len(data) // STATE_DTYPE.itemsize
+    return np.frombuffer(data[:count * STATE_DTYPE.itemsize], dtype=STATE_DTYPE)
+
+
+class StateStore:
+    """交易状态的本地持久化：预写日志(WAL) + 定期检查点
+
+    每次持仓变化追加一条定长记录并fsync，累计checkpoint_every条后把每个交易对的最新状态
+    写入临时文件再原子替换检查点，然后清空WAL。重启时读取检查点并重放WAL。
+    """
+
+    def __init__(self, root_dir, checkpoint_every=256):
+        self.root_dir = root_dir
+        self.checkpoint_every = checkpoint_every
+        self._latest = {}  # symbol -> 最新记录
+        self._wal = None
+        self._wal_records = 0
+        self._lock = threading.Lock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    @property
+    def wal_path(self):
+        return os.path.join(self.root_dir, WAL_FILE)
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.root_dir, CHECKPOINT_FILE)
+
+    def load(self):
+        """读取检查点并重放WAL，返回{symbol: 记录}"""
+        with self._lock:
+            self._latest = {}
+            for path in (self.checkpoint_path, self.wal_path):
+                for row in _read_records(path):
+                    self._latest[row['symbol'].decode()] = row.copy()
+            self._wal_records = len(_read_records(self.wal_path))
+            return dict(self._latest)
+
+    @staticmethod
+    def _row(symbol, state, timestamp):
+        return np.array([(timestamp, state.last_short_price or 0.0, state.take_profit_price or 0.0,
+                          state.position_size or 0.0, symbol.encode('ascii'), state.in_position)],
+                        dtype=STATE_DTYPE)
+
+    def save(self, symbol, state):
+        """追加一条状态记录，写入磁盘后返回"""
+        row = self._row(symbol, state, int(time.time() * 1000))
+        with self._lock:
+            try:
+                if self._wal is None:
+                    self._wal = open(self.wal_path, 'ab')
+                self._wal.write(row.tobytes())
+                self._wal.flush()
+                os.fsync(self._wal.fileno())
+            except OSError as e:
+                logger.error(f"[{symbol}] 写入交易状态失败: {e}")
+                return
+            self._latest[symbol] = row[0]
+            self._wal_records += 1
+            if self._wal_records >= self.checkpoint_every:
+                self._checkpoint_locked()
+
+    def checkpoint(self, state_map=None):
+        """写检查点；传入state_map时先用其当前状态整体替换（启动恢复后使用，避免逐条fsync）"""
+        with self._lock:
+            if state_map is not None:
+                timestamp = int(time.time() * 1000)
+                for symbol, state in state_map.items():
+                    self._latest[symbol] = self._row(symbol, state, timestamp)[0]
+            self._checkpoint_locked()
+
+    def _checkpoint_locked(self):
+        rows = np.array(list(self._latest.values()), dtype=STATE_DTYPE)
+        tmp_path = self.checkpoint_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(rows.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.checkpoint_path)
+            # 检查点已包含WAL中的全部记录；若在此之前崩溃，重放WAL结果相同
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+            open(self.wal_path, 'wb').close()
+        except OSError as e:
+            logger.error(f"写入交易状态检查点失败: {e}")
+            return
+        self._wal_records = 0
+
+    def close(self):
+        with self._lock:
+            if self._latest:
+                self._checkpoint_locked()
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+
+def load_states(root_dir):
+    """合并root_dir及其shard*子目录中的状态，同一交易对取时间戳最新的记录"""
+    if not os.path.isdir(root_dir):
+        return {}
+    directories = [root_dir] + [os.path.join(root_dir, n) for n in sorted(os.listdir(root_dir))
+                                if n.startswith('shard') and os.path.isdir(os.path.join(root_dir, n))]
+    merged = {}
+    for directory in directories:
+        for symbol, row in StateStore(directory).load().items():
+            if symbol not in merged or row['timestamp'] > merged[symbol]['timestamp']:
+                merged[symbol] = row
+    return merged
+
+
+def restore_states(store, state_map, config, client=None, positions=None, root_dir=None):
+    """启动时恢复持仓状态
+
+    先从本地记录恢复，真实交易时再用一次不带symbol的futures_position_information
+    拉取全部持仓进行核对：交易所有空单而本地没有的补记，本地有而交易所已平仓的清除。
+    asyncio运行时由调用方获取positions后传入。返回恢复为持仓中的交易对数量。
+    """
+    start = time.perf_counter()
+    records = load_states(root_dir or store.root_dir)
+    for symbol, state in state_map.items():
+        row = records.get(symbol)
+        if row is not None and row['in_position']:
+            state.restore(True, float(row['last_short_price']), float(row['take_profit_price']),
+                   float(row['position_size']))
+
+    if not config.SIMULATION_MODE and positions is None and client is not None:
+        try:
+            positions = client.futures_position_information()
+        except Exception as e:
+            logger.error(f"获取合约持仓失败，仅使用本地状态: {e}")
+            positions = None
+    if not config.SIMULATION_MODE and positions is not None:
+        shorts = {p['symbol']: p for p in positions if float(p['positionAmt']) < 0}
+        for symbol, state in state_map.items():
+            position = shorts.get(symbol)
+            if position is not None:
+                entry_price = float(position['entryPrice'])
+                size = abs(float(position['positionAmt']))
+                if not state.in_position or abs(state.position_size - size) > 1e-12:
+                    logger.warning(f"[{symbol}] 按交易所持仓校正状态: 数量={size}, 开仓价格={entry_price}")
+                take_profit = state.take_profit_price if state.in_position else \
+                    entry_price * (1 - config.TAKE_PROFIT_PERCENT / 100)
+                state.restore(True, entry_price, take_profit, size)
+            elif state.in_position:
+                logger.warning(f"[{symbol}] 交易所已无空单，清除本地持仓状态")
+                state.restore(False, 0, 0, 0)
+
+    store.checkpoint(state_map)
+    restored = sum(1 for state in state_map.values() if state.in_position)
+    logger.info(f"已恢复{restored}个交易对的持仓状态(共{len(state_map)}个)，耗时{time.perf_counter() - start:.3f}秒")
+    return restored
@@ -0,0 +1,165 @@
+import bisect
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kline_stream import KlineStream
+from latency import recorder
+from log_pipeline import trade_extra
+from trading_state import OPEN
+
+logger = logging.getLogger('trading_system')
+
+# 全市场推送流：每秒一次的标记价格数组，或逐笔更新的最优挂单
+STREAMS = {
+    'markPrice': '!markPrice@arr@1s',
+    'bookTicker': '!bookTicker',
+}
+
+
+class TakeProfitIndex:
+    """按交易对索引的止盈价格集合，每个交易对的止盈价格升序排列
+
+    做空时价格小于等于止盈价即触发，因此一次推送只需二分查找出不低于当前价的那部分。
+    没有持仓的交易对不在索引中，全市场推送里的其他交易对只做一次字典查找。
+    """
+
+    def __init__(self):
+        self._levels = {}  # symbol -> 升序的止盈价格列表
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._levels)
+
+    def __contains__(self, symbol):
+        return symbol in self._levels
+
+    def levels(self, symbol):
+        with self._lock:
+            return list(self._levels.get(symbol, ()))
+
+    def arm(self, symbol, level):
+        if level is None or level <= 0:
+            return
+        with self._lock:
+            levels = self._levels.setdefault(symbol, [])
+            i = bisect.bisect_left(levels, level)
+            if i == len(levels) or levels[i] != level:
+                levels.insert(i, level)
+
+    def disarm(self, symbol):
+        with self._lock:
+            self._levels.pop(symbol, None)
+
+    def crossed(self, prices):
+        """prices为[(symbol, 价格)]，取出并返回被触发的[(symbol, 价格, 止盈价)]"""
+        fired = []
+        with self._lock:
+            for symbol, price in prices:
+                levels = self._levels.get(symbol)
+                if not levels or price > levels[-1]:
+                    continue
+                i = bisect.bisect_left(levels, price)
+                fired.append((symbol, price, levels[-1]))
+                del levels[i:]
+                if not levels:
+                    del self._levels[symbol]
+        return fired
+
+
+class TriggerStream(KlineStream):
+    """订阅合约全市场价格推送，复用KlineStream的重连和代理处理，不需要补数据"""
+
+    LABEL = '止盈触发'
+    THREAD_NAME = 'take-profit-stream'
+
+    def __init__(self, config, stream, on_prices, base_url=None):
+        super().__init__(None, config, [], on_kline=None, base_url=base_url or config.FUTURES_WS_BASE_URL)
+        self.stream = stream
+        self.on_prices = on_prices  # 回调: on_prices([(symbol, 价格)])
+
+    @property
+    def streams(self):
+        return [STREAMS.get(self.stream, self.stream)]
+
+    def backfill(self, start_times, generation):
+        pass
+
+    def _on_message(self, ws, message):
+        try:
+            data = json.loads(message).get('data')
+        except (ValueError, AttributeError):
+            logger.error(f"无法解析websocket消息: {message[:200]}")
+            return
+        if not data:
+            return
+        if isinstance(data, list):
+            # !markPrice@arr推送的是全部交易对的标记价格数组
+            prices = [(item['s'], float(item['p'])) for item in data if item.get('e') == 'markPriceUpdate']
+        elif data.get('e') == 'bookTicker':
+            # 平空是买入，按卖一价判断
+            prices = [(data['s'], float(data['a']))]
+        else:
+            return
+        try:
+            self.on_prices(prices)
+        except Exception as e:
+            logger.error(f"处理止盈触发推送失败: {e}", exc_info=True)
+
+
+class TakeProfitEngine:
+    """由推送价格驱动的止盈触发器
+
+    开仓成交后登记止盈价（TradingExecutor.take_profit），平仓后撤销；推送价格越过止盈价时
+    立即在独立线程池中调用close_short_position，平仓延迟取决于推送延迟而不是轮询间隔。
+    平仓仍经过持仓状态机，与轮询路径同时触发时只有一个能进入closing。
+    """
+
+    def __init__(self, executor, state_map, config, base_url=None, max_workers=2):
+        self.executor = executor
+        self.state_map = state_map
+        self.config = config
+        self.index = TakeProfitIndex()
+        self.stream = TriggerStream(config, config.TAKE_PROFIT_STREAM, self.on_prices, base_url=base_url)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='take-profit')
+        self.fired = 0
+
+    def sync(self):
+        """按当前持仓状态重新登记（启动恢复持仓后调用）"""
+        for symbol, state in self.state_map.items():
+            self.update(symbol, state)
+        logger.info(f"止盈触发器已登记{len(self.index)}个持仓")
+
+    def update(self, symbol, state):
+        """持仓中登记止盈价，否则撤销"""
+        self.index.disarm(symbol)
+        if state.phase == OPEN:
+            self.index.arm(symbol, state.take_profit_price)
+
+    def start(self):
+        self.stream.start()
+        return self
+
+    def stop(self):
+        self.stream.stop()
+        self._pool.shutdown(wait=False)
+
+    def on_prices(self, prices):
+        for symbol, price, level in self.index.crossed(prices):
+            self.fired += 1
+            self._pool.submit(self._fire, symbol, price, level)
+
+    def _fire(self, symbol, price, level):
+        state = self.state_map.get(symbol)
+        if state is None:
+            return
+        if state.phase != OPEN or price > state.take_profit_price:
+            # 推送到达前已平仓或止盈价已变化
+            self.update(symbol, state)
+            return
+        recorder.mark_tick()
+        logger.info("[%s] 推送价格%s达到止盈点(%s), 准备平仓...", symbol, price, level,
+                    extra=trade_extra(self.config.SIMULATION_MODE))
+        # 模拟成交按触发价格计算；推送的可能是标记价格，不写入共享的最新价快照
+        self.executor.close_short_position(symbol, state, price if self.config.SIMULATION_MODE else None)
@@ -0,0 +1,50 @@
+import asyncio
+
+from config import TradingConfig
+from trading_executor import AsyncTradingExecutor
+from trading_state import IDLE, OPEN, TradingState
+
+
+class Allocator:
+    def __init__(self, amount):
+        self.amount = amount
+        self.calls = []
+
+    def reserve(self, symbol):
+        self.calls.append(('reserve', symbol))
+        return self.amount
+
+    def release(self, symbol, pnl=0.0):
+        self.calls.append(('release', symbol))
+
+
+def make_executor(allocator):
+    executor = AsyncTradingExecutor(None, TradingConfig(SIMULATION_MODE=True))
+    executor.allocator = allocator
+    executor.snapshot.update_price('ACHUSDT', 2.0)
+    return executor
+
+
+def test_async_executor_reserves_and_releases_through_allocator():
+    allocator = Allocator(100.0)
+    executor = make_executor(allocator)
+    state = TradingState(executor.config)
+
+    async def run():
+        await executor.open_short_position('ACHUSDT', 2.0, state)
+        assert state.phase == OPEN
+        assert state.position_size == 50.0
+        await executor.close_short_position('ACHUSDT', state)
+
+    asyncio.run(run())
+    assert state.phase == IDLE
+    assert allocator.calls == [('reserve', 'ACHUSDT'), ('release', 'ACHUSDT')]
+
+
+def test_async_executor_skips_open_without_allocation():
+    allocator = Allocator(0.0)
+    executor = make_executor(allocator)
+    state = TradingState(executor.config)
+    assert asyncio.run(executor.open_short_position('ACHUSDT', 2.0, state)) is None
+    assert state.phase == IDLE
+    assert allocator.calls == [('reserve', 'ACHUSDT')]
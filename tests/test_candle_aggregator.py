@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from candle_aggregator import CandleAggregator, interval_ms
+from data_processor import DataProcessor
+from fake_exchange import synthetic_fixture
+
+BASE_MS = 60_000
+
+
+def base_klines(bars=6 * 60 + 17):
+    # 不从整点开始，覆盖周期中途接入和未收盘的最后一根
+    rows = synthetic_fixture(['ACHUSDT'], bars=bars + 7, interval='1m', seed=3)['klines']['ACHUSDT']
+    return [(int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]), float(r[5])) for r in rows[7:]]
+
+
+def aggregate(klines, interval):
+    """直接按周期分组得到的开高低收量"""
+    ms = interval_ms(interval)
+    bars = {}
+    for open_time, o, h, l, c, v in klines:
+        bucket = open_time - open_time % ms
+        if bucket not in bars:
+            bars[bucket] = [bucket, o, h, l, c, v]
+        else:
+            bar = bars[bucket]
+            bar[2] = max(bar[2], h)
+            bar[3] = min(bar[3], l)
+            bar[4] = c
+            bar[5] += v
+    return [bars[k] for k in sorted(bars)]
+
+
+def test_interval_must_be_multiple_of_base():
+    aggregator = CandleAggregator('3m')
+    with pytest.raises(ValueError):
+        aggregator.add('5m')
+    with pytest.raises(ValueError):
+        interval_ms('7m')
+
+
+@pytest.mark.parametrize('interval', ['15m', '1h'])
+def test_aggregated_bars_match_direct_aggregation(interval):
+    klines = base_klines()
+    aggregator = CandleAggregator('1m', capacity=1000, rsi_period=6)
+    aggregator.add(interval)
+    for open_time, o, h, l, c, v in klines:
+        # 每根基础K线先以开盘价推送一次，再以完整数据更新
+        aggregator.update(open_time, o, o, o, o, 0.0)
+        aggregator.update(open_time, o, h, l, c, v)
+
+    expected = aggregate(klines, interval)
+    buffer = aggregator.klines(interval)
+    assert len(buffer) == len(expected)
+    np.testing.assert_array_equal(buffer.open_times, [bar[0] for bar in expected])
+    for column, index in (('opens', 1), ('highs', 2), ('lows', 3), ('closes', 4), ('volumes', 5)):
+        np.testing.assert_allclose(getattr(buffer, column), [bar[index] for bar in expected], rtol=1e-12)
+
+    rsi = DataProcessor.calculate_rsi_batch([bar[4] for bar in expected], 6)[0, -1]
+    assert aggregator.rsi(interval) == pytest.approx(rsi)
+
+
+def test_closed_intervals_are_reported():
+    klines = base_klines(bars=120)
+    aggregator = CandleAggregator('1m', capacity=100, rsi_period=6)
+    aggregator.add('15m')
+    aggregator.add('1h')
+    closed = {'15m': 0, '1h': 0}
+    for open_time, o, h, l, c, v in klines:
+        for interval in aggregator.update(open_time, o, h, l, c, v):
+            closed[interval] += 1
+    assert closed['15m'] == len(aggregate(klines, '15m')) - 1
+    assert closed['1h'] == len(aggregate(klines, '1h')) - 1
+
+
+def test_trades_build_the_forming_base_bar():
+    aggregator = CandleAggregator('1m', rsi_period=6)
+    aggregator.add('15m')
+    start = 1_700_000_100_000 - 1_700_000_100_000 % interval_ms('15m')
+    for i, (price, quantity) in enumerate([(10.0, 1.0), (12.0, 2.0), (9.0, 1.0), (11.0, 3.0)]):
+        aggregator.add_trade(start + i * 1000, price, quantity)
+    buffer = aggregator.klines('15m')
+    assert buffer.open_times[-1] == start
+    assert (buffer.opens[-1], buffer.highs[-1], buffer.lows[-1], buffer.closes[-1], buffer.volumes[-1]) == \
+        (10.0, 12.0, 9.0, 11.0, 7.0)
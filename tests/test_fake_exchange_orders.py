@@ -0,0 +1,39 @@
+import pytest
+
+from config import TradingConfig
+from fake_exchange import FakeExchange, synthetic_fixture
+from rate_limiter import GovernedClient
+from trading_executor import TradingExecutor
+from trading_state import IDLE, OPEN, TradingState
+
+SYMBOL = 'ACHUSDT'
+
+
+@pytest.fixture
+def exchange():
+    exchange = FakeExchange(synthetic_fixture([SYMBOL], bars=300, interval='15m'), start_bars=250)
+    exchange.start(host='127.0.0.1', ws=False)
+    yield exchange
+    exchange.stop()
+
+
+def test_executor_fills_from_futures_order_response(exchange):
+    config = TradingConfig(PROXIES={}, SIMULATION_MODE=False)
+    client = GovernedClient('key', 'secret', base_url=exchange.rest_url, ping=False)
+    executor = TradingExecutor(client, config)
+    state = TradingState(config)
+    price = float(exchange.price(SYMBOL))
+
+    assert executor.open_short_position(SYMBOL, price, state) is not None
+    assert state.phase == OPEN
+    assert state.last_short_price == pytest.approx(price)
+    assert state.take_profit_price == pytest.approx(price * (1 - config.TAKE_PROFIT_PERCENT / 100))
+
+    assert executor.close_short_position(SYMBOL, state) is not None
+    assert state.phase == IDLE
+
+
+def test_ack_response_has_no_fill_price(exchange):
+    status, order = exchange.handle('POST', '/fapi/v1/order', {'symbol': SYMBOL, 'side': 'SELL', 'quantity': '1'})
+    assert status == 200
+    assert 'fills' not in order and float(order['avgPrice']) == 0
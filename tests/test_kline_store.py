@@ -0,0 +1,51 @@
+from kline_store import KlineStore, fetch_pages
+
+STEP = 60_000
+
+
+class Exchange:
+    """按startTime返回K线的REST替身，记录每次请求的limit"""
+
+    def __init__(self, count):
+        self.rows = [[i * STEP, '1', '1', '1', str(1 + i), '1'] for i in range(count)]
+        self.limits = []
+
+    def fetch(self, start_time, limit):
+        self.limits.append(limit)
+        if start_time is None:
+            return self.rows[-limit:]
+        rows = [r for r in self.rows if r[0] >= start_time]
+        return rows[:limit]
+
+
+def test_steady_state_uses_one_small_request():
+    exchange = Exchange(500)
+    klines = fetch_pages(exchange.fetch, exchange.rows[-2][0])
+    assert exchange.limits == [99]
+    assert [k[0] for k in klines] == [r[0] for r in exchange.rows[-2:]]
+
+
+def test_catch_up_pages_without_gaps_or_duplicates():
+    exchange = Exchange(2500)
+    klines = fetch_pages(exchange.fetch, 0)
+    assert exchange.limits == [99, 1000, 1000, 1000]
+    assert [k[0] for k in klines] == [r[0] for r in exchange.rows]
+
+
+def test_fetch_incremental_persists_only_closed_bars(tmp_path):
+    exchange = Exchange(300)
+    store = KlineStore(str(tmp_path))
+    klines = store.fetch_incremental('futures', 'ACHUSDT', '1m', exchange.fetch, warmup_limit=200)
+    assert len(klines) == 200
+    # 最后一根正在形成，不写入磁盘
+    assert store.last_open_time('futures', 'ACHUSDT', '1m') == exchange.rows[-2][0]
+
+    exchange.rows += [[(300 + i) * STEP, '1', '1', '1', '1', '1'] for i in range(5)]
+    exchange.limits.clear()
+    klines = store.fetch_incremental('futures', 'ACHUSDT', '1m', exchange.fetch)
+    assert exchange.limits == [99]
+    assert klines[0][0] == exchange.rows[-7][0]
+    assert store.last_open_time('futures', 'ACHUSDT', '1m') == exchange.rows[-2][0]
+
+    saved = KlineStore(str(tmp_path)).load('futures', 'ACHUSDT', '1m')
+    assert list(saved['open_time']) == [r[0] for r in exchange.rows[100:-1]]
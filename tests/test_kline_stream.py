@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from config import TradingConfig
+from fake_exchange import FakeExchange, synthetic_fixture
+from kline_stream import KlineStream
+from rate_limiter import GovernedClient
+
+SYMBOL = 'ACHUSDT'
+STEP = 60_000
+
+
+class Recorder:
+    """按到达顺序记录on_kline回调"""
+
+    def __init__(self):
+        self.events = []
+        self.changed = threading.Condition()
+
+    def __call__(self, kline_data, live):
+        with self.changed:
+            self.events.append((int(kline_data['k']['t']), live))
+            self.changed.notify_all()
+
+    def wait_for(self, open_time, timeout=20):
+        deadline = time.monotonic() + timeout
+        with self.changed:
+            while not self.events or self.events[-1][0] < open_time:
+                remaining = deadline - time.monotonic()
+                assert remaining > 0, f"等待K线{open_time}超时，最后收到{self.events[-1:]}"
+                self.changed.wait(remaining)
+
+    def open_times(self):
+        with self.changed:
+            return [t for t, _ in self.events]
+
+
+def assert_contiguous(open_times, first):
+    assert open_times[0] == first
+    distinct = sorted(set(open_times))
+    assert open_times == sorted(open_times), '回调顺序倒退'
+    assert distinct == list(range(first, distinct[-1] + STEP, STEP)), '补数据后K线不连续'
+
+
+@pytest.fixture
+def exchange():
+    exchange = FakeExchange(synthetic_fixture([SYMBOL], bars=3000, interval='1m'), latency=0.002,
+                            start_bars=2600)
+    exchange.start(host='127.0.0.1')
+    yield exchange
+    exchange.stop()
+
+
+@pytest.fixture
+def make_stream(exchange):
+    streams = []
+
+    def make(on_kline):
+        config = TradingConfig(PROXIES={}, INTERVAL='1m', BASE_INTERVAL='', WS_RECONNECT_DELAY=0.05)
+        client = GovernedClient('', '', base_url=exchange.rest_url, ping=False)
+        stream = KlineStream(client, config, [SYMBOL], on_kline=on_kline, base_url=exchange.ws_url)
+        streams.append(stream)
+        return stream
+
+    yield make
+    for stream in streams:
+        stream.stop()
+
+
+def test_backfill_pages_gaps_longer_than_one_request(exchange, make_stream):
+    recorder = Recorder()
+    stream = make_stream(recorder)
+    # 距上次收到的K线已有2500根，超过单次REST请求的1000根上限
+    first = exchange.open_time(SYMBOL, 100)
+    stream.last_open_time[SYMBOL] = first
+    stream.start()
+    recorder.wait_for(exchange.open_time(SYMBOL, 2700))
+    assert_contiguous(recorder.open_times(), first)
+
+
+def test_backfill_does_not_block_feed_thread(exchange, make_stream):
+    recorder = Recorder()
+    stream = make_stream(recorder)
+    stream.last_open_time[SYMBOL] = exchange.open_time(SYMBOL, 100)
+    started = threading.Event()
+    release = threading.Event()
+    get_klines = stream.client.get_klines
+
+    def slow_get_klines(**kwargs):
+        started.set()
+        release.wait(10)
+        return get_klines(**kwargs)
+
+    stream.client.get_klines = slow_get_klines
+    stream.start()
+    assert started.wait(10)
+    # 补数据的REST请求挂起期间，推送线程仍在接收消息（暂存到补齐之后）
+    deadline = time.monotonic() + 10
+    while not stream._held.get(SYMBOL) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stream._held.get(SYMBOL)
+    assert not recorder.events
+    release.set()
+    recorder.wait_for(exchange.open_time(SYMBOL, 2650))
+    assert_contiguous(recorder.open_times(), exchange.open_time(SYMBOL, 100))
+
+
+def test_reconnect_backfills_bars_missed_while_disconnected(exchange, make_stream):
+    recorder = Recorder()
+    stream = make_stream(recorder)
+    first = exchange.open_time(SYMBOL, 2500)
+    stream.last_open_time[SYMBOL] = first
+    stream.start()
+    recorder.wait_for(exchange.open_time(SYMBOL, 2620))
+
+    exchange.disconnect()
+    deadline = time.monotonic() + 10
+    while stream.connected.is_set() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    # 断线期间行情继续推进，这些K线只能由重连后的补数据取得
+    exchange.skip(SYMBOL, 150)
+    recorder.wait_for(exchange.open_time(SYMBOL, 2900))
+    assert_contiguous(recorder.open_times(), first)
+    assert len(recorder.events) > 0 and recorder.events[-1][1]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from data_processor import DataProcessor, IncrementalRSI
+
+pd = pytest.importorskip('pandas')
+
+
+def random_closes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return 10.0 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+def pandas_rsi(closes, period):
+    """改造前按DataFrame逐窗口计算的RSI"""
+    return DataProcessor.calculate_rsi(pd.DataFrame({'close': closes}), period)['rsi'].to_numpy()
+
+
+@pytest.mark.parametrize('period', [6, 14])
+def test_incremental_rsi_matches_pandas(period):
+    closes = random_closes(300, seed=period)
+    expected = pandas_rsi(closes, period)
+    rsi = IncrementalRSI(period)
+    for i, close in enumerate(closes):
+        # 正在形成的K线先推送几次中间价，最后一次为收盘价
+        rsi.update(i, close * 1.01)
+        rsi.update(i, close * 0.99)
+        value = rsi.update(i, close)
+        if i < period - 1:
+            assert value is None
+        else:
+            assert value == pytest.approx(expected[i], rel=1e-9, abs=1e-9)
+
+
+@pytest.mark.parametrize('period', [6, 14])
+def test_batch_rsi_matches_pandas(period):
+    closes = np.vstack([random_closes(250, seed=s) for s in range(5)])
+    batch = DataProcessor.calculate_rsi_batch(closes, period)
+    for row, symbol_closes in zip(batch, closes):
+        expected = pandas_rsi(symbol_closes, period)
+        np.testing.assert_allclose(row[period - 1:], expected[period - 1:], rtol=1e-9, atol=1e-9)
+        assert np.isnan(row[:period - 1]).all()
+
+
+def test_flat_window_uses_loss_floor_like_pandas():
+    closes = np.linspace(1.0, 2.0, 30)  # 只涨不跌，avg_loss为0
+    expected = pandas_rsi(closes, 6)
+    rsi = IncrementalRSI(6)
+    for i, close in enumerate(closes):
+        rsi.update(i, close)
+    assert rsi.value == pytest.approx(expected[-1])
+    assert DataProcessor.calculate_rsi_batch(closes, 6)[0, -1] == pytest.approx(expected[-1])
+
+
+@pytest.mark.parametrize('bars', [6, 7, 8, 120])
+def test_warm_start_matches_sync(bars):
+    period = 6
+    closes = random_closes(bars, seed=bars)
+    open_times = list(range(bars))
+    synced = IncrementalRSI(period)
+    synced.sync(open_times, closes)
+    _, avg_gain, avg_loss = DataProcessor.calculate_rsi_batch(closes, period, return_averages=True)
+    warmed = IncrementalRSI(period)
+    warmed.warm_start(open_times, closes, avg_gain[0, -2], avg_loss[0, -2])
+    assert warmed.value == pytest.approx(synced.value)
+    # 之后的增量更新也保持一致
+    for rsi in (synced, warmed):
+        rsi.update(bars, closes[-1] * 1.02)
+    assert warmed.value == pytest.approx(synced.value)
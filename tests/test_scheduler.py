@@ -0,0 +1,95 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from scheduler import TickScheduler
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def test_ticks_arriving_while_running_are_coalesced(pool):
+    scheduler = TickScheduler(pool, interval=1.0, stats_interval=0)
+    started = threading.Event()
+    release = threading.Event()
+    finished = threading.Event()
+    calls = []
+
+    def evaluate(tick):
+        calls.append(tick)
+        if tick == 0:
+            started.set()
+            release.wait(5)
+        else:
+            finished.set()
+
+    assert scheduler.submit('ACHUSDT', evaluate, 0)
+    assert started.wait(5)
+    # 第一个任务执行期间到达的tick只保留最新一个
+    assert not scheduler.submit('ACHUSDT', evaluate, 1)
+    assert not scheduler.submit('ACHUSDT', evaluate, 2)
+    assert not scheduler.submit('ACHUSDT', evaluate, 3)
+    release.set()
+    assert finished.wait(5)
+    pool.shutdown(wait=True)
+
+    assert calls == [0, 3]
+    stats = scheduler.stats()
+    assert stats['coalesced'] == 3
+    assert stats['skipped'] == 2
+    assert stats['submitted'] == stats['completed'] == 2
+    assert stats['in_flight'] == stats['pending'] == 0
+
+
+def test_symbols_run_independently(pool):
+    scheduler = TickScheduler(pool, interval=1.0, stats_interval=0)
+    done = threading.Barrier(3, timeout=5)
+    for symbol in ('A', 'B'):
+        assert scheduler.submit(symbol, done.wait)
+    done.wait()
+
+
+def test_failed_submit_rolls_back_in_flight_slot():
+    pool = ThreadPoolExecutor(max_workers=1)
+    pool.shutdown()
+    scheduler = TickScheduler(pool, interval=1.0, stats_interval=0)
+    with pytest.raises(RuntimeError):
+        scheduler.submit('ACHUSDT', print)
+    stats = scheduler.stats()
+    assert stats['in_flight'] == 0 and stats['submitted'] == 0
+
+    # 线程池恢复后该交易对的tick不会被当作执行中而一直合并
+    scheduler.executor = ThreadPoolExecutor(max_workers=1)
+    ran = threading.Event()
+    assert scheduler.submit('ACHUSDT', ran.set)
+    assert ran.wait(5)
+    scheduler.executor.shutdown(wait=True)
+
+
+def test_failed_resubmit_of_coalesced_tick_rolls_back():
+    pool = ThreadPoolExecutor(max_workers=1)
+    scheduler = TickScheduler(pool, interval=1.0, stats_interval=0)
+    started = threading.Event()
+    release = threading.Event()
+
+    def evaluate(tick):
+        if tick == 0:
+            started.set()
+            release.wait(5)
+
+    assert scheduler.submit('ACHUSDT', evaluate, 0)
+    assert started.wait(5)
+    assert not scheduler.submit('ACHUSDT', evaluate, 1)
+    # 任务执行期间线程池关闭，合并的tick无法再提交
+    pool.shutdown(wait=False)
+    release.set()
+    pool.shutdown(wait=True)
+
+    stats = scheduler.stats()
+    assert stats['in_flight'] == stats['pending'] == 0
+    assert stats['submitted'] == stats['completed'] == 1
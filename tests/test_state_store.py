@@ -0,0 +1,54 @@
+from config import TradingConfig
+from state_store import StateStore, load_states, restore_states
+from trading_state import IDLE, OPEN, OPENING, TradingState
+
+
+def open_state(price, size):
+    state = TradingState(TradingConfig())
+    state.transition(IDLE, OPENING)
+    state.mark_open(price, price * 0.98, size)
+    return state
+
+
+def test_wal_replayed_on_top_of_checkpoint(tmp_path):
+    store = StateStore(str(tmp_path), checkpoint_every=2)
+    store.save('AUSDT', open_state(1.0, 10.0))
+    store.save('BUSDT', open_state(2.0, 20.0))  # 第二条触发检查点并清空WAL
+    assert store._wal_records == 0
+    store.save('AUSDT', TradingState(TradingConfig()))  # 检查点之后平仓，只在WAL中
+    # 不调用close，模拟进程崩溃
+
+    records = StateStore(str(tmp_path)).load()
+    assert not records['AUSDT']['in_position']
+    assert records['BUSDT']['in_position']
+    assert records['BUSDT']['position_size'] == 20.0
+
+
+def test_partial_wal_record_is_ignored(tmp_path):
+    store = StateStore(str(tmp_path), checkpoint_every=100)
+    store.save('AUSDT', open_state(1.0, 10.0))
+    with open(store.wal_path, 'ab') as f:
+        f.write(b'\x01\x02\x03')  # 崩溃时写了一半的记录
+    records = StateStore(str(tmp_path)).load()
+    assert records['AUSDT']['position_size'] == 10.0
+
+
+def test_restore_states_uses_latest_record(tmp_path):
+    store = StateStore(str(tmp_path), checkpoint_every=1)
+    store.save('AUSDT', open_state(1.0, 10.0))
+    store.save('AUSDT', open_state(1.5, 12.0))
+    store.close()
+
+    state_map = {'AUSDT': TradingState(TradingConfig()), 'BUSDT': TradingState(TradingConfig())}
+    restore_states(StateStore(str(tmp_path)), state_map, TradingConfig(SIMULATION_MODE=True))
+    assert state_map['AUSDT'].phase == OPEN
+    assert state_map['AUSDT'].last_short_price == 1.5
+    assert state_map['AUSDT'].position_size == 12.0
+    assert state_map['BUSDT'].phase == IDLE
+
+
+def test_shard_directories_are_merged(tmp_path):
+    StateStore(str(tmp_path / 'shard0')).save('AUSDT', open_state(1.0, 10.0))
+    StateStore(str(tmp_path / 'shard1')).save('BUSDT', open_state(2.0, 20.0))
+    merged = load_states(str(tmp_path))
+    assert set(merged) == {'AUSDT', 'BUSDT'}
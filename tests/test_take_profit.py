@@ -0,0 +1,37 @@
+from config import TradingConfig
+from take_profit import TakeProfitEngine, TakeProfitIndex
+from trading_executor import TradingExecutor
+from trading_state import IDLE, OPENING, TradingState
+
+
+def test_crossed_levels_fire_once():
+    index = TakeProfitIndex()
+    index.arm('AUSDT', 1.0)
+    index.arm('AUSDT', 0.9)
+    assert index.crossed([('AUSDT', 1.1), ('BUSDT', 0.1)]) == []
+    assert index.crossed([('AUSDT', 0.95)]) == [('AUSDT', 0.95, 1.0)]
+    assert index.levels('AUSDT') == [0.9]
+    assert index.crossed([('AUSDT', 0.95)]) == []
+
+
+def test_simulated_close_fills_at_trigger_price_without_touching_snapshot():
+    config = TradingConfig(SIMULATION_MODE=True, TAKE_PROFIT_STREAM='markPrice')
+    executor = TradingExecutor(None, config)
+    state = TradingState(config)
+    state.transition(IDLE, OPENING)
+    state.mark_open(2.0, 1.96, 50.0)
+    executor.snapshot.update_price('AUSDT', 1.99)  # 现货最新价
+    engine = TakeProfitEngine(executor, {'AUSDT': state}, config)
+    closed = []
+    close_order = executor.close_short_order
+
+    def record_close(symbol, quantity, state, price=None):
+        order = close_order(symbol, quantity, state, price)
+        closed.append(order['fills'][0]['price'])
+        return order
+
+    executor.close_short_order = record_close
+    engine._fire('AUSDT', 1.95, 1.96)
+    assert state.phase == IDLE
+    assert closed == [1.95]
+    assert executor.snapshot.last_price('AUSDT') == 1.99
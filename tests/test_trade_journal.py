@@ -0,0 +1,52 @@
+import builtins
+import threading
+import time
+
+from trade_journal import EVENT_CLOSE, EVENT_OPEN, EVENT_TICK, REASON_OVERBOUGHT, JournalReader, TradeJournal
+
+
+def test_records_are_written_by_the_journal_thread(tmp_path, monkeypatch):
+    writers = set()
+    real_open = builtins.open
+
+    def tracking_open(*args, **kwargs):
+        writers.add(threading.current_thread().name)
+        return real_open(*args, **kwargs)
+
+    journal = TradeJournal(str(tmp_path), flush_interval=60.0)
+    monkeypatch.setattr(builtins, 'open', tracking_open)
+    journal.tick('ACHUSDT', 1.0, 96.0, REASON_OVERBOUGHT, True, False)
+    journal.record('ACHUSDT', EVENT_OPEN, price=1.0, quantity=10.0, fill_price=1.0)
+    journal.record('ACHUSDT', EVENT_CLOSE, price=0.9, quantity=10.0, fill_price=0.9, pnl=1.0)
+    journal.flush()
+    monkeypatch.setattr(builtins, 'open', real_open)
+    journal.close()
+
+    assert writers == {'trade-journal'}
+    records = JournalReader(str(tmp_path)).load()
+    assert list(records['event']) == [EVENT_TICK, EVENT_OPEN, EVENT_CLOSE]
+    assert records['pnl'].sum() == 1.0
+
+
+def test_trade_events_are_written_without_explicit_flush(tmp_path):
+    journal = TradeJournal(str(tmp_path), flush_interval=60.0)
+    journal.tick('ACHUSDT', 1.0, 50.0, 0, True, False)
+    journal.record('ACHUSDT', EVENT_OPEN, price=1.0, quantity=10.0, fill_price=1.0)
+    deadline = time.monotonic() + 5
+    while journal.records < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert journal.records == 2
+    journal.close()
+
+
+def test_ticks_are_batched_until_the_flush_interval(tmp_path):
+    journal = TradeJournal(str(tmp_path), flush_interval=0.2)
+    for i in range(10):
+        journal.tick('ACHUSDT', 1.0 + i, 50.0, 0, True, False)
+    time.sleep(0.05)
+    assert journal.records == 0
+    deadline = time.monotonic() + 5
+    while journal.records < 10 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert journal.records == 10
+    journal.close()
@@ -0,0 +1,103 @@
+import threading
+
+import pytest
+
+from config import TradingConfig
+from trading_state import CLOSING, IDLE, OPEN, OPENING, TradingState
+
+
+def make_state():
+    return TradingState(TradingConfig())
+
+
+def test_full_cycle():
+    state = make_state()
+    assert state.transition(IDLE, OPENING)
+    assert state.in_position
+    assert state.mark_open(2.0, 1.96, 50.0)
+    assert (state.phase, state.last_short_price, state.take_profit_price, state.position_size) == (OPEN, 2.0, 1.96, 50.0)
+    assert state.begin_close() == 50.0
+    assert state.is_closing_position
+    assert state.mark_closed()
+    assert (state.phase, state.last_short_price, state.take_profit_price, state.position_size) == (IDLE, 0, 0, 0)
+
+
+def test_transitions_fail_from_unexpected_phase():
+    state = make_state()
+    assert not state.transition(OPENING, IDLE)
+    assert not state.mark_open(2.0, 1.96, 50.0)
+    assert state.begin_close() is None
+    assert not state.mark_closed()
+    assert state.phase == IDLE
+
+    assert state.transition(IDLE, OPENING)
+    assert not state.transition(IDLE, OPENING)
+    assert state.begin_close() is None
+    # 下单失败回到idle
+    assert state.transition(OPENING, IDLE)
+
+
+def test_close_failure_returns_to_open():
+    state = make_state()
+    state.transition(IDLE, OPENING)
+    state.mark_open(2.0, 1.96, 50.0)
+    assert state.begin_close() == 50.0
+    assert state.begin_close() is None
+    assert state.transition(CLOSING, OPEN)
+    assert state.position_size == 50.0
+
+
+def test_only_one_thread_enters_opening():
+    state = make_state()
+    barrier = threading.Barrier(16)
+    winners = []
+
+    def race():
+        barrier.wait()
+        if state.transition(IDLE, OPENING):
+            winners.append(threading.current_thread().name)
+
+    threads = [threading.Thread(target=race) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(winners) == 1
+    assert state.phase == OPENING
+
+
+def test_only_one_thread_begins_close():
+    state = make_state()
+    state.transition(IDLE, OPENING)
+    state.mark_open(2.0, 1.96, 50.0)
+    barrier = threading.Barrier(16)
+    quantities = []
+
+    def race():
+        barrier.wait()
+        quantities.append(state.begin_close())
+
+    threads = [threading.Thread(target=race) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert quantities.count(50.0) == 1
+    assert quantities.count(None) == 15
+
+
+def test_signal_uses_triggers_of_the_forming_candle():
+    state = make_state()
+    for i, close in enumerate([10.0, 10.2, 10.1, 10.4, 10.3, 10.6, 10.5, 10.8]):
+        state.rsi.update(i, close)
+    key, entry, exit_ = state.refresh_triggers()
+    assert key == (7, 7)
+    assert state.rsi.value_at(entry) == pytest.approx(state.overbought)
+    assert state.rsi.value_at(exit_) == pytest.approx(state.oversold)
+    assert state.signal(entry + 1e-6)
+    assert not state.signal(entry - 1e-3)
+
+    # 新K线开盘后触发价格重新计算
+    state.rsi.update(8, 10.7)
+    assert state.refresh_triggers()[0] == (8, 8)
+    assert state.entry_trigger != entry
@@ -0,0 +1,273 @@
+import argparse
+import atexit
+import calendar
+import logging
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger('trading_system')
+
+# 事件类型
+EVENT_TICK = 0  # 一次交易条件评估
+EVENT_OPEN = 1  # 开空成交
+EVENT_CLOSE = 2  # 平空成交
+EVENT_FAILED = 3  # 下单失败
+EVENT_NAMES = {EVENT_TICK: 'tick', EVENT_OPEN: 'open', EVENT_CLOSE: 'close', EVENT_FAILED: 'failed'}
+
+# 评估结论
+REASON_NONE = 0
+REASON_OVERBOUGHT = 1  # RSI达到超买，开空
+REASON_OVERSOLD = 2  # RSI达到超卖，平仓
+REASON_TAKE_PROFIT = 3  # 价格触及止盈，平仓
+REASON_NAMES = {REASON_NONE: '', REASON_OVERBOUGHT: 'overbought', REASON_OVERSOLD: 'oversold',
+                REASON_TAKE_PROFIT: 'take_profit'}
+
+# 磁盘上每条记录的定长格式(72字节)
+JOURNAL_DTYPE = np.dtype([
+    ('timestamp', '<i8'),  # 毫秒时间戳(UTC)
+    ('price', '<f8'),  # 评估时的最新价格
+    ('rsi', '<f8'),
+    ('quantity', '<f8'),  # 成交数量，tick记录为0
+    ('fill_price', '<f8'),  # 成交价格，tick记录为0
+    ('pnl', '<f8'),  # 平仓实现盈亏(USDT)，其他记录为0
+    ('symbol', 'S20'),
+    ('event', 'u1'),
+    ('reason', 'u1'),
+    ('simulated', 'u1'),
+    ('in_position', 'u1'),  # 评估前是否持仓
+])
+
+DAY_MS = 86_400_000
+
+# 写入线程队列中的控制项
+_CLOSE = object()
+_TIMEOUT = object()
+
+
+def _day_name(day):
+    return time.strftime('%Y%m%d', time.gmtime(day * 86400))
+
+
+def _parse_day(text):
+    """'YYYY-MM-DD'或'YYYYMMDD'转为自1970-01-01起的天数"""
+    return calendar.timegm(time.strptime(text.replace('-', ''), '%Y%m%d')) // 86400
+
+
+class TradeJournal:
+    """只追加的二进制交易/tick日志，按UTC日期分文件保存定长记录(JOURNAL_DTYPE)
+
+    调用线程只把记录放入队列，后台写入线程把记录放进预分配的内存缓冲区，
+    缓冲区写满或超过flush_interval秒后批量写盘，成交与下单失败记录收到后立即写盘，
+    磁盘I/O不会阻塞下单路径。读取时可直接用np.memmap映射。
+    """
+
+    def __init__(self, root_dir, flush_interval=1.0, buffer_size=4096):
+        self.root_dir = root_dir
+        self.flush_interval = flush_interval
+        self._buffer = np.zeros(buffer_size, dtype=JOURNAL_DTYPE)
+        self._count = 0
+        self._queue = queue.SimpleQueue()
+        self.records = 0  # 累计写入的记录数
+        os.makedirs(root_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._write_loop, name='trade-journal', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def path(self, day):
+        return os.path.join(self.root_dir, f"{_day_name(day)}.bin")
+
+    def record(self, symbol, event, price=0.0, rsi=0.0, reason=REASON_NONE, quantity=0.0, fill_price=0.0,
+               pnl=0.0, simulated=True, in_position=False, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        self._queue.put((timestamp, price or 0.0, rsi or 0.0, quantity or 0.0, fill_price or 0.0, pnl or 0.0,
+                         symbol.encode('ascii'), event, reason, simulated, in_position))
+
+    def tick(self, symbol, price, rsi, reason, simulated, in_position):
+        self.record(symbol, EVENT_TICK, price, rsi, reason, simulated=simulated, in_position=in_position)
+
+    def flush(self, timeout=5.0):
+        """等待写入线程把已提交的记录全部写盘"""
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join(timeout=5.0)
+
+    def _write_loop(self):
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.0))
+            except queue.Empty:
+                item = _TIMEOUT
+            if isinstance(item, tuple):
+                self._buffer[self._count] = item
+                self._count += 1
+                # tick记录攒批，成交记录、缓冲区满或到期时写盘
+                if item[7] == EVENT_TICK and self._count < len(self._buffer) and time.monotonic() < deadline:
+                    continue
+            self._flush()
+            deadline = time.monotonic() + self.flush_interval
+            if item is _CLOSE:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _flush(self):
+        if not self._count:
+            return
+        rows = self._buffer[:self._count]
+        days = rows['timestamp'] // DAY_MS
+        try:
+            # 通常只有一天；跨零点时按日期拆分
+            for day in np.unique(days):
+                with open(self.path(int(day)), 'ab') as f:
+                    f.write(rows[days == day].tobytes())
+        except OSError as e:
+            logger.error(f"写入交易日志失败: {e}")
+            if self._count < len(self._buffer):
+                return
+            # 缓冲区已满且无法写盘时丢弃，避免写入线程停止
+            logger.error(f"丢弃{self._count}条未写入的交易日志记录")
+        else:
+            self.records += self._count
+        self._count = 0
+
+
+class JournalReader:
+    """按日期范围映射日志文件并用NumPy做聚合
+
+    分片运行时每个分片写入root_dir下的shard*子目录，读取时与根目录合并。
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def directories(self):
+        if not os.path.isdir(self.root_dir):
+            return []
+        shards = sorted(n for n in os.listdir(self.root_dir)
+                        if n.startswith('shard') and os.path.isdir(os.path.join(self.root_dir, n)))
+        return [self.root_dir] + [os.path.join(self.root_dir, n) for n in shards]
+
+    def days(self):
+        """已有日志的日期(自1970-01-01起的天数)，按时间升序"""
+        names = set()
+        for directory in self.directories():
+            names.update(n for n in os.listdir(directory) if n.endswith('.bin'))
+        return [_parse_day(n[:-4]) for n in sorted(names)]
+
+    def _load_file(self, path):
+        count = os.path.getsize(path) // JOURNAL_DTYPE.itemsize if os.path.exists(path) else 0
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=JOURNAL_DTYPE, mode='r', shape=(count,))
+
+    def load_day(self, day):
+        """单目录时为只读memmap，多个分片时合并为一个数组"""
+        parts = [self._load_file(os.path.join(directory, f"{_day_name(day)}.bin"))
+                 for directory in self.directories()]
+        parts = [part for part in parts if part is not None]
+        if not parts:
+            return np.empty(0, dtype=JOURNAL_DTYPE)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def iter_records(self, since=None, until=None, symbols=None):
+        """逐日返回记录（只读memmap或其过滤结果），since/until为天数（含）"""
+        wanted = np.array([s.encode('ascii') for s in symbols], dtype='S20') if symbols else None
+        for day in self.days():
+            if (since is not None and day < since) or (until is not None and day > until):
+                continue
+            records = self.load_day(day)
+            if wanted is not None:
+                records = records[np.isin(records['symbol'], wanted)]
+            yield day, records
+
+    def load(self, since=None, until=None, symbols=None):
+        """合并为一个数组（会复制数据，适合已按日期/交易对缩小范围的情况）"""
+        parts = [records for _, records in self.iter_records(since, until, symbols)]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=JOURNAL_DTYPE)
+
+    def pnl_by_symbol_day(self, since=None, until=None, symbols=None):
+        """每个交易对每天的平仓次数、盈利次数与实现盈亏，返回按(日期, 交易对)排序的结构化数组"""
+        out = []
+        for day, records in self.iter_records(since, until, symbols):
+            closes = records[records['event'] == EVENT_CLOSE]
+            if not len(closes):
+                continue
+            names, inverse = np.unique(closes['symbol'], return_inverse=True)
+            pnl = closes['pnl']
+            trades = np.bincount(inverse, minlength=len(names))
+            wins = np.bincount(inverse, weights=pnl > 0, minlength=len(names))
+            total = np.bincount(inverse, weights=pnl, minlength=len(names))
+            for i, name in enumerate(names):
+                out.append((day, name, trades[i], int(wins[i]), total[i]))
+        return np.array(out, dtype=[('day', '<i4'), ('symbol', 'S20'), ('trades', '<i8'), ('wins', '<i8'),
+                                    ('pnl', '<f8')])
+
+    def summary(self, since=None, until=None, symbols=None):
+        """每个交易对的评估次数、各类事件次数和累计实现盈亏，返回{symbol: dict}"""
+        totals = {}
+        for _, records in self.iter_records(since, until, symbols):
+            if not len(records):
+                continue
+            names, inverse = np.unique(records['symbol'], return_inverse=True)
+            events = np.bincount(inverse * 4 + records['event'], minlength=len(names) * 4).reshape(-1, 4)
+            pnl = np.bincount(inverse, weights=records['pnl'], minlength=len(names))
+            for i, name in enumerate(names):
+                entry = totals.setdefault(name.decode(), {'ticks': 0, 'opens': 0, 'closes': 0, 'failed': 0,
+                                                          'pnl': 0.0})
+                entry['ticks'] += int(events[i, EVENT_TICK])
+                entry['opens'] += int(events[i, EVENT_OPEN])
+                entry['closes'] += int(events[i, EVENT_CLOSE])
+                entry['failed'] += int(events[i, EVENT_FAILED])
+                entry['pnl'] += float(pnl[i])
+        return totals
+
+
+if __name__ == '__main__':
+    from config import TradingConfig
+
+    parser = argparse.ArgumentParser(description='交易/tick二进制日志查询')
+    parser.add_argument('report', nargs='?', default='pnl', choices=['pnl', 'summary', 'dump'])
+    parser.add_argument('--dir', default=None, help='日志目录，默认使用配置中的JOURNAL_DIR')
+    parser.add_argument('--since', default=None, help='起始日期YYYY-MM-DD（UTC，含）')
+    parser.add_argument('--until', default=None, help='结束日期YYYY-MM-DD（UTC，含）')
+    parser.add_argument('--symbol', action='append', default=None, help='只统计指定交易对，可重复')
+    parser.add_argument('--limit', type=int, default=50, help='dump时输出的最后若干条记录')
+    args = parser.parse_args()
+
+    reader = JournalReader(args.dir or TradingConfig().JOURNAL_DIR)
+    since = _parse_day(args.since) if args.since else None
+    until = _parse_day(args.until) if args.until else None
+    started = time.perf_counter()
+    if args.report == 'pnl':
+        rows = reader.pnl_by_symbol_day(since, until, args.symbol)
+        for row in rows:
+            win_rate = row['wins'] / row['trades'] * 100 if row['trades'] else 0.0
+            print(f"{_day_name(int(row['day']))} {row['symbol'].decode():<20} 平仓={row['trades']:<5} "
+                  f"胜率={win_rate:5.1f}% 盈亏={row['pnl']:.4f}")
+        print(f"合计盈亏={rows['pnl'].sum():.4f} USDT, 耗时{time.perf_counter() - started:.3f}秒")
+    elif args.report == 'summary':
+        for symbol, s in sorted(reader.summary(since, until, args.symbol).items()):
+            print(f"{symbol:<20} 评估={s['ticks']:<8} 开仓={s['opens']:<5} 平仓={s['closes']:<5} "
+                  f"失败={s['failed']:<4} 盈亏={s['pnl']:.4f}")
+        print(f"耗时{time.perf_counter() - started:.3f}秒")
+    else:
+        records = reader.load(since, until, args.symbol)[-args.limit:]
+        for r in records:
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(r['timestamp'] / 1000))} "
+                  f"{r['symbol'].decode():<12} {EVENT_NAMES[int(r['event'])]:<6} "
+                  f"{REASON_NAMES[int(r['reason'])]:<11} 价格={r['price']:.8g} RSI={r['rsi']:.2f} "
+                  f"数量={r['quantity']:.8g} 成交价={r['fill_price']:.8g} 盈亏={r['pnl']:.4f}"
+                  f"{' [模拟]' if r['simulated'] else ''}")
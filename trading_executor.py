@@ -1,14 +1,38 @@
 from config import TradingConfig
 import logging
+import asyncio
 import time
-from binance.exceptions import BinanceAPIException, BinanceOrderException
+from binance.exceptions import BinanceAPIException
+from market_snapshot import MarketSnapshot
+from latency import recorder
+from log_pipeline import TRADE_REAL, TRADE_SIMULATION, trade_extra
+from trade_journal import (EVENT_CLOSE, EVENT_FAILED, EVENT_OPEN, REASON_NONE, REASON_OVERBOUGHT,
+                           REASON_OVERSOLD, REASON_TAKE_PROFIT)
+from trading_state import CLOSING, IDLE, OPEN, OPENING
 
 logger = logging.getLogger('trading_system')
 
 class TradingExecutor:
-    def __init__(self, client, config):
+    def __init__(self, client, config, snapshot=None, journal=None):
         self.client = client
         self.config = config
+        # 价格和余额快照，只有真正下单的路径才访问交易所；回测时注入历史价格源
+        self.snapshot = snapshot or MarketSnapshot(client, config.PRICE_TTL, config.BALANCE_TTL)
+        self.journal = journal  # 二进制交易/tick日志(TradeJournal)，为None则不记录
+        self.allocator = None  # 分片运行时由协调器统一分配开仓额度(sharding.RemoteAllocator)
+        self.state_store = None  # 持仓状态持久化(StateStore)，为None则不保存
+        self.take_profit = None  # 推送价格驱动的止盈触发器(take_profit.TakeProfitEngine)，为None则只在轮询时判断
+
+    @staticmethod
+    def simulated_order(symbol, side, quantity, price):
+        """构造与交易所市价单返回格式一致的模拟订单"""
+        return {
+            'symbol': symbol,
+            'side': side,
+            'type': 'MARKET',
+            'quantity': quantity,
+            'fills': [{'price': price, 'qty': quantity}]
+        }
 
     def set_leverage(self, symbol, leverage=None):
         """设置合约杠杆"""
@@ -18,212 +42,474 @@ class TradingExecutor:
                 symbol=symbol,
                 leverage=leverage
             )
-            logger.info(f"[{symbol}] 设置杠杆成功: {response}")
+            logger.info("[%s] 设置杠杆成功: %s", symbol, response)
             return response
         except Exception as e:
-            logger.error(f"[{symbol}] 设置杠杆失败: {e}")
+            logger.error("[%s] 设置杠杆失败: %s", symbol, e)
             return None
 
     def place_short_order(self, symbol, quantity, state):
-        """下空单（支持模拟模式）"""
+        """下空单（支持模拟模式），调用前state应处于opening，成交后切换为open"""
         if self.config.SIMULATION_MODE:
 
             # 模拟做空订单
             close_price = self.get_latest_price(symbol)
             if close_price is None:
-                logger.error(f"[{symbol}] 模拟下单失败: 无法获取最新价格")
+                logger.error("[%s] 模拟下单失败: 无法获取最新价格", symbol)
                 return None
 
             # 模拟订单信息
-            simulated_order = {
-                'symbol': symbol,
-                'side': 'SELL',
-                'type': 'MARKET',
-                'quantity': quantity,
-                'fills': [{'price': close_price, 'qty': quantity}]
-            }
-
+            simulated_order = self.simulated_order(symbol, 'SELL', quantity, close_price)
 
-            state.last_short_price = close_price
             # 设置止盈价格（做空时止盈价格低于开仓价格）
             # 做空盈利目标价格 = 开仓价 × (1 - 目标盈利百分比)，与用户提供的计算公式一致
-            state.take_profit_price = close_price * (1 - self.config.TAKE_PROFIT_PERCENT / 100)
+            take_profit_price = close_price * (1 - self.config.TAKE_PROFIT_PERCENT / 100)
+            state.mark_open(close_price, take_profit_price, quantity)
             profit_percent = self.config.TAKE_PROFIT_PERCENT
 
-            logger.info(f"[{symbol}] [模拟] 做空订单已执行: 数量={quantity}, 开仓价格={close_price}, 止盈价格={state.take_profit_price}, 目标获利={profit_percent}%")
-            logger.info(f"[{symbol}] [模拟] 订单详情: {simulated_order}")
+            logger.info("[%s] [模拟] 做空订单已执行: 数量=%s, 开仓价格=%s, 止盈价格=%s, 目标获利=%s%%",
+                        symbol, quantity, close_price, take_profit_price, profit_percent, extra=TRADE_SIMULATION)
+            logger.info("[%s] [模拟] 订单详情: %s", symbol, simulated_order, extra=TRADE_SIMULATION)
+            self._journal_order(EVENT_OPEN, symbol, quantity, close_price)
             return simulated_order
 
         # 真实交易逻辑
         try:
-
+            start = recorder.now()
             order = self.client.futures_create_order(
                 symbol=symbol,
                 side=self.client.SIDE_SELL,
                 type=self.client.ORDER_TYPE_MARKET,
-                quantity=quantity
+                quantity=quantity,
+                newOrderRespType='RESULT'  # 合约默认ACK回报的avgPrice为0，RESULT回报带成交均价
             )
-            logger.info(f"[{symbol}] 做空订单已执行: 数量={quantity}, 开仓价格={state.last_short_price}, 止盈价格={state.take_profit_price}, 目标获利={self.config.TAKE_PROFIT_PERCENT}%")
-            logger.info(f"[{symbol}] 订单详情: {order}")
-            with state.lock:
-                state.in_position = True
-                state.last_short_price = float(order['fills'][0]['price'])
-                # 设置止盈价格（做空时止盈价格低于开仓价格）
-                # 做空盈利目标价格 = 开仓价 × (1 - 目标盈利百分比)，与用户提供的计算公式一致
-                state.take_profit_price = state.last_short_price * (1 - self.config.TAKE_PROFIT_PERCENT / 100)
-            logger.info(f"[{symbol}] 设置止盈价格: {state.take_profit_price}")
-            return order
+            recorder.record('order_ack', start)
+            recorder.record_since_tick('tick_to_order_ack')
         except Exception as e:
-            logger.error(f"[{symbol}] 做空订单执行失败: {e}")
+            logger.error("[%s] 做空订单执行失败: %s", symbol, e, extra=TRADE_REAL)
+            self._journal_order(EVENT_FAILED, symbol, quantity)
             return None
+        # 成交后余额变化，下次重新获取
+        self.snapshot.invalidate_balance()
+        entry_price = self._fill_price(symbol, order)
+        # 做空盈利目标价格 = 开仓价 × (1 - 目标盈利百分比)，与用户提供的计算公式一致
+        take_profit_price = entry_price * (1 - self.config.TAKE_PROFIT_PERCENT / 100)
+        state.mark_open(entry_price, take_profit_price, quantity)
+        logger.info("[%s] 做空订单已执行: 数量=%s, 开仓价格=%s, 止盈价格=%s, 目标获利=%s%%", symbol, quantity,
+                    entry_price, take_profit_price, self.config.TAKE_PROFIT_PERCENT, extra=TRADE_REAL)
+        logger.info("[%s] 订单详情: %s", symbol, order, extra=TRADE_REAL)
+        self._journal_order(EVENT_OPEN, symbol, quantity, entry_price)
+        return order
 
+    def close_short_order(self, symbol, quantity, state, price=None):
+        """平空单（支持模拟平仓），调用前state应处于closing，成交后回到idle，失败时回到open
 
-    def close_short_order(self, symbol, quantity, state):
-        """平空单（支持模拟平仓）"""
+        price为模拟成交价格（如止盈触发时的推送价格），为None时使用最新价格。
+        """
+        entry_price = state.last_short_price
         if self.config.SIMULATION_MODE:
             # 模拟平空订单（买入）
-            with state.lock:
-                state.is_closing_position = True
-            close_price = self.get_latest_price(symbol)
+            close_price = price if price is not None else self.get_latest_price(symbol)
             if close_price is None:
-                with state.lock:
-                    state.is_closing_position = False
-                logger.error(f"[{symbol}] 模拟平仓失败: 无法获取最新价格")
+                state.transition(CLOSING, OPEN)
+                logger.error("[%s] 模拟平仓失败: 无法获取最新价格", symbol)
+                return None
+            # 模拟订单信息
+            order = self.simulated_order(symbol, 'BUY', quantity, close_price)
+            tag = '[模拟] '
+        else:
+            # 真实交易平空单（买入）
+            try:
+                start = recorder.now()
+                order = self.client.futures_create_order(
+                    symbol=symbol,
+                    side=self.client.SIDE_BUY,
+                    type=self.client.ORDER_TYPE_MARKET,
+                    quantity=quantity,
+                    newOrderRespType='RESULT'
+                )
+                recorder.record('order_ack', start)
+                recorder.record_since_tick('tick_to_order_ack')
+            except Exception as e:
+                state.transition(CLOSING, OPEN)
+                logger.error("[%s] 平空订单执行失败: %s", symbol, e, extra=TRADE_REAL)
+                self._journal_order(EVENT_FAILED, symbol, quantity)
                 return None
+            self.snapshot.invalidate_balance()
+            close_price = self._fill_price(symbol, order, entry_price)
+            tag = ''
 
-            # 计算利润（做空时利润 = (开仓价 - 平仓价) * 数量）
-            profit = (state.last_short_price - close_price) * quantity
-            profit_percent = ((state.last_short_price - close_price) / state.last_short_price) * 100
+        state.mark_closed()
+        # 计算利润（做空时利润 = (开仓价 - 平仓价) * 数量）
+        profit = (entry_price - close_price) * quantity
+        profit_percent = ((entry_price - close_price) / entry_price) * 100 if entry_price else 0.0
+        extra = trade_extra(self.config.SIMULATION_MODE)
+        logger.info("[%s] %s平仓订单已执行: 数量=%s, 平仓价格=%s, 开仓价格=%s, 获利金额=%.2f USDT, 获利百分比=%.2f%%",
+                    symbol, tag, quantity, close_price, entry_price, profit, profit_percent, extra=extra)
+        logger.info("[%s] %s订单详情: %s", symbol, tag, order, extra=extra)
+        self._journal_order(EVENT_CLOSE, symbol, quantity, close_price, profit)
+        self._release_allocation(symbol, profit)
+        return order
 
-            # 模拟订单信息
-            simulated_order = {
-                'symbol': symbol,
-                'side': 'BUY',
-                'type': 'MARKET',
-                'quantity': quantity,
-                'fills': [{'price': close_price, 'qty': quantity}]
-            }
-
-            with state.lock:
-                    state.in_position = False
-                    state.is_closing_position = False
-            logger.info(f"[{symbol}] 持仓状态更新为: {state.in_position}")
-            state.last_short_price = 0
-            state.take_profit_price = 0
-            logger.info(f"[{symbol}] [模拟] 平仓订单已执行: 数量={quantity}, 平仓价格={close_price}, 开仓价格={state.last_short_price}, 获利金额={profit:.2f} USDT, 获利百分比={profit_percent:.2f}%")
-            logger.info(f"[{symbol}] [模拟] 订单详情: {simulated_order}")
-            return simulated_order
-        with state.lock:
-                if state.in_position:
-                    # 真实交易平空单（买入）
-                    try:
-                        with state.lock:
-                            state.is_closing_position = True
-
-                        order = self.client.futures_create_order(
-                            symbol=symbol,
-                            side=self.client.SIDE_BUY,
-                            type=self.client.ORDER_TYPE_MARKET,
-                            quantity=quantity
-                        )
-
-                        with state.lock:
-                            state.in_position = False
-                            state.last_short_price = 0
-                            state.take_profit_price = 0
-                            state.is_closing_position = False
-
-                        logger.info(f"[{symbol}] 平空订单已执行: 数量={quantity}, 平仓价格={float(order['fills'][0]['price'])}, 开仓价格={state.last_short_price}")
-                        logger.info(f"[{symbol}] 订单详情: {order}")
-                        return order
-                    except Exception as e:
-                        with state.lock:
-                            state.is_closing_position = False
-                        logger.error(f"[{symbol}] 平空订单执行失败: {e}")
-                        return None
+    def open_short_position(self, symbol, close_price, state):
+        """idle → opening → open；同一交易对只有一个tick能进入opening，其余直接返回"""
+        if close_price <= 0:
+            logger.error("[%s] 无效价格: %s", symbol, close_price)
+            return None
+        if not state.transition(IDLE, OPENING):
+            logger.debug("[%s] 当前持仓阶段为%s，跳过开仓", symbol, state.phase)
+            return None
+        logger.info("[%s] RSI大于等于超买阈值(%s), 执行做空操作", symbol, self.config.OVERBOUGHT,
+                    extra=trade_extra(self.config.SIMULATION_MODE))
+
+        # 以下网络请求都在锁外进行
+        usdt_balance = None if self.allocator is not None else self.get_available_balance("USDT")
+        sell_quantity = self._entry_notional(symbol, usdt_balance) / close_price
+        if sell_quantity <= 0:
+            state.transition(OPENING, IDLE)
+            if self.allocator is not None:
+                logger.info("[%s] 协调器未分配开仓额度，跳过开空", symbol)
+            return None
+        order_result = self.place_short_order(symbol, sell_quantity, state)
+        if order_result is None:
+            state.transition(OPENING, IDLE)  # 订单失败，重置状态
+            self._release_allocation(symbol)
+            logger.error("[%s] 下单失败，重置持仓状态", symbol)
+            return None
+        self._persist_state(symbol, state)
+        self._update_trigger(symbol, state)
+        return order_result
+
+    def close_short_position(self, symbol, state, price=None):
+        """open → closing → idle；已有平仓在进行时直接返回，price见close_short_order"""
+        quantity = state.begin_close()
+        if quantity is None:
+            return None
+        order = self.close_short_order(symbol, quantity, state, price)
+        self._persist_state(symbol, state)
+        # 平仓失败回到open时重新登记止盈价
+        self._update_trigger(symbol, state)
+        return order
+
+    def _fill_price(self, symbol, order, fallback=0.0):
+        """市价单成交均价：U本位合约回报为avgPrice，兼容现货格式的fills
+
+        订单已成交，解析失败时不能抛出异常，否则持仓状态停留在opening/closing；
+        改用最近的价格快照（没有时用fallback）完成状态切换并记录错误。
+        """
+        try:
+            price = float(order.get('avgPrice') or 0)
+            if price <= 0:
+                price = float(order['fills'][0]['price'])
+            if price > 0:
+                return price
+        except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+            pass
+        price = self.snapshot.last_price(symbol) or fallback
+        logger.error("[%s] 无法从订单回报解析成交价格，按最近价格%s记录: %s", symbol, price, order)
+        return price
+
+    def _journal_order(self, event, symbol, quantity, fill_price=0.0, pnl=0.0):
+        if self.journal is not None:
+            self.journal.record(symbol, event, price=fill_price, quantity=quantity, fill_price=fill_price, pnl=pnl,
+                                simulated=self.config.SIMULATION_MODE)
+
+    def _entry_notional(self, symbol, usdt_balance):
+        """本次开仓的名义金额(USDT)：分片运行时向协调器申请，否则为可用余额的四分之一"""
+        if self.allocator is not None:
+            return self.allocator.reserve(symbol)
+        return usdt_balance * 0.25  # 四分之一USDT仓位
 
+    def _release_allocation(self, symbol, pnl=0.0):
+        if self.allocator is not None:
+            self.allocator.release(symbol, pnl)
+
+    def _persist_state(self, symbol, state):
+        """开仓或平仓后写入持仓状态，重启时据此恢复"""
+        if self.state_store is not None:
+            self.state_store.save(symbol, state)
+
+    def _update_trigger(self, symbol, state):
+        if self.take_profit is not None:
+            self.take_profit.update(symbol, state)
+
+    def _journal_tick(self, symbol, close_price, rsi_value, state):
+        """记录一次评估及其信号（与下单条件一致），成交结果由下单方法另行记录"""
+        if self.journal is None:
+            return
+        phase = state.phase
+        if phase == IDLE and rsi_value >= self.config.OVERBOUGHT and self._confirmed(symbol, state):
+            reason = REASON_OVERBOUGHT
+        elif phase == OPEN and rsi_value <= self.config.OVERSOLD:
+            reason = REASON_OVERSOLD
+        elif phase == OPEN and close_price <= state.take_profit_price:
+            reason = REASON_TAKE_PROFIT
+        else:
+            reason = REASON_NONE
+        self.journal.tick(symbol, close_price, rsi_value, reason, self.config.SIMULATION_MODE, phase != IDLE)
 
     def get_available_balance(self, asset):
         """获取合约账户可用余额（支持模拟模式）"""
         if self.config.SIMULATION_MODE and asset == 'USDT':
-            logger.info(f"[模拟] 获取{asset}可用余额: {self.config.SIMULATED_BALANCE:.4f}")
+            logger.info("[模拟] 获取%s可用余额: %.4f", asset, self.config.SIMULATED_BALANCE, extra=TRADE_SIMULATION)
+            return self.config.SIMULATED_BALANCE
+        # 所有交易对共享的账户余额快照，过期或成交后才重新获取
+        start = recorder.now()
+        available_balance = self.snapshot.get_balance(asset)
+        recorder.record('balance', start)
+        logger.debug("获取%s合约可用余额: %.4f", asset, available_balance)
+        return available_balance
+
+    def get_latest_price(self, symbol):
+        """获取最新价格：优先使用K线收盘价快照，过期时批量刷新ticker"""
+        start = recorder.now()
+        price = self.snapshot.get_price(symbol)
+        recorder.record('price', start)
+        if price is None:
+            logger.error("获取%s最新价格失败", symbol)
+        return price
+
+    def _close_reason(self, symbol, close_price, rsi_value, state):
+        """RSI小于等于超卖阈值或达到止盈价格时返回True并记录原因"""
+        if rsi_value <= self.config.OVERSOLD:
+            logger.info("[%s] RSI小于等于超卖阈值(%s), 执行平仓操作", symbol, self.config.OVERSOLD,
+                        extra=trade_extra(self.config.SIMULATION_MODE))
+            return True
+        if close_price <= state.take_profit_price:
+            logger.info("[%s] 价格达到止盈点(%s), 准备平仓...", symbol, state.take_profit_price,
+                        extra=trade_extra(self.config.SIMULATION_MODE))
+            return True
+        return False
+
+    def _confirmed(self, symbol, state):
+        """多周期确认：CONFIRM_INTERVALS中每个本地聚合周期的RSI都达到超买阈值"""
+        if state.timeframes is None:
+            return True
+        for interval in self.config.CONFIRM_INTERVALS:
+            value = state.timeframes.rsi(interval)
+            if value is None or value < self.config.OVERBOUGHT:
+                logger.debug("[%s] %s周期RSI未确认超买: %s", symbol, interval, value)
+                return False
+        return True
+
+    def record_tick(self, symbol, close_price, rsi_value, state):
+        """输出并记录一次行情评估（不下单），每次实时推送都调用"""
+        logger.info("[%s] 最新价格: %s, RSI: %s", symbol, close_price, rsi_value)
+        self._journal_tick(symbol, close_price, rsi_value, state)
+
+    def check_trading_conditions(self, symbol, rsi_value, state, record=True):
+        """record为False表示调用方已经用record_tick记录过这次评估"""
+        # 获取最新价格
+        close_price = self.get_latest_price(symbol)
+        if close_price is None:
+            return
+        if record:
+            self.record_tick(symbol, close_price, rsi_value, state)
+        # 统一交易条件判断（模拟与真实交易共用同一套逻辑）
+        # 这里只读取持仓阶段，真正的状态切换由open/close_short_position通过比较并交换完成
+        phase = state.phase
+        if phase == IDLE and rsi_value >= self.config.OVERBOUGHT and self._confirmed(symbol, state):
+            self.open_short_position(symbol, close_price, state)
+        elif phase == OPEN and self._close_reason(symbol, close_price, rsi_value, state):
+            self.close_short_position(symbol, state)
+
+
+class AsyncTradingExecutor(TradingExecutor):
+    """基于asyncio的交易执行器，client为binance.AsyncClient
+
+    交易逻辑和持仓状态机与TradingExecutor一致，state.lock只在不含await的内存状态切换时持有。
+    """
+
+    def __init__(self, client, config, journal=None):
+        super().__init__(client, config, journal=journal)
+        self._balance_lock = asyncio.Lock()
+
+    async def set_leverage(self, symbol, leverage=None):
+        """设置合约杠杆"""
+        leverage = leverage or self.config.LEVERAGE
+        try:
+            response = await self.client.futures_change_leverage(
+                symbol=symbol,
+                leverage=leverage
+            )
+            logger.info("[%s] 设置杠杆成功: %s", symbol, response)
+            return response
+        except Exception as e:
+            logger.error("[%s] 设置杠杆失败: %s", symbol, e)
+            return None
+
+    async def place_short_order(self, symbol, quantity, state):
+        """下空单（支持模拟模式），调用前state应处于opening，成交后切换为open"""
+        if self.config.SIMULATION_MODE:
+            entry_price = await self.get_latest_price(symbol)
+            if entry_price is None:
+                logger.error("[%s] 模拟下单失败: 无法获取最新价格", symbol)
+                return None
+            order = self.simulated_order(symbol, 'SELL', quantity, entry_price)
+            tag = '[模拟] '
+        else:
+            # 真实交易逻辑
+            try:
+                start = recorder.now()
+                order = await self.client.futures_create_order(
+                    symbol=symbol,
+                    side=self.client.SIDE_SELL,
+                    type=self.client.ORDER_TYPE_MARKET,
+                    quantity=quantity,
+                    newOrderRespType='RESULT'
+                )
+                recorder.record('order_ack', start)
+            except Exception as e:
+                logger.error("[%s] 做空订单执行失败: %s", symbol, e, extra=TRADE_REAL)
+                self._journal_order(EVENT_FAILED, symbol, quantity)
+                return None
+            self.snapshot.invalidate_balance()
+            entry_price = self._fill_price(symbol, order)
+            tag = ''
+
+        # 做空盈利目标价格 = 开仓价 × (1 - 目标盈利百分比)
+        take_profit_price = entry_price * (1 - self.config.TAKE_PROFIT_PERCENT / 100)
+        state.mark_open(entry_price, take_profit_price, quantity)
+        extra = trade_extra(self.config.SIMULATION_MODE)
+        logger.info("[%s] %s做空订单已执行: 数量=%s, 开仓价格=%s, 止盈价格=%s, 目标获利=%s%%", symbol, tag, quantity,
+                    entry_price, take_profit_price, self.config.TAKE_PROFIT_PERCENT, extra=extra)
+        logger.info("[%s] %s订单详情: %s", symbol, tag, order, extra=extra)
+        self._journal_order(EVENT_OPEN, symbol, quantity, entry_price)
+        return order
+
+    async def close_short_order(self, symbol, quantity, state, price=None):
+        """平空单（支持模拟平仓），调用前state应处于closing，成交后回到idle，失败时回到open"""
+        entry_price = state.last_short_price
+        if self.config.SIMULATION_MODE:
+            close_price = price if price is not None else await self.get_latest_price(symbol)
+            if close_price is None:
+                state.transition(CLOSING, OPEN)
+                logger.error("[%s] 模拟平仓失败: 无法获取最新价格", symbol)
+                return None
+            order = self.simulated_order(symbol, 'BUY', quantity, close_price)
+            tag = '[模拟] '
+        else:
+            try:
+                start = recorder.now()
+                order = await self.client.futures_create_order(
+                    symbol=symbol,
+                    side=self.client.SIDE_BUY,
+                    type=self.client.ORDER_TYPE_MARKET,
+                    quantity=quantity,
+                    newOrderRespType='RESULT'
+                )
+                recorder.record('order_ack', start)
+            except Exception as e:
+                state.transition(CLOSING, OPEN)
+                logger.error("[%s] 平空订单执行失败: %s", symbol, e, extra=TRADE_REAL)
+                self._journal_order(EVENT_FAILED, symbol, quantity)
+                return None
+            close_price = self._fill_price(symbol, order, entry_price)
+            tag = ''
+            self.snapshot.invalidate_balance()
+
+        state.mark_closed()
+        # 做空时利润 = (开仓价 - 平仓价) * 数量
+        profit = (entry_price - close_price) * quantity
+        profit_percent = ((entry_price - close_price) / entry_price) * 100 if entry_price else 0.0
+        extra = trade_extra(self.config.SIMULATION_MODE)
+        logger.info("[%s] %s平仓订单已执行: 数量=%s, 平仓价格=%s, 开仓价格=%s, 获利金额=%.2f USDT, 获利百分比=%.2f%%",
+                    symbol, tag, quantity, close_price, entry_price, profit, profit_percent, extra=extra)
+        logger.info("[%s] %s订单详情: %s", symbol, tag, order, extra=extra)
+        self._journal_order(EVENT_CLOSE, symbol, quantity, close_price, profit)
+        await self._release_allocation(symbol, profit)
+        return order
+
+    async def _entry_notional(self, symbol, usdt_balance):
+        """与TradingExecutor._entry_notional一致，协调器请求是阻塞的socket调用，放到线程中执行"""
+        if self.allocator is not None:
+            return await asyncio.to_thread(self.allocator.reserve, symbol)
+        return usdt_balance * 0.25  # 四分之一USDT仓位
+
+    async def _release_allocation(self, symbol, pnl=0.0):
+        if self.allocator is not None:
+            await asyncio.to_thread(self.allocator.release, symbol, pnl)
+
+    async def open_short_position(self, symbol, close_price, state):
+        """idle → opening → open，与TradingExecutor.open_short_position一致"""
+        if close_price <= 0:
+            logger.error("[%s] 无效价格: %s", symbol, close_price)
+            return None
+        if not state.transition(IDLE, OPENING):
+            return None
+        logger.info("[%s] RSI大于等于超买阈值(%s), 执行做空操作", symbol, self.config.OVERBOUGHT,
+                    extra=trade_extra(self.config.SIMULATION_MODE))
+        usdt_balance = None if self.allocator is not None else await self.get_available_balance("USDT")
+        sell_quantity = await self._entry_notional(symbol, usdt_balance) / close_price
+        if sell_quantity <= 0:
+            state.transition(OPENING, IDLE)
+            if self.allocator is not None:
+                logger.info("[%s] 协调器未分配开仓额度，跳过开空", symbol)
+            return None
+        order_result = await self.place_short_order(symbol, sell_quantity, state)
+        if order_result is None:
+            state.transition(OPENING, IDLE)  # 订单失败，重置状态
+            await self._release_allocation(symbol)
+            logger.error("[%s] 下单失败，重置持仓状态", symbol)
+            return None
+        self._persist_state(symbol, state)
+        self._update_trigger(symbol, state)
+        return order_result
+
+    async def close_short_position(self, symbol, state, price=None):
+        """open → closing → idle；已有平仓在进行时直接返回"""
+        quantity = state.begin_close()
+        if quantity is None:
+            return None
+        order = await self.close_short_order(symbol, quantity, state, price)
+        self._persist_state(symbol, state)
+        self._update_trigger(symbol, state)
+        return order
+
+    async def get_available_balance(self, asset):
+        """获取合约账户可用余额（支持模拟模式）"""
+        if self.config.SIMULATION_MODE and asset == 'USDT':
             return self.config.SIMULATED_BALANCE
+        available_balance = self.snapshot.cached_balance(asset)
+        if available_balance is not None:
+            return available_balance
         try:
-            # 获取合约账户余额
-            balances = self.client.futures_account_balance()
-            for balance in balances:
-                if balance['asset'] == asset:
-                    available_balance = float(balance['availableBalance'])
-                    logger.info(f"获取{asset}合约可用余额: {available_balance:.4f}")
-                    return available_balance
-            logger.warning(f"合约账户中未找到{asset}资产")
-            return 0.0
+            async with self._balance_lock:
+                available_balance = self.snapshot.cached_balance(asset)
+                if available_balance is None:
+                    self.snapshot.set_balances(await self.client.futures_account_balance())
+                    available_balance = self.snapshot.cached_balance(asset)
+            logger.debug("获取%s合约可用余额: %.4f", asset, available_balance)
+            return available_balance
         except BinanceAPIException as e:
-            logger.error(f"获取{asset}合约余额API错误: 代码{e.code}, 消息{e.message}")
-            return 0.0
-        except BinanceOrderException as e:
-            logger.error(f"获取{asset}合约余额订单错误: {str(e)}")
+            logger.error("获取%s合约余额API错误: 代码%s, 消息%s", asset, e.code, e.message)
             return 0.0
         except Exception as e:
-            logger.error(f"获取{asset}合约余额未知错误: {str(e)}")
+            logger.error("获取%s合约余额未知错误: %s", asset, e)
             return 0.0
 
-    def get_latest_price(self, symbol):
-        """通过Binance API获取最新价格"""
+    async def get_latest_price(self, symbol):
+        """获取最新价格：优先使用K线收盘价快照，过期时才请求ticker"""
+        price = self.snapshot.cached_price(symbol)
+        if price is not None:
+            return price
         try:
-            ticker = self.client.get_symbol_ticker(symbol=symbol)
-            return float(ticker['price'])
+            ticker = await self.client.get_symbol_ticker(symbol=symbol)
+            price = float(ticker['price'])
+            self.snapshot.update_price(symbol, price)
+            return price
         except Exception as e:
-            logger.error(f"获取{symbol}最新价格失败: {str(e)}")
+            logger.error("获取%s最新价格失败: %s", symbol, e)
             return None
 
-    def check_trading_conditions(self, symbol, rsi_value, state):
-        # 获取最新价格
-        close_price = self.get_latest_price(symbol)
+    async def check_trading_conditions(self, symbol, rsi_value, state):
+        close_price = await self.get_latest_price(symbol)
         if close_price is None:
             return
-        logger.info(f"[{symbol}] 最新价格: {close_price}, RSI: {rsi_value}")
-        # 统一交易条件判断（模拟与真实交易共用同一套逻辑）
-        # 先获取余额，减少锁持有时间
-        usdt_balance = self.get_available_balance("USDT")
-
-        with state.lock:
-            logger.debug(f"[{symbol}] 锁获取成功，当前持仓状态: {state.in_position}")
-            if not state.in_position and rsi_value >= self.config.OVERBOUGHT and not state.is_closing_position:
-                logger.info(f"[{symbol}] RSI大于等于超买阈值({self.config.OVERBOUGHT}), 执行做空操作")
-                state.in_position = True  # 立即锁定仓位
-                logger.info(f"[{symbol}] 持仓状态更新为: {state.in_position}")
-
-                if close_price <= 0:
-                    logger.error(f"[{symbol}] 无效价格: {close_price}")
-                    state.in_position = False  # 重置状态
-                    logger.debug(f"[{symbol}] 释放锁，持仓状态重置为: {state.in_position}")
-                    return
-
-                sell_quantity = (usdt_balance / close_price) * 0.25  # 四分之一USDT仓位
-                if sell_quantity > 0:
-                    order_result = self.place_short_order(symbol, sell_quantity, state)
-                    if order_result is not None:
-                        state.position_size = sell_quantity  # 记录仓位大小
-
-                    else:
-                        state.in_position = False  # 订单失败，重置状态
-                        logger.error(f"[{symbol}] 下单失败，重置持仓状态")
-                else:
-                    state.in_position = False  # 重置状态
-            else:
-                # RSI小于等于超卖阈值或达到止盈价格时平仓
-                if rsi_value <= self.config.OVERSOLD or close_price <= state.take_profit_price:
-                    if rsi_value <= self.config.OVERSOLD:
-                        logger.info(f"[{symbol}] RSI小于等于超卖阈值({self.config.OVERSOLD}), 执行平仓操作")
-                    else:
-                        logger.info(f"[{symbol}] 价格达到止盈点({state.take_profit_price}), 准备平仓...")
-                    if hasattr(state, 'position_size') and state.position_size > 0:
-                          with state.lock:
-                              state.is_closing_position = True
-                          self.close_short_order(symbol, state.position_size, state)
-                          with state.lock:
-                              state.position_size = 0
-                              state.is_closing_position = False
-
-            logger.debug(f"[{symbol}] 释放锁，当前持仓状态: {state.in_position}")
\ No newline at end of file
+        self.record_tick(symbol, close_price, rsi_value, state)
+
+        phase = state.phase
+        if phase == IDLE and rsi_value >= self.config.OVERBOUGHT and self._confirmed(symbol, state):
+            await self.open_short_position(symbol, close_price, state)
+        elif phase == OPEN and self._close_reason(symbol, close_price, rsi_value, state):
+            await self.close_short_position(symbol, state)
@@ -0,0 +1,131 @@
+import threading
+
+from candle_aggregator import CandleAggregator
+from config import TradingConfig
+from data_processor import IncrementalRSI
+from kline_buffer import KlineBuffer
+
+# 持仓阶段：idle → opening → open → closing → idle
+IDLE = 'idle'  # 无持仓
+OPENING = 'opening'  # 开空订单已发出，等待成交
+OPEN = 'open'  # 持有空单
+CLOSING = 'closing'  # 平空订单已发出，等待成交
+
+
+# 状态跟踪
+class TradingState:
+    """单个交易对的K线、RSI与持仓状态
+
+    持仓阶段只通过transition等比较并交换方法修改，lock只在修改内存状态时短暂持有，
+    下单等网络请求在锁外进行；同一时刻只有一个tick能把idle切换为opening，从而避免重复开仓。
+    """
+
+    def __init__(self, config=None):
+        config = config or TradingConfig()
+        self.phase = IDLE
+        self.last_short_price = 0
+        self.klines = KlineBuffer(config.KLINE_CAPACITY)  # K线环形缓冲区
+        self.rsi = IncrementalRSI(config.RSI_PERIOD)  # 增量RSI状态
+        self.timeframes = None  # 设置BASE_INTERVAL时由基础周期K线聚合出主周期和确认周期
+        if config.BASE_INTERVAL:
+            self.timeframes = CandleAggregator(config.BASE_INTERVAL, config.KLINE_CAPACITY, config.RSI_PERIOD)
+            self.timeframes.add(config.INTERVAL, self.klines, self.rsi)
+            for interval in config.CONFIRM_INTERVALS:
+                if interval not in self.timeframes.frames:
+                    self.timeframes.add(interval)
+        self.take_profit_price = 0
+        self.position_size = 0
+        self.lock = threading.RLock()
+        # 当前形成K线上RSI达到超买/降到超卖阈值的收盘价，每根K线开盘后计算一次
+        self.overbought = config.OVERBOUGHT
+        self.oversold = config.OVERSOLD
+        # (计算时的K线标识, 开空触发价, 平仓触发价)，整体替换，读取方一次取得一致的三元组
+        self._triggers = (None, None, None)
+
+    @property
+    def in_position(self):
+        """开仓中、持仓中和平仓中都视为持仓"""
+        return self.phase != IDLE
+
+    @property
+    def is_closing_position(self):
+        return self.phase == CLOSING
+
+    @property
+    def entry_trigger(self):
+        return self._triggers[1]
+
+    @property
+    def exit_trigger(self):
+        return self._triggers[2]
+
+    def refresh_triggers(self):
+        """已收盘K线的平滑状态变化（新K线开盘）后重新计算触发价格，返回(标识, 开空触发价, 平仓触发价)
+
+        RSI状态由其他线程在lock内更新，这里同样在lock内读取。
+        """
+        with self.lock:
+            rsi = self.rsi
+            key = (rsi.forming_time, rsi.closed_count)
+            triggers = self._triggers
+            if triggers[0] != key:
+                triggers = self._triggers = (key, rsi.price_for_rsi(self.overbought), rsi.price_for_rsi(self.oversold))
+            return triggers
+
+    def signal(self, price):
+        """价格tick是否满足开仓或平仓条件，只与预先计算的触发价格比较，不重算RSI"""
+        with self.lock:
+            _, entry_trigger, exit_trigger = self.refresh_triggers()
+            phase = self.phase
+            take_profit_price = self.take_profit_price
+        if phase == IDLE:
+            return entry_trigger is not None and price >= entry_trigger
+        if phase == OPEN:
+            return price <= take_profit_price or (exit_trigger is not None and price <= exit_trigger)
+        return False
+
+    def transition(self, expected, new):
+        """当前阶段为expected时切换为new，返回是否成功"""
+        with self.lock:
+            if self.phase != expected:
+                return False
+            self.phase = new
+            return True
+
+    def mark_open(self, entry_price, take_profit_price, quantity):
+        """开空成交：opening → open，同时记录开仓价、止盈价和数量"""
+        with self.lock:
+            if self.phase != OPENING:
+                return False
+            self.last_short_price = entry_price
+            self.take_profit_price = take_profit_price
+            self.position_size = quantity
+            self.phase = OPEN
+            return True
+
+    def begin_close(self):
+        """open → closing，返回要平仓的数量；不在持仓中或已有平仓在进行时返回None"""
+        with self.lock:
+            if self.phase != OPEN or self.position_size <= 0:
+                return None
+            self.phase = CLOSING
+            return self.position_size
+
+    def mark_closed(self):
+        """平空成交：closing → idle，清空持仓信息"""
+        with self.lock:
+            if self.phase != CLOSING:
+                return False
+            self.last_short_price = 0
+            self.take_profit_price = 0
+            self.position_size = 0
+            self.phase = IDLE
+            return True
+
+    def restore(self, in_position, last_short_price, take_profit_price, position_size):
+        """启动恢复时直接设置持仓（不经过opening/closing）"""
+        with self.lock:
+            self.phase = OPEN if in_position else IDLE
+            self.last_short_price = last_short_price
+            self.take_profit_price = take_profit_price
+            self.position_size = position_size